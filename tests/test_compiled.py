@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import ujv_compiled
+from ujv_compiled import compiled_path, load_compiled
+from ujv_parser import render_journey
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+class CompiledCacheTest(unittest.TestCase):
+    """
+    Renders the sample journey with the compiled cache and checks which changes make
+    the compiled file stale.
+    """
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.journey = self.tmp / 'journey.md'
+        shutil.copy(REPO_DIR / 'sample_data_engineer_journey.md', self.journey)
+        shutil.copytree(REPO_DIR / 'capabilities', self.tmp / 'capabilities')
+        self.output = self.tmp / 'output' / 'journey.json'
+
+    def render(self, options: dict | None = None) -> str:
+        render_journey(self.journey, self.output, {'emit': 'json', **(options or {})})
+        return self.output.read_text(encoding='utf-8')
+
+    def test_off_by_default(self):
+        self.render()
+        self.assertFalse(compiled_path(self.journey).parent.exists())
+
+    def test_fresh_cache_is_loaded(self):
+        first = self.render({'compiled_cache': True})
+        self.assertIsNotNone(load_compiled(self.journey))
+        self.assertEqual(self.render({'compiled_cache': True}), first)
+
+    def test_journey_change_invalidates(self):
+        self.render({'compiled_cache': True})
+        text = self.journey.read_text(encoding='utf-8')
+        self.journey.write_text(text.replace('### Ingest raw data', '### Ingest all the raw data'), encoding='utf-8')
+        self.assertIsNone(load_compiled(self.journey))
+        self.assertIn('Ingest all the raw data', self.render({'compiled_cache': True}))
+        self.assertIsNotNone(load_compiled(self.journey))
+
+    def test_capability_change_invalidates(self):
+        self.render({'compiled_cache': True})
+        capability = self.tmp / 'capabilities' / 'data-ingestion-pipeline.md'
+        text = capability.read_text(encoding='utf-8')
+        capability.write_text(text.replace('Automates data collection', 'Automates all data collection'), encoding='utf-8')
+        self.assertIsNone(load_compiled(self.journey))
+        self.assertIn('Automates all data collection', self.render({'compiled_cache': True}))
+
+    def test_removed_capability_invalidates(self):
+        self.render({'compiled_cache': True})
+        (self.tmp / 'capabilities' / 'access-control.md').unlink()
+        self.assertIsNone(load_compiled(self.journey))
+
+    def test_model_change_invalidates(self):
+        self.render({'compiled_cache': True})
+        with mock.patch.object(ujv_compiled, 'model_fingerprint', return_value='another parser'):
+            self.assertIsNone(load_compiled(self.journey))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from ujv_capabilities import CapabilityStore
+from ujv_document import (
+    CAPABILITY_HEADING, EVENT_HEADING, EVENTS_HEADING, HEADING, PERSONA_HEADING, REFERENCE, TEXT, TITLE,
+    Token, build_document, find_journeys, parse_document, tokenize,
+)
+from ujv_parser import expand_capability_references, parse_markdown
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SAMPLE_JOURNEY = REPO_DIR / 'sample_data_engineer_journey.md'
+
+JOURNEY = """\
+# User Journey
+
+## Persona
+
+  Data Engineer
+
+## Events
+
+### Ingest raw data
+
+Collect raw data
+🗄️
+
+[capability:data-ingestion-pipeline]
+Text after a reference
+
+### Clean data
+Apply checks [capability:data-validation-capability] inline
+## Notes
+Not part of any event
+### Publish
+#### Direct capability
+Orphan text
+"""
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_tokens(self):
+        tokens = list(tokenize(JOURNEY.splitlines()))
+        self.assertEqual([token.kind for token in tokens], [
+            TITLE, PERSONA_HEADING, TEXT, EVENTS_HEADING,
+            EVENT_HEADING, TEXT, TEXT, REFERENCE, TEXT,
+            EVENT_HEADING, REFERENCE, HEADING, TEXT,
+            EVENT_HEADING, CAPABILITY_HEADING, TEXT,
+        ])
+        # Empty lines are skipped but counted, and lines are stripped
+        self.assertEqual(tokens[2], Token(TEXT, 'Data Engineer', 5, None))
+        self.assertEqual(tokens[7], Token(REFERENCE, '[capability:data-ingestion-pipeline]', 14, 'data-ingestion-pipeline'))
+        self.assertEqual(tokens[10].stem, 'data-validation-capability')
+        self.assertIsInstance(tokens[0], Token)
+
+    def test_headings_keep_their_reference(self):
+        token, = tokenize(['### Event [capability:access-control]'])
+        self.assertEqual((token.kind, token.stem), (EVENT_HEADING, 'access-control'))
+
+    def test_malformed_reference_is_text(self):
+        token, = tokenize(['[capability:not a stem]'])
+        self.assertEqual((token.kind, token.stem), (TEXT, None))
+
+
+class BuildDocumentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = CapabilityStore(REPO_DIR / 'capabilities')
+
+    def build(self, text: str):
+        return build_document(tokenize(text.splitlines()), REPO_DIR / 'journey.md', self.store)
+
+    def test_persona_and_events(self):
+        document = self.build(JOURNEY)
+        self.assertEqual(document.persona, 'Data Engineer')
+        self.assertEqual([event.title for event in document.events], ['Ingest raw data', 'Clean data', 'Publish'])
+        self.assertEqual([event.line for event in document.events], [9, 17, 21])
+
+    def test_description_and_icon(self):
+        ingest, clean, publish = self.build(JOURNEY).events
+        self.assertEqual((ingest.description, ingest.icon), ('Collect raw data', '🗄️'))
+        self.assertEqual((clean.description, clean.icon), ('', None))
+        self.assertEqual((publish.description, publish.icon), ('', None))
+
+    def test_references(self):
+        ingest, clean, publish = self.build(JOURNEY).events
+        self.assertEqual([(ref.stem, ref.line) for ref in ingest.references], [('data-ingestion-pipeline', 14)])
+        self.assertEqual(ingest.references[0].record.fields['title'], 'Data ingestion pipeline')
+        self.assertEqual([ref.stem for ref in clean.references], ['data-validation-capability'])
+        self.assertEqual(publish.references, [])
+
+    def test_missing_capability(self):
+        event, = self.build("## Events\n### Event\nText\n[capability:no-such-capability]\n").events
+        self.assertEqual(event.references[0].stem, 'no-such-capability')
+        self.assertIsNone(event.references[0].record)
+        self.assertEqual(self.build("## Events\n### Event\n[capability:no-such-capability]\n").to_parsed()['events'][0]['capabilities'], [])
+
+    def test_trailing_text(self):
+        ingest, _, _ = self.build(JOURNEY).events
+        self.assertEqual([token.text for token in ingest.lines], ['Collect raw data', '🗄️'])
+        self.assertEqual([token.text for token in ingest.trailing], ['Text after a reference'])
+
+    def test_other_headings_end_the_event(self):
+        _, clean, publish = self.build(JOURNEY).events
+        # Neither the text after '## Notes' nor after '#### Direct capability' belongs to an event
+        self.assertEqual(clean.lines, [])
+        self.assertEqual(clean.trailing, [])
+        self.assertEqual(publish.lines, [])
+
+    def test_text_before_events_is_ignored(self):
+        document = self.build("# User Journey\nIntro text\n## Persona\nAnalyst\nMore text\n")
+        self.assertEqual(document.persona, 'Analyst')
+        self.assertEqual(document.events, [])
+
+    def test_dependencies(self):
+        dependencies = self.build(JOURNEY + "[capability:no-such-capability]\n").dependencies()
+        self.assertEqual(set(dependencies), {
+            str(self.store.path_for('data-ingestion-pipeline')),
+            str(self.store.path_for('data-validation-capability')),
+            str(self.store.path_for('no-such-capability')),
+        })
+        self.assertIsNone(dependencies[str(self.store.path_for('no-such-capability'))])
+
+    def test_sample_matches_parse_markdown(self):
+        store = CapabilityStore(REPO_DIR / 'capabilities')
+        expected = parse_markdown(expand_capability_references(SAMPLE_JOURNEY.read_text(encoding='utf-8'), SAMPLE_JOURNEY, store=store))
+        self.assertEqual(parse_document(SAMPLE_JOURNEY, store).to_parsed(), expected)
+
+
+class FindJourneysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for relative in ('a.md', 'sub/b.md', 'output/c.md', '.hidden/d.md', 'capabilities/e.md'):
+            path = self.tmp / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("# User Journey\n", encoding='utf-8')
+        (self.tmp / 'notes.md').write_text("# Notes\n", encoding='utf-8')
+
+    def test_directory(self):
+        found = find_journeys([str(self.tmp)], {(self.tmp / 'output').resolve()})
+        self.assertEqual(found, [(self.tmp / 'a.md', self.tmp), (self.tmp / 'sub' / 'b.md', self.tmp)])
+
+    def test_glob_and_files_are_found_once(self):
+        found = find_journeys([f"{self.tmp}/sub/*.md", str(self.tmp / 'sub' / 'b.md'), str(self.tmp / 'a.md')])
+        self.assertEqual(found, [(self.tmp / 'sub' / 'b.md', self.tmp / 'sub'), (self.tmp / 'a.md', self.tmp)])
+
+
+if __name__ == '__main__':
+    unittest.main()
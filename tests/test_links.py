@@ -0,0 +1,124 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ujv_links import LinkCache, check_links
+
+# How long the test server holds each request, so concurrent requests overlap
+RESPONSE_DELAY = 0.05
+
+
+class LinkHandler(BaseHTTPRequestHandler):
+    """
+    /ok/<n>: 200, /missing: 404, /redirect: 302 to /ok/0, /loop: redirects to itself.
+    Counts requests and the most requests in progress at once, and records the paths
+    and Host headers requested.
+    """
+
+    def do_HEAD(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.paths.append(self.path)
+            server.hosts.append(self.headers['Host'])
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(RESPONSE_DELAY)
+            if self.path.startswith('/ok/'):
+                self.send_response(200)
+            elif self.path == '/redirect':
+                self.send_response(302)
+                self.send_header('Location', '/ok/0')
+            elif self.path == '/loop':
+                self.send_response(302)
+                self.send_header('Location', '/loop')
+            else:
+                self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LinkCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), LinkHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = self.server.active = self.server.max_active = 0
+        self.server.paths = []
+        self.server.hosts = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_per_host_concurrency(self):
+        urls = [f"{self.base}/ok/{n}" for n in range(12)]
+        results, checked = check_links(urls, concurrency=12, per_host=3, rate=0)
+        self.assertEqual(checked, 12)
+        self.assertTrue(all(result.ok for result in results.values()))
+        self.assertEqual(self.server.max_active, 3)
+
+    def test_redirects(self):
+        results, _ = check_links([f"{self.base}/redirect", f"{self.base}/missing", f"{self.base}/loop"], rate=0)
+        redirect = results[f"{self.base}/redirect"]
+        self.assertTrue(redirect.ok)
+        self.assertEqual(redirect.status, 200)
+        missing = results[f"{self.base}/missing"]
+        self.assertFalse(missing.ok)
+        self.assertEqual(missing.status, 404)
+        loop = results[f"{self.base}/loop"]
+        self.assertFalse(loop.ok)
+        self.assertIn('redirects', loop.error)
+
+    def test_iri_links_are_encoded(self):
+        port = self.server.server_address[1]
+        urls = [f"{self.base}/ok/ünïcode?q=naïve café", f"{self.base}/ok/already%20encoded"]
+        results, _ = check_links(urls, rate=0)
+        self.assertEqual([results[url].status for url in urls], [200, 200])
+        self.assertEqual(sorted(self.server.paths),
+                         ['/ok/%C3%BCn%C3%AFcode?q=na%C3%AFve%20caf%C3%A9', '/ok/already%20encoded'])
+        self.assertEqual(set(self.server.hosts), {f"127.0.0.1:{port}"})
+
+    def test_iri_host_is_idna_encoded(self):
+        # .invalid never resolves: the link fails on the lookup, not while encoding the request
+        results, _ = check_links(["http://bücher.invalid/ok"], rate=0, timeout=5)
+        result = results["http://bücher.invalid/ok"]
+        self.assertFalse(result.ok)
+        self.assertNotIn('Unicode', result.error)
+
+    def test_cache_reuse(self):
+        cache_path = self.tmp / 'links.json'
+        urls = [f"{self.base}/ok/1", f"{self.base}/redirect", f"{self.base}/missing"]
+        first, checked = check_links(urls, LinkCache(cache_path), rate=0)
+        self.assertEqual(checked, 3)
+        requests = self.server.requests
+
+        second, checked = check_links(urls, LinkCache(cache_path), rate=0)
+        self.assertEqual(checked, 0)
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual({url: result.status for url, result in second.items()},
+                         {url: result.status for url, result in first.items()})
+
+        # Expired entries are checked again
+        _, checked = check_links(urls, LinkCache(cache_path, ttl=0), rate=0)
+        self.assertEqual(checked, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
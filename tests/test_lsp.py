@@ -0,0 +1,120 @@
+import contextlib
+import io
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from ujv_capabilities import capabilities_dir_for, get_store
+from ujv_document import build_document, tokenize
+from ujv_lsp import JourneyDocument
+from ujv_validator import validate_document
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Lines the random edits are made of: every kind of token, in and out of place
+EDIT_LINES = [
+    '', '# User Journey', '## Persona', 'Analyst', '## Events', '### New event', '### Another event',
+    'A description', '🚀', '[capability:access-control]', '[capability:data-ingestion-pipeline]',
+    '[capability:no-such-capability]', '[capability:broken]', '#### Direct capability', '## Notes',
+    'More text', '### ', 'Text with [capability:metadata-enrichment] inside',
+]
+
+
+class IncrementalDiagnosticsTest(unittest.TestCase):
+    """
+    Applies random edits to a JourneyDocument and compares its diagnostics after each
+    edit with validating the whole text from scratch.
+    """
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        shutil.copytree(REPO_DIR / 'capabilities', self.tmp / 'capabilities')
+        (self.tmp / 'capabilities' / 'broken.md').write_text("Not a heading\n", encoding='utf-8')
+        self.path = self.tmp / 'journey.md'
+        self.text = (REPO_DIR / 'sample_data_engineer_journey.md').read_text(encoding='utf-8')
+        self.path.write_text(self.text, encoding='utf-8')
+        # The validator reports each capability file it reads
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def full_diagnostics(self, text: str) -> list[tuple[int | None, str]]:
+        """
+        Validator errors as (0-based line, message) with the file prefix removed. Errors
+        of capability files keep their own prefix and have no line in the journey.
+        """
+        document = build_document(tokenize(text.split('\n')), self.path, get_store(capabilities_dir_for(self.path)))
+        line_prefix = f"Error in {self.path} (line "
+        file_prefix = f"Error in {self.path}: "
+        results = []
+        for message in validate_document(document):
+            if message.startswith(line_prefix):
+                number, _, message = message[len(line_prefix):].partition('): ')
+                results.append((int(number) - 1, message))
+            elif message.startswith(file_prefix):
+                results.append((0, message[len(file_prefix):]))
+            else:
+                results.append((None, message))
+        return sorted(results, key=repr)
+
+    @staticmethod
+    def incremental_diagnostics(document: JourneyDocument) -> list[tuple[int | None, str]]:
+        results = []
+        for diagnostic in document.diagnostics(False):
+            message = diagnostic['message']
+            results.append((None if message.startswith('Error in ') else diagnostic['range']['start']['line'], message))
+        return sorted(results, key=repr)
+
+    def random_edit(self, rng: random.Random, lines: list[str]) -> tuple[dict, dict, str]:
+        start_line = rng.randrange(len(lines))
+        end_line = min(len(lines) - 1, start_line + rng.choice((0, 0, 0, 1, 2, 5)))
+        start = {'line': start_line, 'character': rng.choice((0, len(lines[start_line])))}
+        end = {'line': end_line, 'character': rng.choice((0, len(lines[end_line])))}
+        if (end['line'], end['character']) < (start['line'], start['character']):
+            start, end = end, start
+        if rng.random() < 0.3:
+            # Typing inside a line
+            text = rng.choice(('x', '#', '# ', '[capability:', ']', ' '))
+        else:
+            text = '\n'.join(rng.choice(EDIT_LINES) for _ in range(rng.randrange(0, 4)))
+            if rng.random() < 0.5:
+                text = '\n' + text
+        return start, end, text
+
+    def test_random_edits_match_full_validation(self):
+        rng = random.Random(17)
+        for round in range(4):
+            document = JourneyDocument(self.path.as_uri(), self.text)
+            text = self.text
+            for step in range(150):
+                lines = text.split('\n')
+                start, end, new_text = self.random_edit(rng, lines)
+                offsets = [0]
+                for line in lines:
+                    offsets.append(offsets[-1] + len(line) + 1)
+                text = (text[:offsets[start['line']] + start['character']] + new_text
+                        + text[offsets[end['line']] + end['character']:])
+                document.edit(start, end, new_text, False)
+
+                with self.subTest(round=round, step=step, edit=(start, end, new_text)):
+                    self.assertEqual(document.lines, text.split('\n'))
+                    if document.is_journey():
+                        self.assertEqual(self.incremental_diagnostics(document), self.full_diagnostics(text))
+                    if not document.is_journey():
+                        # Keep most of the run on journeys the server reports diagnostics for
+                        text = '# User Journey\n' + text
+                        document.edit({'line': 0, 'character': 0}, {'line': 0, 'character': 0}, '# User Journey\n', False)
+
+    def test_section_edit_rechecks_following_blocks(self):
+        document = JourneyDocument(self.path.as_uri(), self.text)
+        self.assertEqual(self.incremental_diagnostics(document), [])
+        events_line = document.lines.index('## Events')
+        document.edit({'line': events_line, 'character': 0}, {'line': events_line, 'character': len('## Events')}, 'Events', False)
+        diagnostics = self.incremental_diagnostics(document)
+        self.assertTrue(diagnostics)
+        self.assertEqual(diagnostics, self.full_diagnostics('\n'.join(document.lines)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ujv_capabilities import CapabilityStore
+from ujv_parser import expand_capability_references, main, parse_markdown, render_journey
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Events with no, one and two capabilities, in an order where attaching a capability
+# to the following event, as the baseline parser did, gives a different result
+JOURNEY = """\
+# User Journey
+
+## Persona
+
+Data Engineer
+
+## Events
+
+### Ingest raw data
+
+Collect raw data
+🗄️
+
+[capability:data-ingestion-pipeline]
+
+### Review the data
+
+Look at samples
+
+### Publish data product
+
+Make curated datasets available
+
+[capability:data-catalog-integration]
+
+[capability:access-control]
+
+### Validate
+
+Apply data quality checks
+
+[capability:data-validation-capability]
+"""
+
+# A journey sharing no capability with JOURNEY
+OTHER_JOURNEY = """\
+# User Journey
+
+## Persona
+
+Analyst
+
+## Events
+
+### Find a dataset
+
+Search the catalog
+
+[capability:metadata-enrichment]
+"""
+
+EXPECTED_CAPABILITIES = {
+    'Ingest raw data': ['Data ingestion pipeline'],
+    'Review the data': [],
+    'Publish data product': ['Data catalog integration', 'Access control'],
+    'Validate': ['Data validation capability'],
+}
+
+
+def capability_titles(parsed: dict) -> dict:
+    return {event['title']: [cap['title'] for cap in event['capabilities']] for event in parsed['events']}
+
+
+class JourneyTestCase(unittest.TestCase):
+    """
+    A temporary directory holding the repository's capabilities/ and an output/ directory.
+    """
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        shutil.copytree(REPO_DIR / 'capabilities', self.tmp / 'capabilities')
+        self.output_dir = self.tmp / 'output'
+
+    def write_journey(self, name: str, text: str = JOURNEY) -> Path:
+        path = self.tmp / f"{name}.md"
+        path.write_text(text, encoding='utf-8')
+        return path
+
+
+class CapabilityAssignmentTest(JourneyTestCase):
+
+    def test_rendered_model(self):
+        journey = self.write_journey('journey')
+        output = self.output_dir / 'journey.json'
+        render_journey(journey, output, {'emit': 'json'})
+        parsed = json.loads(output.read_text(encoding='utf-8'))
+        self.assertEqual(capability_titles(parsed), EXPECTED_CAPABILITIES)
+
+    def test_mermaid_edges(self):
+        journey = self.write_journey('journey')
+        output = self.output_dir / 'journey.mmd'
+        render_journey(journey, output, {'emit': 'mermaid'})
+        capability_nodes = [line.split('---')[-1].strip() for line in output.read_text(encoding='utf-8').splitlines()
+                            if '---' in line]
+        self.assertEqual(capability_nodes, ['E0_C0', 'E2_C0', 'E2_C1', 'E3_C0'])
+
+    def test_legacy_parse_markdown(self):
+        store = CapabilityStore(self.tmp / 'capabilities')
+        parsed = parse_markdown(expand_capability_references(JOURNEY, self.tmp / 'journey.md', store=store))
+        self.assertEqual(capability_titles(parsed), EXPECTED_CAPABILITIES)
+
+
+class PaginationTest(JourneyTestCase):
+
+    def parts(self) -> list[str]:
+        directory = self.output_dir / 'journey_parts'
+        return sorted(path.name for path in directory.iterdir()) if directory.exists() else None
+
+    def test_rebuilds_remove_stale_parts(self):
+        journey = self.write_journey('journey')
+        output = self.output_dir / 'journey.html'
+        record = render_journey(journey, output, {'paginate': 1})
+        self.assertEqual(record['parts'], [f"journey_parts/part-{part}.html" for part in range(1, 5)])
+        self.assertEqual(self.parts(), ['part-1.html', 'part-2.html', 'part-3.html', 'part-4.html'])
+
+        render_journey(journey, output, {'paginate': 3})
+        self.assertEqual(self.parts(), ['part-1.html', 'part-2.html'])
+
+        render_journey(journey, output, {'paginate': 3, 'renderer': 'svg'})
+        self.assertEqual(self.parts(), ['part-1.html', 'part-1.svg', 'part-2.html', 'part-2.svg'])
+
+        record = render_journey(journey, output)
+        self.assertNotIn('parts', record)
+        self.assertIsNone(self.parts())
+        self.assertEqual(sorted(path.name for path in self.output_dir.iterdir()), ['journey.html'])
+
+
+class SvgOutputTest(JourneyTestCase):
+
+    def test_switching_renderer_removes_the_svg(self):
+        journey = self.write_journey('journey')
+        output = self.output_dir / 'journey.html'
+        svg = self.output_dir / 'journey.svg'
+        record = render_journey(journey, output, {'renderer': 'svg'})
+        self.assertEqual(record['svg'], 'journey.svg')
+        self.assertTrue(svg.exists())
+
+        record = render_journey(journey, output)
+        self.assertNotIn('svg', record)
+        self.assertFalse(svg.exists())
+
+    def test_other_formats_remove_the_svg(self):
+        journey = self.write_journey('journey')
+        for options in ({'emit': 'json'}, {'emit': 'mermaid'}, {'paginate': 2}):
+            with self.subTest(options=options):
+                render_journey(journey, self.output_dir / 'journey.html', {'renderer': 'svg'})
+                suffix = {'json': '.json', 'mermaid': '.mmd'}.get(options.get('emit'), '.html')
+                render_journey(journey, self.output_dir / f"journey{suffix}", options)
+                self.assertFalse((self.output_dir / 'journey.svg').exists())
+
+
+class BuildManifestTest(JourneyTestCase):
+
+    def build(self, *journeys: Path) -> str:
+        argv = ['ujv_parser.py', *map(str, journeys), '-o', str(self.output_dir), '-j', '1']
+        with mock.patch('sys.argv', argv), contextlib.redirect_stdout(io.StringIO()) as stdout:
+            main()
+        return stdout.getvalue()
+
+    def rewritten(self) -> list[str]:
+        """
+        Outputs written since the last call, which marks every output as old.
+        """
+        names = []
+        for path in sorted(self.output_dir.glob('*.html')):
+            if path.stat().st_mtime_ns != 0:
+                names.append(path.name)
+            os.utime(path, ns=(0, 0))
+        return names
+
+    def test_only_dependent_journeys_are_rebuilt(self):
+        journeys = self.write_journey('journey'), self.write_journey('other', OTHER_JOURNEY)
+        self.assertIn('Build cache: 0 hit(s), 2 miss(es)', self.build(*journeys))
+        self.assertEqual(self.rewritten(), ['journey.html', 'other.html'])
+
+        self.assertIn('Build cache: 2 hit(s), 0 miss(es)', self.build(*journeys))
+        self.assertEqual(self.rewritten(), [])
+
+        capability = self.tmp / 'capabilities' / 'data-ingestion-pipeline.md'
+        capability.write_text(capability.read_text(encoding='utf-8') + "\nMore detail.\n", encoding='utf-8')
+        self.assertIn('Build cache: 1 hit(s), 1 miss(es)', self.build(*journeys))
+        self.assertEqual(self.rewritten(), ['journey.html'])
+
+        self.assertIn('Build cache: 2 hit(s), 0 miss(es)', self.build(*journeys))
+        self.assertEqual(self.rewritten(), [])
+
+
+class ExpandCapabilityReferencesTest(JourneyTestCase):
+
+    def test_capabilities_next_to_the_journey(self):
+        journey = self.write_journey('journey')
+        # A working directory with no capabilities/ of its own
+        elsewhere = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, elsewhere)
+        self.enterContext(contextlib.chdir(elsewhere))
+        dependencies = {}
+        expanded = expand_capability_references(JOURNEY, journey, dependencies)
+        self.assertNotIn('[ERROR', expanded)
+        self.assertIn('#### Data ingestion pipeline', expanded)
+        self.assertEqual(capability_titles(parse_markdown(expanded)), EXPECTED_CAPABILITIES)
+        self.assertIn(str(self.tmp / 'capabilities' / 'access-control.md'), dependencies)
+        self.assertTrue(all(dependencies.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import http.client
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from ujv_server import JOURNEYS_PATH, JourneyService, make_server
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+class JourneyServiceTest(unittest.TestCase):
+    """
+    Serves the sample journey from a temporary root on an ephemeral port, next to a
+    journey outside the root that must not be reachable.
+    """
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        root = self.tmp / 'root'
+        root.mkdir()
+        shutil.copy(REPO_DIR / 'sample_data_engineer_journey.md', root / 'journey.md')
+        shutil.copytree(REPO_DIR / 'capabilities', root / 'capabilities')
+        shutil.copy(REPO_DIR / 'sample_data_engineer_journey.md', self.tmp / 'outside.md')
+
+        self.server = make_server(JourneyService(root), port=0, quiet=True)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def get(self, path: str, headers: dict | None = None) -> http.client.HTTPResponse:
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+        self.addCleanup(connection.close)
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        response.read()
+        return response
+
+    def test_etag_revalidation(self):
+        response = self.get(f"{JOURNEYS_PATH}/journey.html")
+        self.assertEqual(response.status, 200)
+        etag = response.getheader('ETag')
+        self.assertTrue(etag)
+
+        response = self.get(f"{JOURNEYS_PATH}/journey.html", {'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.getheader('ETag'), etag)
+
+    def test_path_traversal_is_not_found(self):
+        for path in ('../outside.html', '%2e%2e/outside.html', 'capabilities/../../outside.html'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(f"{JOURNEYS_PATH}/{path}").status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
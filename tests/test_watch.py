@@ -0,0 +1,70 @@
+import contextlib
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from ujv_parser import RENDER_DEFAULTS, discover_journeys
+from ujv_watch import PollingWatcher, WatchBuild
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+class PollingWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.watcher = PollingWatcher(interval=0)
+
+    def test_new_directories_are_watched(self):
+        (self.tmp / 'skipped').mkdir()
+        self.watcher.add(self.tmp)
+        self.assertEqual(self.watcher.wait(), set())
+
+        (self.tmp / 'team').mkdir()
+        (self.tmp / 'team' / 'journey.md').write_text("# User Journey\n", encoding='utf-8')
+        (self.tmp / 'team' / 'nested').mkdir()
+        (self.tmp / 'team' / 'nested' / 'other.md').write_text("# User Journey\n", encoding='utf-8')
+        (self.tmp / '.hidden').mkdir()
+        (self.tmp / '.hidden' / 'journey.md').write_text("# User Journey\n", encoding='utf-8')
+        (self.tmp / 'skipped' / 'journey.md').write_text("# User Journey\n", encoding='utf-8')
+        self.assertEqual(self.watcher.wait(), {
+            str(self.tmp / 'team' / 'journey.md'),
+            str(self.tmp / 'team' / 'nested' / 'other.md'),
+        })
+
+        # Files created later in a new directory are reported too
+        (self.tmp / 'team' / 'nested' / 'third.md').write_text("# User Journey\n", encoding='utf-8')
+        self.assertEqual(self.watcher.wait(), {str(self.tmp / 'team' / 'nested' / 'third.md')})
+
+        shutil.rmtree(self.tmp / 'team')
+        self.assertEqual(self.watcher.wait(), {
+            str(self.tmp / 'team' / 'journey.md'),
+            str(self.tmp / 'team' / 'nested' / 'other.md'),
+            str(self.tmp / 'team' / 'nested' / 'third.md'),
+        })
+
+    def test_journey_in_new_directory_is_rendered(self):
+        journeys = self.tmp / 'journeys'
+        journeys.mkdir()
+        shutil.copytree(REPO_DIR / 'capabilities', journeys / 'capabilities')
+        output_dir = self.tmp / 'output'
+        build = WatchBuild([str(journeys)], output_dir, dict(RENDER_DEFAULTS), workers=1)
+        build.build(discover_journeys([str(journeys)], output_dir))
+        for directory in build.watched_directories():
+            self.watcher.add(directory)
+
+        (journeys / 'team').mkdir()
+        shutil.copy(REPO_DIR / 'sample_data_engineer_journey.md', journeys / 'team' / 'journey.md')
+        # The journey's own capabilities/ is next to it, in journeys/team
+        shutil.copytree(REPO_DIR / 'capabilities', journeys / 'team' / 'capabilities')
+        with contextlib.redirect_stdout(io.StringIO()):
+            urls = build.handle(self.watcher.wait())
+        self.assertEqual(urls, ['/team/journey.html'])
+        self.assertTrue((output_dir / 'team' / 'journey.html').exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
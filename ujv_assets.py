@@ -0,0 +1,280 @@
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+
+from ujv_capabilities import content_hash
+
+# Pinned third-party assets used by the generated pages: name -> (file name, URL)
+ASSETS = {
+    'mermaid': ('mermaid.min.js', 'https://cdn.jsdelivr.net/npm/mermaid@10.9.0/dist/mermaid.min.js'),
+    'roboto': ('roboto.css', 'https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700&display=swap'),
+    'mdc-css': ('material-components-web.min.css', 'https://unpkg.com/material-components-web@14.0.0/dist/material-components-web.min.css'),
+    'mdc-js': ('material-components-web.min.js', 'https://unpkg.com/material-components-web@14.0.0/dist/material-components-web.min.js'),
+}
+
+# Where `ujv_assets.py fetch` stores the pinned assets
+VENDOR_DIR = Path(__file__).parent / "vendor"
+VENDOR_MANIFEST = "manifest.json"
+
+# Shared, content-hashed asset directory inside an output directory
+ASSETS_DIRNAME = "assets"
+
+ASSET_MODES = ('cdn', 'shared', 'inline')
+
+# Google Fonts serves woff2 only to browsers it recognises
+FONT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+CSS_URL_RE = re.compile(r'url\(([^)]+)\)')
+CLASS_ATTR_RE = re.compile(r'class=["\']([^"\']*)["\']')
+CSS_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][_a-zA-Z0-9-]*)')
+CSS_NOT_RE = re.compile(r':not\([^)]*\)')
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+
+
+def page_assets(renderer: str, mode: str) -> list[str]:
+    """
+    Names of the assets a page needs. SVG pages are laid out at build time and need
+    no Mermaid; inline pages keep only the Material CSS rules they use and none of its JS.
+    """
+    names = ['mermaid'] if renderer == 'mermaid' else []
+    names += ['roboto', 'mdc-css']
+    if mode != 'inline':
+        names.append('mdc-js')
+    return names
+
+
+def _download(url: str, headers: dict | None = None) -> bytes:
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.read()
+
+
+def fetch_assets(vendor_dir: Path = VENDOR_DIR) -> dict:
+    """
+    Downloads the pinned assets (and the font files referenced by the font CSS) into
+    vendor_dir and records their content hashes in the vendor manifest.
+    """
+    vendor_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for name, (filename, url) in ASSETS.items():
+        print(f"Fetching {url}")
+        data = _download(url, {'User-Agent': FONT_USER_AGENT} if name == 'roboto' else None)
+        if name == 'roboto':
+            fonts_dir = vendor_dir / "fonts"
+            fonts_dir.mkdir(exist_ok=True)
+            css = data.decode('utf-8')
+            for font_url in sorted(set(match.strip('\'"') for match in CSS_URL_RE.findall(css))):
+                font_name = font_url.rsplit('/', 1)[-1]
+                (fonts_dir / font_name).write_bytes(_download(font_url))
+                css = css.replace(font_url, f"fonts/{font_name}")
+            data = css.encode('utf-8')
+        (vendor_dir / filename).write_bytes(data)
+        manifest[name] = {'file': filename, 'url': url, 'hash': content_hash(data)}
+    with open(vendor_dir / VENDOR_MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def vendored_path(vendor_dir: Path, name: str) -> Path:
+    path = Path(vendor_dir) / ASSETS[name][0]
+    if not path.exists():
+        raise FileNotFoundError(f"Asset '{name}' is not vendored in {vendor_dir}; run 'python ujv_assets.py fetch' first")
+    return path
+
+
+def _hashed_name(filename: str, data: bytes) -> str:
+    stem, dot, suffix = filename.partition('.')
+    return f"{stem}.{content_hash(data)[:12]}.{suffix}" if dot else f"{stem}.{content_hash(data)[:12]}"
+
+
+def publish_shared_assets(output_dir: Path, vendor_dir: Path = VENDOR_DIR) -> dict:
+    """
+    Copies the vendored assets into output_dir/assets under content-hashed names,
+    so every page of a build can reference (and browsers cache) a single copy.
+    Returns asset name -> published path. Files already published are not rewritten.
+    """
+    assets_dir = output_dir / ASSETS_DIRNAME
+    assets_dir.mkdir(parents=True, exist_ok=True)
+
+    def publish(filename: str, data: bytes) -> Path:
+        target = assets_dir / _hashed_name(filename, data)
+        if not target.exists():
+            target.write_bytes(data)
+        return target
+
+    published = {}
+    for name, (filename, _) in ASSETS.items():
+        data = vendored_path(vendor_dir, name).read_bytes()
+        if name == 'roboto':
+            # Publish the font files first and point the CSS at their hashed names
+            css = data.decode('utf-8')
+            for font_ref in sorted(set(match.strip('\'"') for match in CSS_URL_RE.findall(css))):
+                font_path = Path(vendor_dir) / font_ref
+                if font_path.exists():
+                    css = css.replace(font_ref, publish(font_path.name, font_path.read_bytes()).name)
+            data = css.encode('utf-8')
+        published[name] = str(publish(filename, data))
+    return published
+
+
+def _split_selectors(prelude: str) -> list[str]:
+    """
+    Splits a selector list on the commas that are not inside parentheses, e.g. :not(.a, .b).
+    """
+    selectors = []
+    depth = 0
+    start = 0
+    for idx, char in enumerate(prelude):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:idx])
+            start = idx + 1
+    selectors.append(prelude[start:])
+    return selectors
+
+
+def prune_css(css: str, used_classes: set) -> str:
+    """
+    Drops the rules of a stylesheet whose selectors refer to classes the page does not use.
+    Selectors without classes (element, :root and attribute selectors) are kept, as are
+    @font-face rules and the @keyframes referenced by kept rules.
+    """
+    css = CSS_COMMENT_RE.sub('', css)
+    kept = []
+    keyframes = []
+    pos = 0
+    while pos < len(css):
+        brace = css.find('{', pos)
+        semicolon = css.find(';', pos)
+        if brace == -1:
+            break
+        if semicolon != -1 and semicolon < brace:
+            # Statement at-rule, e.g. @charset or @import
+            statement = css[pos:semicolon + 1].strip()
+            if statement.startswith('@charset'):
+                kept.append(statement)
+            pos = semicolon + 1
+            continue
+        prelude = css[pos:brace].strip()
+        depth = 1
+        end = brace + 1
+        while depth and end < len(css):
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+            end += 1
+        body = css[brace + 1:end - 1]
+        pos = end
+        if prelude.startswith(('@media', '@supports')):
+            inner = prune_css(body, used_classes)
+            if inner:
+                kept.append(f"{prelude}{{{inner}}}")
+        elif 'keyframes' in prelude:
+            keyframes.append((prelude.split()[-1], f"{prelude}{{{body}}}"))
+        elif prelude.startswith('@'):
+            kept.append(f"{prelude}{{{body}}}")
+        else:
+            selectors = [
+                selector for selector in _split_selectors(prelude)
+                if set(CSS_CLASS_RE.findall(CSS_NOT_RE.sub('', selector))) <= used_classes
+            ]
+            if selectors:
+                kept.append(f"{','.join(selectors)}{{{body}}}")
+    pruned = ''.join(kept)
+    pruned += ''.join(rule for name, rule in keyframes if name in pruned)
+    return pruned
+
+
+@lru_cache(maxsize=None)
+def _inline_css(vendor_dir: str, name: str) -> str:
+    """
+    Reads a vendored stylesheet, replacing font references with data: URIs. Only the
+    Latin subset of the fonts is kept, which is all the page's fixed text needs.
+    """
+    css = vendored_path(Path(vendor_dir), name).read_text(encoding='utf-8')
+    if name != 'roboto':
+        return css
+    faces = []
+    for face in re.findall(r'@font-face\s*{[^}]*}', css):
+        if 'unicode-range' in face and 'U+0000-00FF' not in face:
+            continue
+        for font_ref in CSS_URL_RE.findall(face):
+            font_path = Path(vendor_dir) / font_ref.strip('\'"')
+            if font_path.exists():
+                encoded = base64.b64encode(font_path.read_bytes()).decode('ascii')
+                face = face.replace(font_ref, f"data:font/woff2;base64,{encoded}")
+        faces.append(face)
+    return '\n'.join(faces)
+
+
+@lru_cache(maxsize=None)
+def _inline_js(vendor_dir: str, name: str) -> str:
+    # A literal </script> inside the code would end the inline script element
+    return vendored_path(Path(vendor_dir), name).read_text(encoding='utf-8').replace('</script', '<\\/script')
+
+
+def head_tags(names: list[str], mode: str, page_dir: Path | None = None, shared: dict | None = None,
+              vendor_dir: Path = VENDOR_DIR, used_classes: set | None = None) -> str:
+    """
+    Returns the <head> markup loading the given assets:
+    - cdn: links to the pinned CDN URLs
+    - shared: links to the content-hashed copies published in the output directory
+    - inline: the asset content itself, with the Material CSS pruned to `used_classes`,
+      the classes used on the page
+    """
+    tags = []
+    if used_classes is None:
+        used_classes = set()
+    for name in names:
+        filename, url = ASSETS[name]
+        is_js = filename.endswith('.js')
+        if mode == 'inline':
+            if is_js:
+                tags.append(f"    <script>{_inline_js(str(vendor_dir), name)}</script>")
+            else:
+                css = _inline_css(str(vendor_dir), name)
+                if name == 'mdc-css':
+                    css = prune_css(css, used_classes)
+                tags.append(f"    <style>{css}</style>")
+            continue
+        if mode == 'shared':
+            url = Path(os.path.relpath(shared[name], page_dir)).as_posix()
+        if is_js:
+            tags.append(f"    <script src=\"{url}\"></script>")
+        else:
+            tags.append(f"    <link rel=\"stylesheet\" href=\"{url}\">")
+    return '\n'.join(tags)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor the pinned third-party assets used by the generated pages.")
+    parser.add_argument("command", choices=["fetch", "list"], help="'fetch' downloads the assets, 'list' shows the pinned assets and their vendored state")
+    parser.add_argument("--vendor-dir", default=str(VENDOR_DIR), help="Directory to store the vendored assets in (default: vendor/ next to this script)")
+    args = parser.parse_args()
+
+    vendor_dir = Path(args.vendor_dir)
+    if args.command == "fetch":
+        try:
+            manifest = fetch_assets(vendor_dir)
+        except OSError as e:
+            print(f"Error: could not fetch assets: {e}")
+            sys.exit(1)
+        print(f"Vendored {len(manifest)} assets into {vendor_dir}")
+    else:
+        for name, (filename, url) in ASSETS.items():
+            state = "vendored" if (vendor_dir / filename).exists() else "missing"
+            print(f"{name:8} {state:9} {url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from ujv_assets import head_tags, page_assets
+from ujv_capabilities import CapabilityStore, capabilities_dir_for, content_hash
+from ujv_compiled import compile_document, load_compiled, to_parsed, write_compiled
+from ujv_document import build_document, read_lines, tokenize
+from ujv_generate import generate_journey
+from ujv_parser import (
+    MERMAID_DIAGRAM, MERMAID_DOWNLOAD_BUTTON, MERMAID_PAGE_SCRIPT, STATE_COLORS, TEMPLATE_HTML,
+    build_mermaid, expand_capability_references, parse_markdown, render_journey,
+)
+from ujv_svg import build_svg
+from ujv_validator import validate_lines, validate_main_markdown
+
+# Minimum validator throughput, in journey lines per second. The validator measures
+# 0.7-1.2M lines/s on one core depending on load; the target stays below the noisy end
+VALIDATOR_TARGET_LINES_PER_SECOND = 600_000
+
+# Journey sizes (number of events) benchmarked by default
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+
+# A stage regresses when it is slower than the baseline by more than the threshold
+# and by more than MIN_REGRESSION_SECONDS, which keeps timer noise on tiny stages out
+DEFAULT_THRESHOLD = 0.25
+MIN_REGRESSION_SECONDS = 0.001
+
+DEFAULT_BASELINE = Path(__file__).parent / "benchmarks" / "baseline.json"
+
+# Output formats whose peak memory is measured, as render_journey options
+MEMORY_FORMATS = {
+    'html': {},
+    'html_svg': {'renderer': 'svg'},
+    'mermaid': {'emit': 'mermaid'},
+    'json': {'emit': 'json'},
+}
+
+
+def _time(fn, repeat: int) -> float:
+    """
+    Median wall time of fn() over `repeat` runs, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def bench_stages(journey_path: Path, repeat: int) -> dict:
+    """
+    Times each stage of the parse/validate/render pipeline separately on one journey.
+    Stages reading capability files get a fresh capability store per run, so file
+    reads are included as they are in a single build.
+    """
+    md = journey_path.read_text(encoding='utf-8')
+    capabilities_dir = capabilities_dir_for(journey_path)
+    expanded_md = expand_capability_references(md, journey_path, store=CapabilityStore(capabilities_dir))
+    parsed = parse_markdown(expanded_md)
+    mermaid_code = build_mermaid(parsed)
+    head = head_tags(page_assets('mermaid', 'cdn'), 'cdn')
+    source = journey_path.read_bytes()
+    write_compiled(journey_path, compile_document(build_document(tokenize(md.splitlines()), journey_path), content_hash(source)))
+    output_dir = Path(tempfile.mkdtemp(dir=journey_path.parent))
+
+    def render():
+        render_journey(journey_path, output_dir / 'journey.html')
+
+    def html_template():
+        TEMPLATE_HTML.format(
+            persona=parsed['persona'] or '',
+            head_assets=head,
+            page_style='',
+            diagram=MERMAID_DIAGRAM.format(mermaid_code=mermaid_code),
+            download_button=MERMAID_DOWNLOAD_BUTTON,
+            page_script=MERMAID_PAGE_SCRIPT,
+        )
+
+    stages = {
+        'expand_capability_references': lambda: expand_capability_references(md, journey_path, store=CapabilityStore(capabilities_dir)),
+        'parse_markdown': lambda: parse_markdown(expanded_md),
+        'parse_document': lambda: build_document(tokenize(md.splitlines()), journey_path, CapabilityStore(capabilities_dir)),
+        'parse_document_to_model': lambda: build_document(tokenize(journey_path.read_text(encoding='utf-8').splitlines()), journey_path, CapabilityStore(capabilities_dir)).to_parsed(),
+        'load_compiled': lambda: to_parsed(load_compiled(journey_path)),
+        'build_mermaid': lambda: build_mermaid(parsed),
+        'build_mermaid_compact': lambda: build_mermaid(parsed, compact=True),
+        'build_svg': lambda: build_svg(parsed, STATE_COLORS),
+        'html_template': html_template,
+        'validate_main_markdown': lambda: validate_lines(md.splitlines(), journey_path, CapabilityStore(capabilities_dir)),
+        'render_journey': render,
+    }
+    return {stage: _time(fn, repeat) for stage, fn in stages.items()}
+
+
+def bench_memory(journey_path: Path) -> dict:
+    """
+    Traced memory of render_journey writing each output format, from reading the source
+    to writing the file: the peak and the size of the written file, in bytes. For
+    comparison, 'model' is the memory held by the parsed journey model, as bytes and
+    as a count of allocated blocks. Capability files are loaded beforehand, as in the server.
+    """
+    tracemalloc.start()
+    try:
+        parsed = build_document(tokenize(read_lines(journey_path)), journey_path).to_parsed()
+        stats = tracemalloc.take_snapshot().statistics('filename')
+    finally:
+        tracemalloc.stop()
+    del parsed
+    memory = {'model': {
+        'bytes': sum(stat.size for stat in stats),
+        'blocks': sum(stat.count for stat in stats),
+    }}
+    output_dir = Path(tempfile.mkdtemp(dir=journey_path.parent))
+    for name, options in MEMORY_FORMATS.items():
+        output_path = output_dir / f"journey-{name}.out"
+        tracemalloc.start()
+        try:
+            render_journey(journey_path, output_path, options)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        memory[name] = {'peak': peak, 'output': output_path.stat().st_size}
+    return memory
+
+
+def run_suite(sizes: list[int], repeat: int, capabilities_per_event: int, shared_capabilities: int,
+              unique_fraction: float, description_words: int) -> dict:
+    """
+    Generates a journey for each size and benchmarks every stage on it.
+    """
+    results = {}
+    peak_memory = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for events in sizes:
+            journey_path = generate_journey(
+                Path(tmp) / f"events-{events}", f"journey_{events}", events, capabilities_per_event,
+                shared_capabilities, unique_fraction, description_words
+            )
+            # After the stages, so capability files are already loaded
+            results[str(events)] = bench_stages(journey_path, repeat)
+            peak_memory[str(events)] = bench_memory(journey_path)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'parameters': {
+            'repeat': repeat,
+            'capabilities_per_event': capabilities_per_event,
+            'shared_capabilities': shared_capabilities,
+            'unique_fraction': unique_fraction,
+            'description_words': description_words,
+        },
+        'results': results,
+        'peak_memory': peak_memory,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Returns a message for every stage that regressed against the baseline.
+    """
+    regressions = []
+    for size, stages in results['results'].items():
+        for stage, seconds in stages.items():
+            previous = baseline.get('results', {}).get(size, {}).get(stage)
+            if previous is None:
+                continue
+            if seconds > previous * (1 + threshold) and seconds - previous > MIN_REGRESSION_SECONDS:
+                regressions.append(
+                    f"{stage} ({size} events): {seconds * 1000:.2f} ms vs baseline {previous * 1000:.2f} ms "
+                    f"(+{(seconds / previous - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def bench_validator(events: int, repeat: int) -> float:
+    """
+    Returns the best validator throughput, in lines per second, over `repeat` runs.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        journey_path = generate_journey(Path(tmp), "large_journey", events, 1, 1, 0.0, 16)
+        line_count = len(journey_path.read_text(encoding='utf-8').splitlines())
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            validate_main_markdown(journey_path)
+            best = min(best, time.perf_counter() - start)
+    return line_count / best
+
+
+def print_results(results: dict):
+    sizes = list(results['results'])
+    stages = list(results['results'][sizes[0]]) if sizes else []
+    print(f"{'stage':32}" + ''.join(f"{size + ' events':>16}" for size in sizes))
+    for stage in stages:
+        print(f"{stage:32}" + ''.join(f"{results['results'][size][stage] * 1000:>13.2f} ms" for size in sizes))
+    if results.get('peak_memory'):
+        memory = results['peak_memory']
+        print(f"\n{'peak memory of render_journey':32}" + ''.join(f"{size + ' events':>16}" for size in sizes))
+        print(f"{'parsed model':32}" + ''.join(f"{memory[size]['model']['bytes'] / 1024:>12,.0f} KiB" for size in sizes))
+        print(f"{'parsed model (blocks)':32}" + ''.join(f"{memory[size]['model']['blocks']:>16,}" for size in sizes))
+        for name in MEMORY_FORMATS:
+            print(f"{name:32}" + ''.join(f"{memory[size][name]['peak'] / 1024:>12,.0f} KiB" for size in sizes))
+            print(f"{'  output':32}" + ''.join(f"{memory[size][name]['output'] / 1024:>12,.0f} KiB" for size in sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse/validate/render pipeline on synthetic journeys.")
+    parser.add_argument("--sizes", default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated journey sizes in events (default: 10,100,1000,5000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage; the median is reported (default: 5)")
+    parser.add_argument("--capabilities-per-event", type=int, default=2, help="Capability references per event (default: 2)")
+    parser.add_argument("--shared-capabilities", type=int, default=20, help="Number of shared capability files (default: 20)")
+    parser.add_argument("--unique-fraction", type=float, default=0.1, help="Fraction of references with a capability file of their own (default: 0.1)")
+    parser.add_argument("--description-words", type=int, default=12, help="Words per description (default: 12)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline results to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown per stage before failing (default: 0.25 = 25%%)")
+    parser.add_argument("--validator-events", type=int, default=50_000, help="Events in the journey used for the validator throughput check (default: 50000)")
+    parser.add_argument("--target", type=float, default=VALIDATOR_TARGET_LINES_PER_SECOND, help=f"Minimum validator throughput in lines/s (default: {VALIDATOR_TARGET_LINES_PER_SECOND:.0f})")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    # Measured first, before the suite leaves a large heap for the garbage collector to scan
+    throughput = bench_validator(args.validator_events, args.repeat)
+    results = run_suite(sizes, args.repeat, args.capabilities_per_event, args.shared_capabilities,
+                        args.unique_fraction, args.description_words)
+    print_results(results)
+    for size, stages in results['results'].items():
+        print(f"load_compiled vs parse_document_to_model ({size} events): "
+              f"{stages['parse_document_to_model'] / stages['load_compiled']:.1f}x faster")
+
+    failed = False
+    results['validator_lines_per_second'] = throughput
+    print(f"\nvalidate_main_markdown: {throughput:,.0f} lines/s (target {args.target:,.0f} lines/s)")
+    if throughput < args.target:
+        print("Benchmark FAILED: validator throughput is below target.")
+        failed = True
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+        print(f"Baseline written to {baseline_path}")
+    elif baseline_path.exists():
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nBenchmark FAILED: {len(regressions)} stage(s) regressed by more than {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"- {regression}")
+            failed = True
+        else:
+            print(f"\nNo stage regressed by more than {args.threshold:.0%} against {baseline_path}.")
+    else:
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to store one.")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
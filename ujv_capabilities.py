@@ -0,0 +1,158 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import ujv_profile
+
+# Default name of the directory holding capability markdown files, next to the journeys
+CAPABILITIES_DIR = Path("capabilities")
+
+# Maximum number of capability files kept in memory per capabilities directory
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def content_hasher():
+    """
+    Incremental form of content_hash: update() it with the data, then call hexdigest().
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+def parse_capability(text: str) -> dict:
+    """
+    Parses the content of a capability file into the same dict shape that
+    parse_markdown produces for a capability (title, description, state, link, edge_text).
+    """
+    capability = {
+        'title': '',
+        'description': '',
+        'state': '',
+        'link': '',
+        'edge_text': ''
+    }
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#### ') and not capability['title']:
+            capability['title'] = line[5:].strip()
+        elif not capability['description']:
+            capability['description'] = line
+        elif not capability['state']:
+            capability['state'] = line
+        elif not capability['link']:
+            capability['link'] = line
+        elif not capability['edge_text']:
+            capability['edge_text'] = line
+    return capability
+
+
+class CapabilityRecord:
+    """
+    A capability file loaded into memory. `errors` is filled in by the validator
+    the first time the file is validated and reused until the file changes.
+    """
+
+    __slots__ = ('stem', 'path', 'text', 'hash', 'mtime_ns', 'size', '_fields', 'errors')
+
+    def __init__(self, stem: str, path: Path, data: bytes, mtime_ns: int, size: int):
+        self.stem = stem
+        self.path = path
+        self.text = data.decode('utf-8')
+        self.hash = content_hash(data)
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self._fields = None
+        self.errors = None
+
+    @property
+    def fields(self) -> dict:
+        if self._fields is None:
+            self._fields = parse_capability(self.text)
+        return self._fields
+
+
+class CapabilityStore:
+    """
+    In-memory index of one capabilities directory, keyed by capability stem.
+    Files are read once and kept in a bounded LRU; a cached entry is reloaded
+    when the file's mtime or size changes.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, stem: str) -> Path:
+        return self.directory / f"{stem}.md"
+
+    def get(self, stem: str) -> CapabilityRecord | None:
+        """
+        Returns the capability record for a stem, or None if the file does not exist.
+        """
+        path = self.path_for(stem)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._records.pop(stem, None)
+            return None
+
+        with self._lock:
+            record = self._records.get(stem)
+            if record is not None and record.mtime_ns == stat.st_mtime_ns and record.size == stat.st_size:
+                self._records.move_to_end(stem)
+                return record
+
+        data = path.read_bytes()
+        ujv_profile.count('files_opened')
+        ujv_profile.count('bytes_read', len(data))
+        record = CapabilityRecord(stem, path, data, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            self._records[stem] = record
+            self._records.move_to_end(stem)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+        return record
+
+    def stems(self) -> list[str]:
+        """
+        Lists the stems of every capability file currently in the directory.
+        """
+        try:
+            with os.scandir(self.directory) as entries:
+                return sorted(entry.name[:-3] for entry in entries if entry.name.endswith('.md') and entry.is_file())
+        except OSError:
+            return []
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_store(directory: Path) -> CapabilityStore:
+    """
+    Returns the shared store for a capabilities directory, so the parser and the
+    validator running in the same process read each capability file only once.
+    """
+    key = os.path.abspath(directory)
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = CapabilityStore(Path(directory))
+        return store
+
+
+def capabilities_dir_for(journey_path: Path) -> Path:
+    """
+    Capability files are resolved relative to the journey file, not the working directory.
+    """
+    return Path(journey_path).parent / CAPABILITIES_DIR
@@ -0,0 +1,173 @@
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import ujv_capabilities
+import ujv_document
+import ujv_profile
+import ujv_validator
+from ujv_capabilities import content_hash
+from ujv_document import Document
+
+# Compiled journeys are stored in this directory next to their source, like __pycache__
+CACHE_DIRNAME = "__ujvcache__"
+COMPILED_FORMAT = "ujv-compiled"
+COMPILED_VERSION = 1
+
+# Field order of the capability rows in the compiled format
+CAPABILITY_FIELDS = ('title', 'description', 'state', 'link', 'edge_text')
+
+
+@lru_cache(maxsize=None)
+def model_fingerprint() -> str:
+    """
+    Hash of the code that builds the journey model and of the validator, whose errors
+    are stored with it. Compiled files written by a different parser or validator are
+    treated as stale.
+    """
+    modules = (ujv_capabilities, ujv_document, ujv_validator)
+    return content_hash(b''.join(Path(module.__file__).read_bytes() for module in modules) + Path(__file__).read_bytes())
+
+
+def compiled_path(source_path: Path) -> Path:
+    source_path = Path(source_path)
+    return source_path.parent / CACHE_DIRNAME / f"{source_path.stem}.json"
+
+
+def _stat_key(path: str) -> list | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def compile_document(document: Document, source_hash: str, errors: list[str] | None = None) -> dict:
+    """
+    Returns the compiled form of a parsed and expanded journey:
+    - 'source' and 'capabilities' record [mtime_ns, size, content hash] of the journey
+      (whose content_hash is passed as `source_hash`)
+      and of every capability file it references (null for missing files); capability
+      paths are relative to the journey's directory, so the cache survives moving the tree
+    - capabilities referenced several times are stored once in 'capability_table',
+      as rows in CAPABILITY_FIELDS order; events refer to them by index
+    - 'events' are [title, description, icon, [capability indexes]]
+    - 'errors' holds the validation errors, or null if the journey was not validated
+    """
+    table = []
+    indexes = {}
+    events = []
+    for event in document.events:
+        references = []
+        for ref in event.references:
+            if ref.record is None:
+                continue
+            index = indexes.get(ref.stem)
+            if index is None:
+                fields = ref.record.fields
+                index = indexes[ref.stem] = len(table)
+                table.append([fields[name] for name in CAPABILITY_FIELDS])
+            references.append(index)
+        events.append([event.title, event.description, event.icon, references])
+
+    capabilities = {}
+    for path, digest in document.dependencies().items():
+        stat = _stat_key(path) if digest is not None else None
+        capabilities[Path(os.path.relpath(path, document.path.parent)).as_posix()] = stat + [digest] if stat else None
+    return {
+        'format': COMPILED_FORMAT,
+        'version': COMPILED_VERSION,
+        'model': model_fingerprint(),
+        'source': (_stat_key(str(document.path)) or [0, 0]) + [source_hash],
+        'capabilities': capabilities,
+        'persona': document.persona,
+        'capability_table': table,
+        'events': events,
+        'errors': errors,
+    }
+
+
+def write_compiled(source_path: Path, compiled: dict):
+    """
+    Writes the compiled journey next to its source. The cache is best effort: an
+    unwritable source directory is silently skipped.
+    """
+    path = compiled_path(source_path)
+    tmp_path = path.with_suffix('.tmp')
+    try:
+        path.parent.mkdir(exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(compiled, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError:
+        return
+    ujv_profile.count('files_written')
+
+
+def _is_fresh(path: str, recorded: list | None) -> bool:
+    """
+    Checks a file against its recorded [mtime_ns, size, hash]. The content is only
+    hashed when the stat differs, e.g. after a checkout that touched the file.
+    """
+    stat = _stat_key(path)
+    if recorded is None or stat is None:
+        return recorded is None and stat is None
+    if stat == recorded[:2]:
+        return True
+    try:
+        return content_hash(Path(path).read_bytes()) == recorded[2]
+    except OSError:
+        return False
+
+
+def load_compiled(source_path: Path) -> dict | None:
+    """
+    Returns the compiled journey for a source file, or None if there is none or it
+    is stale: written by another format version or parser, or the journey or any
+    capability file it references has changed since.
+    """
+    try:
+        with open(compiled_path(source_path), 'r', encoding='utf-8') as f:
+            compiled = json.load(f)
+    except (OSError, ValueError):
+        return None
+    ujv_profile.count('files_opened')
+    if (compiled.get('format') != COMPILED_FORMAT or compiled.get('version') != COMPILED_VERSION
+            or compiled.get('model') != model_fingerprint()):
+        return None
+    if not _is_fresh(str(source_path), compiled['source']):
+        return None
+    directory = Path(source_path).parent
+    if not all(_is_fresh(str(directory / path), recorded) for path, recorded in compiled['capabilities'].items()):
+        return None
+    return compiled
+
+
+def to_parsed(compiled: dict) -> dict:
+    """
+    Expands a compiled journey into the dict structure produced by parse_markdown.
+    A capability referenced several times is one shared dict, as in Document.to_parsed.
+    """
+    table = [dict(zip(CAPABILITY_FIELDS, row)) for row in compiled['capability_table']]
+    return {
+        'persona': compiled['persona'],
+        'events': [
+            {
+                'title': title,
+                'description': description,
+                'icon': icon,
+                'capabilities': [table[index] for index in references],
+            }
+            for title, description, icon, references in compiled['events']
+        ]
+    }
+
+
+def dependencies(compiled: dict, source_path: Path) -> dict:
+    """
+    Content hash of every referenced capability file (None for missing files), keyed by path,
+    as returned by Document.dependencies().
+    """
+    directory = Path(source_path).parent
+    return {str(directory / path): recorded[2] if recorded else None for path, recorded in compiled['capabilities'].items()}
@@ -0,0 +1,280 @@
+import glob
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+import ujv_profile
+from ujv_capabilities import CAPABILITIES_DIR, CapabilityRecord, CapabilityStore, capabilities_dir_for, get_store
+
+# Capability reference, e.g. [capability:data-ingestion-pipeline]
+CAPABILITY_REF_RE = re.compile(r'\[capability:([a-zA-Z0-9_-]+)\]')
+
+# Token kinds, one per non-empty line
+TITLE = 'title'                    # # User Journey
+PERSONA_HEADING = 'persona'        # ## Persona
+EVENTS_HEADING = 'events'          # ## Events
+EVENT_HEADING = 'event'            # ### Event title
+CAPABILITY_HEADING = 'capability'  # #### Capability title (not allowed in journeys)
+HEADING = 'heading'                # any other line starting with '#'
+REFERENCE = 'reference'            # [capability:filename_stem]
+TEXT = 'text'
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str       # the stripped line
+    line: int       # 1-based line number in the source
+    stem: str | None = None  # referenced capability stem, if the line contains a reference
+
+
+def tokenize(lines: Iterable[str]) -> Iterator[Token]:
+    """
+    Turns the lines of a journey into tokens, skipping empty lines.
+    This is the single front end shared by the validator and the renderer.
+    """
+    search_reference = CAPABILITY_REF_RE.search
+    # Token(...) without the generated __new__ wrapper, which costs a third of the loop
+    new_token = tuple.__new__
+    regex_evaluations = 0
+    for line_no, line in enumerate(lines, 1):
+        stripped_line = line.strip()
+        if not stripped_line:
+            continue
+        stem = None
+        if "[capability:" in stripped_line:
+            regex_evaluations += 1
+            match = search_reference(stripped_line)
+            if match:
+                stem = match.group(1)
+        if stripped_line[0] == "#":
+            # Event headings first: they are by far the most common
+            if stripped_line.startswith("### "):
+                kind = EVENT_HEADING
+            elif stripped_line.startswith("# User Journey"):
+                kind = TITLE
+            elif stripped_line.startswith("## Persona"):
+                kind = PERSONA_HEADING
+            elif stripped_line.startswith("## Events"):
+                kind = EVENTS_HEADING
+            elif stripped_line.startswith("#### "):
+                kind = CAPABILITY_HEADING
+            else:
+                kind = HEADING
+        elif stem is not None:
+            kind = REFERENCE
+        else:
+            kind = TEXT
+        yield new_token(Token, (kind, stripped_line, line_no, stem))
+    ujv_profile.count('regex_evaluations', regex_evaluations)
+
+
+@dataclass
+class CapabilityRef:
+    stem: str
+    line: int
+    record: CapabilityRecord | None  # None if the capability file does not exist
+
+
+@dataclass
+class Event:
+    title: str
+    line: int
+    # Non-empty lines between the heading and the first capability reference: description, optional icon
+    lines: list[Token] = field(default_factory=list)
+    references: list[CapabilityRef] = field(default_factory=list)
+    # Text lines following a capability reference, which are not part of the format
+    trailing: list[Token] = field(default_factory=list)
+
+    @property
+    def description(self) -> str:
+        return self.lines[0].text if self.lines else ''
+
+    @property
+    def icon(self) -> str | None:
+        return self.lines[1].text if len(self.lines) > 1 else None
+
+
+@dataclass
+class Document:
+    path: Path
+    tokens: list[Token]
+    store: CapabilityStore
+    persona: str | None = None
+    events: list[Event] = field(default_factory=list)
+
+    def to_parsed(self) -> dict:
+        """
+        Returns the dict structure produced by parse_markdown, for build_mermaid and other consumers.
+        Missing capabilities are left out; the validator reports them. Capability dicts are
+        shared with the capability store rather than copied per reference, so they must not be modified.
+        """
+        return {
+            'persona': self.persona,
+            'events': [
+                {
+                    'title': event.title,
+                    'description': event.description,
+                    'icon': event.icon,
+                    'capabilities': [ref.record.fields for ref in event.references if ref.record is not None]
+                }
+                for event in self.events
+            ]
+        }
+
+    def dependencies(self) -> dict:
+        """
+        Content hash of every capability file the document references (None for missing files), keyed by path.
+        """
+        dependencies = {}
+        for token in self.tokens:
+            if token.stem is not None:
+                path = str(self.store.path_for(token.stem))
+                if path not in dependencies:
+                    record = self.store.get(token.stem)
+                    dependencies[path] = record.hash if record is not None else None
+        return dependencies
+
+
+def build_document(tokens: Iterable[Token], path: Path, store: CapabilityStore | None = None) -> Document:
+    """
+    Builds the document model from a token stream.
+    """
+    if store is None:
+        store = get_store(capabilities_dir_for(path))
+    document = Document(path=Path(path), tokens=list(tokens), store=store)
+    records = {}
+    in_persona = False
+    event = None
+    for token in document.tokens:
+        kind = token.kind
+        if kind == TEXT:
+            if in_persona:
+                document.persona = token.text
+                in_persona = False
+            elif event is not None:
+                (event.trailing if event.references else event.lines).append(token)
+            continue
+        in_persona = kind == PERSONA_HEADING
+        if kind == EVENT_HEADING:
+            event = Event(title=token.text[4:].strip(), line=token.line)
+            document.events.append(event)
+        elif kind == REFERENCE:
+            if event is not None:
+                if token.stem not in records:
+                    records[token.stem] = store.get(token.stem)
+                event.references.append(CapabilityRef(token.stem, token.line, records[token.stem]))
+        else:
+            # Any other heading ends the current event
+            event = None
+    return document
+
+
+def read_lines(filepath: Path, hasher=None) -> Iterator[str]:
+    """
+    Streams the lines of a UTF-8 file, split as str.splitlines() splits the whole text,
+    without holding the file in memory. With `hasher` (see content_hasher), the raw
+    bytes are also fed to it.
+    """
+    size = 0
+    with open(filepath, 'rb') as f:
+        ujv_profile.count('files_opened')
+        for raw in f:
+            size += len(raw)
+            if hasher is not None:
+                hasher.update(raw)
+            # A line may hold other separators splitlines() breaks on, such as '\r' or '\x0c'
+            yield from raw.decode('utf-8').splitlines()
+    ujv_profile.count('bytes_read', size)
+
+
+def parse_document(filepath: Path, store: CapabilityStore | None = None, hasher=None) -> Document:
+    """
+    Reads and parses a journey file into its document model, streaming its lines.
+    """
+    filepath = Path(filepath)
+    return build_document(tokenize(read_lines(filepath, hasher)), filepath, store)
+
+
+def is_journey_file(filepath: Path) -> bool:
+    """
+    A journey file is a markdown file whose first non-empty line is the '# User Journey' heading.
+    """
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line in f:
+                stripped_line = line.strip()
+                if stripped_line:
+                    return stripped_line.startswith('# User Journey')
+    except (OSError, UnicodeDecodeError):
+        return False
+    return False
+
+
+def glob_root(pattern: str) -> Path:
+    """
+    Returns the directory part of a glob pattern that precedes the first wildcard.
+    """
+    root = []
+    for part in Path(pattern).parts:
+        if glob.has_magic(part):
+            break
+        root.append(part)
+    return Path(*root) if root else Path('.')
+
+
+def walk_journeys(root: Path, skip_dirs: set) -> list[Path]:
+    """
+    Walks a directory tree and returns every journey file, skipping capability,
+    hidden and `skip_dirs` directories.
+    """
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames
+            if not d.startswith('.') and d != CAPABILITIES_DIR.name
+            and (Path(dirpath) / d).resolve() not in skip_dirs
+        )
+        for filename in sorted(filenames):
+            filepath = Path(dirpath) / filename
+            if filepath.suffix == '.md' and is_journey_file(filepath):
+                found.append(filepath)
+    return found
+
+
+def find_journeys(inputs: list[str], skip_dirs: set = frozenset()) -> list[tuple[Path, Path]]:
+    """
+    Resolves files, directories and glob patterns into the journey files they name,
+    each once, as (journey, root) pairs: root is the directory or the part of the glob
+    the journey was found below, or its own directory for an explicitly named file.
+    Directories in `skip_dirs` (resolved paths) are not searched.
+    """
+    found = []
+    seen = set()
+
+    def add(filepath: Path, root: Path):
+        key = filepath.resolve()
+        if key not in seen:
+            seen.add(key)
+            found.append((filepath, root))
+
+    for item in inputs:
+        if glob.has_magic(item):
+            root = glob_root(item)
+            for match in sorted(glob.glob(item, recursive=True)):
+                filepath = Path(match)
+                if filepath.is_dir():
+                    for journey in walk_journeys(filepath, skip_dirs):
+                        add(journey, root)
+                elif (filepath.suffix == '.md' and CAPABILITIES_DIR.name not in filepath.parts
+                      and is_journey_file(filepath)):
+                    add(filepath, root)
+        elif Path(item).is_dir():
+            root = Path(item)
+            for journey in walk_journeys(root, skip_dirs):
+                add(journey, root)
+        else:
+            filepath = Path(item)
+            add(filepath, filepath.parent)
+    return found
@@ -0,0 +1,95 @@
+import argparse
+import random
+from pathlib import Path
+
+from ujv_capabilities import CAPABILITIES_DIR
+from ujv_validator import ALLOWED_CAPABILITY_STATES
+
+ICONS = ["🗄️", "🧹", "🏷️", "🚀", "🔔", "📊", "🔒", "⚙️", "📦", "✅"]
+
+WORDS = (
+    "data pipeline quality ingest transform validate publish catalog metadata lineage schema "
+    "consumer producer stream batch table model feature dashboard alert owner contract "
+    "review deploy monitor domain product platform access storage compute notebook"
+).split()
+
+EDGE_TEXTS = ["Data Flow", "Validation Check", "Enrichment Process", "Alert Sent", "Uses"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(max(1, words))).capitalize()
+
+
+def write_capability(capabilities_dir: Path, stem: str, rng: random.Random, description_words: int) -> Path:
+    states = sorted(ALLOWED_CAPABILITY_STATES)
+    lines = [
+        f"#### {stem.replace('-', ' ').capitalize()}",
+        "",
+        _sentence(rng, description_words),
+        rng.choice(states),
+        f"https://github.com/org/{stem}",
+    ]
+    if rng.random() < 0.5:
+        lines.append(rng.choice(EDGE_TEXTS))
+    path = capabilities_dir / f"{stem}.md"
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+
+def generate_journey(directory: Path, name: str = "synthetic_journey", events: int = 100,
+                     capabilities_per_event: int = 2, shared_capabilities: int = 20,
+                     unique_fraction: float = 0.1, description_words: int = 12, seed: int = 0) -> Path:
+    """
+    Writes a synthetic journey and its capability files into directory.
+    Each capability reference points at one of `shared_capabilities` shared files, or,
+    with probability `unique_fraction`, at a capability file of its own.
+    Returns the path of the journey file.
+    """
+    rng = random.Random(seed)
+    directory = Path(directory)
+    capabilities_dir = directory / CAPABILITIES_DIR
+    capabilities_dir.mkdir(parents=True, exist_ok=True)
+
+    shared = [f"shared-capability-{idx}" for idx in range(shared_capabilities)]
+    for stem in shared:
+        if not (capabilities_dir / f"{stem}.md").exists():
+            write_capability(capabilities_dir, stem, rng, description_words)
+
+    lines = ["# User Journey", "", "## Persona", "", "Data Engineer", "", "## Events", ""]
+    for idx in range(events):
+        lines += [f"### {_sentence(rng, 4)} {idx}", "", _sentence(rng, description_words), rng.choice(ICONS), ""]
+        for cidx in range(capabilities_per_event):
+            if not shared or rng.random() < unique_fraction:
+                stem = f"{name}-capability-{idx}-{cidx}".replace('_', '-')
+                write_capability(capabilities_dir, stem, rng, description_words)
+            else:
+                stem = rng.choice(shared)
+            lines += [f"[capability:{stem}]", ""]
+
+    journey_path = directory / f"{name}.md"
+    journey_path.write_text('\n'.join(lines), encoding='utf-8')
+    return journey_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic user journeys for testing and benchmarking.")
+    parser.add_argument("output_dir", help="Directory to write the journeys and their capabilities/ directory to")
+    parser.add_argument("--journeys", type=int, default=1, help="Number of journeys to generate (default: 1)")
+    parser.add_argument("--events", type=int, default=100, help="Events per journey (default: 100)")
+    parser.add_argument("--capabilities-per-event", type=int, default=2, help="Capability references per event (default: 2)")
+    parser.add_argument("--shared-capabilities", type=int, default=20, help="Size of the pool of capability files shared by all events (default: 20)")
+    parser.add_argument("--unique-fraction", type=float, default=0.1, help="Fraction of references that get a capability file of their own (default: 0.1)")
+    parser.add_argument("--description-words", type=int, default=12, help="Words per event and capability description (default: 12)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    for idx in range(args.journeys):
+        journey_path = generate_journey(
+            Path(args.output_dir), f"synthetic_journey_{idx}", args.events, args.capabilities_per_event,
+            args.shared_capabilities, args.unique_fraction, args.description_words, args.seed + idx
+        )
+        print(f"Generated {journey_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import os
+import ssl
+import time
+from pathlib import Path
+from typing import Iterable, NamedTuple
+from urllib.parse import quote, urljoin, urlsplit
+
+DEFAULT_CACHE_FILE = Path(".ujv-link-cache.json")
+CACHE_VERSION = 1
+
+# Checked links are trusted for a day by default
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_CONCURRENCY = 32
+# Connections and request rate allowed per host, to stay below rate limits such as GitHub's
+DEFAULT_PER_HOST = 4
+DEFAULT_RATE = 5.0
+
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# Servers that refuse HEAD are asked again with GET
+HEAD_REFUSED_STATUSES = {405, 501}
+MAX_HEADER_LINES = 100
+USER_AGENT = "ujv-link-checker/1"
+# Characters left as they are when percent-encoding a request target; '%' keeps existing escapes
+TARGET_SAFE_CHARS = "/?&=%:@!$'()*+,;~"
+
+
+class LinkResult(NamedTuple):
+    url: str
+    ok: bool
+    status: int | None   # final HTTP status, after redirects
+    error: str | None    # connection error or timeout, if no status was received
+    checked: float       # time.time() of the check
+
+
+def is_checkable(link: str) -> bool:
+    return link.startswith(('http://', 'https://'))
+
+
+def is_definitive(result: LinkResult) -> bool:
+    """
+    Whether a result is worth caching. Timeouts, connection errors, rate limiting
+    and server errors may be transient and are checked again on the next run.
+    """
+    return result.status is not None and result.status != 429 and result.status < 500
+
+
+class LinkCache:
+    """
+    Link results stored on disk. Entries older than `ttl` seconds are re-checked,
+    and dropped from the file when it is saved. Only definitive results are kept.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_FILE, ttl: float = DEFAULT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CACHE_VERSION:
+                self.entries = {url: LinkResult(url, *entry) for url, entry in data['links'].items()}
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def get(self, url: str, now: float) -> LinkResult | None:
+        result = self.entries.get(url)
+        if result is not None and now - result.checked < self.ttl:
+            return result
+        return None
+
+    def put(self, result: LinkResult):
+        if is_definitive(result):
+            self.entries[result.url] = result
+        else:
+            self.entries.pop(result.url, None)
+
+    def save(self, now: float | None = None):
+        now = time.time() if now is None else now
+        links = {url: list(result[1:]) for url, result in sorted(self.entries.items()) if now - result.checked < self.ttl}
+        tmp_path = Path(f"{self.path}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'links': links}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class _HostPool:
+    """
+    Idle keep-alive connections to one scheme/host/port, a limit on the connections
+    in use, and a rate limiter spacing request starts 1/rate seconds apart.
+    """
+
+    def __init__(self, per_host: int, rate: float):
+        self.connections = asyncio.Semaphore(per_host)
+        self.idle = []
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.next_start = 0.0
+
+    async def throttle(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+async def _read_head(reader: asyncio.StreamReader) -> tuple[int, dict]:
+    """
+    Reads a response status line and headers. Interim 1xx responses are skipped.
+    """
+    while True:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by server")
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+            raise ValueError(f"Malformed status line {status_line[:80]!r}")
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if not 100 <= int(parts[1]) < 200:
+            return int(parts[1]), headers
+
+
+class LinkChecker:
+    """
+    Checks links concurrently on one event loop, with pooled keep-alive connections
+    and per-host connection and rate limits. Links are checked with HEAD, falling
+    back to GET for servers refusing HEAD, and redirects are followed.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                 rate: float = DEFAULT_RATE, timeout: float = DEFAULT_TIMEOUT):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.rate = rate
+        self.timeout = timeout
+        self._hosts = {}
+        self._ssl = None
+
+    def _pool(self, key: tuple) -> _HostPool:
+        pool = self._hosts.get(key)
+        if pool is None:
+            pool = self._hosts[key] = _HostPool(self.per_host, self.rate)
+        return pool
+
+    async def _connect(self, scheme: str, host: str, port: int):
+        if scheme == 'https':
+            if self._ssl is None:
+                self._ssl = ssl.create_default_context()
+            return await asyncio.open_connection(host, port, ssl=self._ssl, server_hostname=host)
+        return await asyncio.open_connection(host, port)
+
+    async def _request(self, url: str, method: str) -> tuple[int, dict]:
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        if scheme not in ('http', 'https') or not host:
+            raise ValueError(f"Unsupported URL {url!r}")
+        port = parts.port or (443 if scheme == 'https' else 80)
+        # Links may be IRIs: the host is IDNA-encoded and the path and query percent-encoded
+        if not host.isascii():
+            host = host.encode('idna').decode('ascii')
+        target = quote((parts.path or '/') + (f"?{parts.query}" if parts.query else ''), safe=TARGET_SAFE_CHARS)
+        host_header = (f"[{host}]" if ':' in host else host) + (f":{parts.port}" if parts.port else '')
+        # Only HEAD responses have no body, so only those connections can be reused without reading one
+        keep_alive = method == 'HEAD'
+        request = (
+            f"{method} {target} HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: {USER_AGENT}\r\n"
+            f"Accept: */*\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode('latin-1')
+
+        pool = self._pool((scheme, host, port))
+        async with pool.connections:
+            await pool.throttle()
+            # The timeout starts once the request may be sent, not while it waits for its turn
+            return await asyncio.wait_for(self._exchange(pool, scheme, host, port, request, keep_alive), self.timeout)
+
+    async def _exchange(self, pool: _HostPool, scheme: str, host: str, port: int, request: bytes,
+                        keep_alive: bool) -> tuple[int, dict]:
+        while True:
+            reused = bool(pool.idle)
+            reader, writer = pool.idle.pop() if reused else await self._connect(scheme, host, port)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers = await _read_head(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    # The server closed the idle connection; retry on a new one
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive and headers.get('connection', '').lower() != 'close':
+                pool.idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, headers
+
+    async def check(self, url: str) -> LinkResult:
+        target = url
+        status = None
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, headers = await self._request(target, 'HEAD')
+                if status in HEAD_REFUSED_STATUSES:
+                    status, headers = await self._request(target, 'GET')
+                if status in REDIRECT_STATUSES and headers.get('location'):
+                    target = urljoin(target, headers['location'])
+                    continue
+                return LinkResult(url, status < 400, status, None, time.time())
+            return LinkResult(url, False, status, f"More than {MAX_REDIRECTS} redirects", time.time())
+        except asyncio.TimeoutError:
+            return LinkResult(url, False, None, f"Timed out after {self.timeout:g}s", time.time())
+        except (OSError, ValueError) as e:
+            return LinkResult(url, False, None, f"{type(e).__name__}: {e}", time.time())
+
+    async def check_all(self, urls: Iterable[str]) -> list[LinkResult]:
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(url):
+            async with limit:
+                return await self.check(url)
+
+        try:
+            return await asyncio.gather(*(bounded(url) for url in urls))
+        finally:
+            for pool in self._hosts.values():
+                pool.close()
+            self._hosts.clear()
+
+
+def check_links(urls: Iterable[str], cache: LinkCache | None = None, **checker_options) -> tuple[dict, int]:
+    """
+    Checks each distinct URL once, skipping those with a fresh cached result.
+    Returns the results keyed by URL and the number of links actually checked.
+    """
+    now = time.time()
+    results = {}
+    pending = []
+    for url in dict.fromkeys(urls):
+        cached = cache.get(url, now) if cache is not None else None
+        if cached is not None:
+            results[url] = cached
+        else:
+            pending.append(url)
+    if pending:
+        for result in asyncio.run(LinkChecker(**checker_options).check_all(pending)):
+            results[result.url] = result
+            if cache is not None:
+                cache.put(result)
+    if cache is not None:
+        cache.save(now)
+    return results, len(pending)
+
+
+def describe_failure(result: LinkResult) -> str:
+    return f"HTTP {result.status}" if result.error is None else result.error
@@ -0,0 +1,543 @@
+import argparse
+import bisect
+import json
+import os
+import re
+import sys
+import traceback
+from operator import attrgetter
+from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+from ujv_capabilities import CAPABILITIES_DIR, CapabilityStore, capabilities_dir_for, get_store
+from ujv_document import CAPABILITY_REF_RE, TITLE, Token, tokenize
+from ujv_validator import CapabilityCheck, check_block, check_document_end, resolve_capability_checks, validate_capability_file
+
+# Protocol constants from the Language Server Protocol specification
+SYNC_INCREMENTAL = 2
+SEVERITY_ERROR = 1
+COMPLETION_KIND_REFERENCE = 18
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+
+# Completion lists are cut off here and marked incomplete, so the client asks again as the user types
+MAX_COMPLETION_ITEMS = 200
+
+# Unfinished capability reference ending at the cursor, e.g. "[capability:data-in"
+PARTIAL_REF_RE = re.compile(r'\[capability:([a-zA-Z0-9_-]*)$')
+
+# Capability files watched by the client, if it supports registering file watchers
+CAPABILITY_GLOB = f"**/{CAPABILITIES_DIR.name}/*.md"
+
+
+def uri_to_path(uri: str) -> Path:
+    return Path(url2pathname(urlsplit(uri).path))
+
+
+def _is_event_heading(line: str) -> bool:
+    return line.strip().startswith('### ')
+
+
+def _to_index(text: str, character: int, utf16: bool) -> int:
+    """
+    Converts an LSP character offset into an index into `text`.
+    """
+    if not utf16 or text.isascii():
+        return min(character, len(text))
+    units = 0
+    for index, char in enumerate(text):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(text)
+
+
+def _to_character(text: str, index: int, utf16: bool) -> int:
+    """
+    Converts an index into `text` into an LSP character offset.
+    """
+    if not utf16 or text.isascii():
+        return index
+    return len(text[:index].encode('utf-16-le')) // 2
+
+
+def apply_edit(lines: list[str], start: dict, end: dict, text: str, utf16: bool) -> tuple[int, int, int]:
+    """
+    Replaces the text between two LSP positions in a list of lines. Returns the first
+    and last replaced lines and the change in the number of lines.
+    """
+    start_line = min(start['line'], len(lines) - 1)
+    end_line = min(end['line'], len(lines) - 1)
+    start_index = _to_index(lines[start_line], start['character'], utf16)
+    end_index = _to_index(lines[end_line], end['character'], utf16) if end['line'] < len(lines) else len(lines[end_line])
+    new_lines = (lines[start_line][:start_index] + text + lines[end_line][end_index:]).split('\n')
+    lines[start_line:end_line + 1] = new_lines
+    return start_line, end_line, len(new_lines) - (end_line - start_line + 1)
+
+
+class Block:
+    """
+    A run of journey lines starting at a ### event heading, or at the top of the
+    file for the first block. `tokens` are numbered from 1 within the block and
+    `diagnostics` hold (line within the block, message), so a block whose text is
+    unchanged stays valid when lines are inserted or removed above it.
+    """
+
+    __slots__ = ('start', 'tokens', 'entries', 'section_in', 'section_out', 'events', 'stems', 'diagnostics')
+
+    def __init__(self, start: int, tokens: list[Token]):
+        self.start = start
+        self.tokens = tokens
+        self.entries = []
+        self.section_in = self.section_out = None
+        self.events = 0
+        self.stems = set()
+        self.diagnostics = []
+
+
+class JourneyDocument:
+    """
+    An open journey split into blocks at its event headings. An edit re-tokenizes and
+    re-checks only the blocks it touches; following blocks are re-checked only while
+    the section they start in differs from before, e.g. after '## Events' was edited.
+    """
+
+    def __init__(self, uri: str, text: str, version: int | None = None):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.version = version
+        self.store = get_store(capabilities_dir_for(self.path))
+        self._line_prefix = f"Error in {self.path} (line "
+        self._file_prefix = f"Error in {self.path}: "
+        self.set_text(text)
+
+    def set_text(self, text: str):
+        self.lines = text.split('\n')
+        self.blocks = self._split(0, len(self.lines))
+        self._check(0, len(self.blocks))
+
+    def is_journey(self) -> bool:
+        """
+        Like is_journey_file: the first non-empty line must be the '# User Journey' heading.
+        """
+        tokens = self.blocks[0].tokens
+        return bool(tokens) and tokens[0].kind == TITLE
+
+    def _split(self, start: int, end: int) -> list[Block]:
+        starts = [start] + [line for line in range(start + 1, end) if _is_event_heading(self.lines[line])]
+        starts.append(end)
+        return [
+            Block(block_start, list(tokenize(self.lines[block_start:block_end])))
+            for block_start, block_end in zip(starts, starts[1:])
+        ]
+
+    def _check(self, first: int, stop: int):
+        """
+        Checks blocks[first:stop], then any following blocks whose starting section changed.
+        """
+        section = self.blocks[first - 1].section_out if first > 0 else None
+        for index in range(first, len(self.blocks)):
+            block = self.blocks[index]
+            if index >= stop and block.section_in == section:
+                break
+            block.entries, block.section_out, block.events = check_block(block.tokens, self.path, section)
+            block.section_in = section
+            block.stems = {entry.stem for entry in block.entries if isinstance(entry, CapabilityCheck)}
+            self._resolve(block)
+            section = block.section_out
+
+    def _split_message(self, message: str, line: int) -> tuple[int, str]:
+        """
+        Strips the file and line prefix of a validator error, returning the line it names
+        (or `line`) and the rest of the message.
+        """
+        if message.startswith(self._line_prefix):
+            number, _, text = message[len(self._line_prefix):].partition('): ')
+            return int(number), text
+        if message.startswith(self._file_prefix):
+            return line, message[len(self._file_prefix):]
+        return line, message
+
+    def _resolve(self, block: Block):
+        """
+        Turns a block's check results into diagnostics, looking up referenced capabilities.
+        Errors of a capability file are reported on the line referencing it.
+        """
+        diagnostics = []
+        for entry in block.entries:
+            if isinstance(entry, CapabilityCheck):
+                diagnostics.extend(self._split_message(message, entry.line)
+                                   for message in resolve_capability_checks([entry], self.path, self.store))
+            else:
+                diagnostics.append(self._split_message(entry, 1))
+        block.diagnostics = diagnostics
+
+    def edit(self, start: dict, end: dict, text: str, utf16: bool):
+        """
+        Applies an incremental change replacing the text between two LSP positions.
+        """
+        lines = self.lines
+        start_line, end_line, delta = apply_edit(lines, start, end, text, utf16)
+        blocks = self.blocks
+        first = bisect.bisect_right(blocks, start_line, key=attrgetter('start')) - 1
+        last = bisect.bisect_right(blocks, end_line, key=attrgetter('start')) - 1
+        # An edited event heading that is no longer one joins the previous block
+        if first > 0 and not _is_event_heading(lines[blocks[first].start]):
+            first -= 1
+        region_end = blocks[last + 1].start + delta if last + 1 < len(blocks) else len(lines)
+        replacement = self._split(blocks[first].start, region_end)
+        for block in blocks[last + 1:]:
+            block.start += delta
+        blocks[first:last + 1] = replacement
+        self._check(first, first + len(replacement))
+
+    def refresh_capability(self, stem: str) -> bool:
+        """
+        Re-resolves the blocks referencing a capability whose file changed on disk.
+        """
+        blocks = [block for block in self.blocks if stem in block.stems]
+        for block in blocks:
+            self._resolve(block)
+        return bool(blocks)
+
+    def _range(self, line: int, utf16: bool) -> dict:
+        text = self.lines[line] if line < len(self.lines) else ''
+        start = len(text) - len(text.lstrip())
+        end = len(text.rstrip())
+        return {
+            'start': {'line': line, 'character': _to_character(text, start, utf16)},
+            'end': {'line': line, 'character': _to_character(text, end, utf16)},
+        }
+
+    def diagnostics(self, utf16: bool) -> list[dict]:
+        if not self.is_journey():
+            return []
+        results = []
+        for block in self.blocks:
+            for line, message in block.diagnostics:
+                results.append(self._diagnostic(block.start + line - 1, message, utf16))
+        events = sum(block.events for block in self.blocks)
+        for message in check_document_end(self.path, self.blocks[-1].section_out, events):
+            results.append(self._diagnostic(0, self._split_message(message, 1)[1], utf16))
+        return results
+
+    def _diagnostic(self, line: int, message: str, utf16: bool) -> dict:
+        return {'range': self._range(line, utf16), 'severity': SEVERITY_ERROR, 'source': 'ujv', 'message': message}
+
+    def reference_at(self, line: int, character: int, utf16: bool):
+        """
+        Returns the capability reference under the cursor as (stem, match), or None.
+        """
+        if line >= len(self.lines):
+            return None
+        text = self.lines[line]
+        index = _to_index(text, character, utf16)
+        for match in CAPABILITY_REF_RE.finditer(text):
+            if match.start() <= index <= match.end():
+                return match.group(1), match
+        return None
+
+
+class CapabilityDocument:
+    """
+    An open capability file, validated from the editor's text on every change.
+    """
+
+    def __init__(self, uri: str, text: str, version: int | None = None):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.version = version
+        self.set_text(text)
+
+    def set_text(self, text: str):
+        self.lines = text.split('\n')
+
+    def edit(self, start: dict, end: dict, text: str, utf16: bool):
+        apply_edit(self.lines, start, end, text, utf16)
+
+    def diagnostics(self, utf16: bool) -> list[dict]:
+        prefix = f"Error in {self.path}: "
+        first_line = self.lines[0]
+        span = {
+            'start': {'line': 0, 'character': 0},
+            'end': {'line': 0, 'character': _to_character(first_line, len(first_line.rstrip()), utf16)},
+        }
+        return [
+            {'range': span, 'severity': SEVERITY_ERROR, 'source': 'ujv', 'message': message.removeprefix(prefix)}
+            for message in validate_capability_file(self.path, '\n'.join(self.lines))
+        ]
+
+
+class CapabilityIndex:
+    """
+    Sorted capability stems of one directory, for completion. The listing is redone
+    only when the directory's mtime changes, i.e. when files are added or removed.
+    """
+
+    def __init__(self, store: CapabilityStore):
+        self.store = store
+        self.mtime_ns = None
+        self.stems = []
+
+    def matching(self, prefix: str) -> list[str]:
+        try:
+            mtime_ns = os.stat(self.store.directory).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if mtime_ns != self.mtime_ns:
+            self.mtime_ns = mtime_ns
+            self.stems = self.store.stems()
+        start = bisect.bisect_left(self.stems, prefix)
+        matches = []
+        for stem in self.stems[start:start + MAX_COMPLETION_ITEMS + 1]:
+            if not stem.startswith(prefix):
+                break
+            matches.append(stem)
+        return matches
+
+
+def hover_markdown(record) -> str:
+    fields = record.fields
+    parts = [f"**{fields['title']}**", fields['description'], f"State: {fields['state']}"]
+    if fields['link']:
+        parts.append(fields['link'])
+    if fields['edge_text']:
+        parts.append(f"Edge text: {fields['edge_text']}")
+    return "\n\n".join(part for part in parts if part)
+
+
+class LanguageServer:
+    """
+    Language server for journey and capability markdown files, speaking JSON-RPC
+    over a pair of binary streams.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.documents = {}
+        self.indexes = {}
+        self.utf16 = True
+        self.initialized = False
+        self.register_watchers = False
+        self.shutdown_requested = False
+        self._next_request_id = 0
+        self.handlers = {
+            'initialize': self.initialize,
+            'initialized': self.on_initialized,
+            'shutdown': self.shutdown,
+            'textDocument/didOpen': self.did_open,
+            'textDocument/didChange': self.did_change,
+            'textDocument/didSave': self.did_save,
+            'textDocument/didClose': self.did_close,
+            'textDocument/hover': self.hover,
+            'textDocument/completion': self.completion,
+            'workspace/didChangeWatchedFiles': self.did_change_watched_files,
+        }
+
+    def read_message(self) -> dict | None:
+        length = None
+        while True:
+            line = self.reader.readline()
+            if not line:
+                return None
+            if line in (b'\r\n', b'\n'):
+                break
+            name, _, value = line.decode('ascii').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        if length is None:
+            return None
+        return json.loads(self.reader.read(length))
+
+    def send(self, message: dict):
+        body = json.dumps({'jsonrpc': '2.0', **message}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+        self.writer.flush()
+
+    def notify(self, method: str, params: dict):
+        self.send({'method': method, 'params': params})
+
+    def request(self, method: str, params: dict):
+        # Responses to the server's own requests are not needed and are ignored
+        self._next_request_id += 1
+        self.send({'id': f"ujv-{self._next_request_id}", 'method': method, 'params': params})
+
+    def serve(self) -> int:
+        """
+        Handles messages until 'exit' or the end of input. Returns the process exit code.
+        """
+        while True:
+            message = self.read_message()
+            if message is None:
+                return 1
+            method = message.get('method')
+            if method == 'exit':
+                return 0 if self.shutdown_requested else 1
+            if method is not None:
+                self.dispatch(method, message)
+
+    def dispatch(self, method: str, message: dict):
+        request_id = message.get('id')
+        handler = self.handlers.get(method)
+        if handler is None:
+            if request_id is not None:
+                self.send({'id': request_id, 'error': {'code': METHOD_NOT_FOUND, 'message': f"Unknown method {method}"}})
+            return
+        if not self.initialized and method != 'initialize' and request_id is not None:
+            self.send({'id': request_id, 'error': {'code': SERVER_NOT_INITIALIZED, 'message': "Server not initialized"}})
+            return
+        try:
+            result = handler(message.get('params') or {})
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            if request_id is not None:
+                self.send({'id': request_id, 'error': {'code': INTERNAL_ERROR, 'message': f"{type(e).__name__}: {e}"}})
+            return
+        if request_id is not None:
+            self.send({'id': request_id, 'result': result})
+
+    def initialize(self, params: dict) -> dict:
+        capabilities = params.get('capabilities') or {}
+        encodings = (capabilities.get('general') or {}).get('positionEncodings') or []
+        # Python string indexes are UTF-32 offsets, so no conversion is needed if the client accepts them
+        self.utf16 = 'utf-32' not in encodings
+        watched = (capabilities.get('workspace') or {}).get('didChangeWatchedFiles') or {}
+        self.register_watchers = bool(watched.get('dynamicRegistration'))
+        self.initialized = True
+        return {
+            'capabilities': {
+                'positionEncoding': 'utf-16' if self.utf16 else 'utf-32',
+                'textDocumentSync': {'openClose': True, 'change': SYNC_INCREMENTAL, 'save': {'includeText': False}},
+                'hoverProvider': True,
+                'completionProvider': {'triggerCharacters': [':']},
+            },
+            'serverInfo': {'name': 'ujv-lsp'},
+        }
+
+    def on_initialized(self, params: dict):
+        if self.register_watchers:
+            self.request('client/registerCapability', {'registrations': [{
+                'id': 'ujv-capabilities',
+                'method': 'workspace/didChangeWatchedFiles',
+                'registerOptions': {'watchers': [{'globPattern': CAPABILITY_GLOB}]},
+            }]})
+
+    def shutdown(self, params: dict):
+        self.shutdown_requested = True
+        return None
+
+    def publish(self, document):
+        self.notify('textDocument/publishDiagnostics', {
+            'uri': document.uri, 'version': document.version, 'diagnostics': document.diagnostics(self.utf16),
+        })
+
+    def did_open(self, params: dict):
+        item = params['textDocument']
+        path = uri_to_path(item['uri'])
+        document_class = CapabilityDocument if path.parent.name == CAPABILITIES_DIR.name else JourneyDocument
+        document = self.documents[item['uri']] = document_class(item['uri'], item['text'], item.get('version'))
+        self.publish(document)
+
+    def did_change(self, params: dict):
+        document = self.documents.get(params['textDocument']['uri'])
+        if document is None:
+            return
+        document.version = params['textDocument'].get('version')
+        for change in params['contentChanges']:
+            if 'range' in change:
+                document.edit(change['range']['start'], change['range']['end'], change['text'], self.utf16)
+            else:
+                document.set_text(change['text'])
+        self.publish(document)
+
+    def did_save(self, params: dict):
+        path = uri_to_path(params['textDocument']['uri'])
+        if path.parent.name == CAPABILITIES_DIR.name:
+            self.capability_changed(path)
+
+    def did_close(self, params: dict):
+        uri = params['textDocument']['uri']
+        if self.documents.pop(uri, None) is not None:
+            self.notify('textDocument/publishDiagnostics', {'uri': uri, 'diagnostics': []})
+
+    def did_change_watched_files(self, params: dict):
+        for change in params.get('changes', []):
+            self.capability_changed(uri_to_path(change['uri']))
+
+    def capability_changed(self, path: Path):
+        """
+        Updates the diagnostics of open journeys referencing a capability file that changed on disk.
+        """
+        directory = os.path.abspath(path.parent)
+        for document in list(self.documents.values()):
+            if (isinstance(document, JourneyDocument) and os.path.abspath(document.store.directory) == directory
+                    and document.refresh_capability(path.stem)):
+                self.publish(document)
+
+    def hover(self, params: dict) -> dict | None:
+        document = self.documents.get(params['textDocument']['uri'])
+        if not isinstance(document, JourneyDocument):
+            return None
+        position = params['position']
+        found = document.reference_at(position['line'], position['character'], self.utf16)
+        if found is None:
+            return None
+        stem, match = found
+        record = document.store.get(stem)
+        if record is None:
+            value = f"Capability file `{document.store.path_for(stem)}` not found."
+        else:
+            value = hover_markdown(record)
+        text = document.lines[position['line']]
+        return {
+            'contents': {'kind': 'markdown', 'value': value},
+            'range': {
+                'start': {'line': position['line'], 'character': _to_character(text, match.start(), self.utf16)},
+                'end': {'line': position['line'], 'character': _to_character(text, match.end(), self.utf16)},
+            },
+        }
+
+    def completion(self, params: dict) -> dict:
+        document = self.documents.get(params['textDocument']['uri'])
+        position = params['position']
+        if not isinstance(document, JourneyDocument) or position['line'] >= len(document.lines):
+            return {'isIncomplete': False, 'items': []}
+        text = document.lines[position['line']]
+        cursor = _to_index(text, position['character'], self.utf16)
+        match = PARTIAL_REF_RE.search(text, 0, cursor)
+        if match is None:
+            return {'isIncomplete': False, 'items': []}
+        directory = os.path.abspath(document.store.directory)
+        index = self.indexes.get(directory)
+        if index is None:
+            index = self.indexes[directory] = CapabilityIndex(document.store)
+        stems = index.matching(match.group(1))
+        closing = '' if text[cursor:cursor + 1] == ']' else ']'
+        replace = {
+            'start': {'line': position['line'], 'character': _to_character(text, match.start(1), self.utf16)},
+            'end': position,
+        }
+        items = []
+        for stem in stems[:MAX_COMPLETION_ITEMS]:
+            record = document.store.get(stem)
+            item = {'label': stem, 'kind': COMPLETION_KIND_REFERENCE, 'textEdit': {'range': replace, 'newText': stem + closing}}
+            if record is not None:
+                item['detail'] = f"{record.fields['title']} ({record.fields['state']})"
+                item['documentation'] = {'kind': 'markdown', 'value': hover_markdown(record)}
+            items.append(item)
+        return {'isIncomplete': len(stems) > MAX_COMPLETION_ITEMS, 'items': items}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Language server for user journey markdown files, over stdio.')
+    parser.add_argument('--stdio', action='store_true', help='Accepted for editor compatibility; stdio is the only transport')
+    parser.parse_args()
+    server = LanguageServer(sys.stdin.buffer, sys.stdout.buffer)
+    sys.exit(server.serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,27 @@
-import re
 import sys
 import os
 from pathlib import Path
 import argparse
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter, defaultdict
+from functools import partial
+from html import escape
+from typing import Callable, Iterable, Iterator
+
+import ujv_assets
+import ujv_capabilities
+import ujv_compiled
+import ujv_document
+import ujv_profile
+import ujv_svg
+import ujv_validator
+from ujv_capabilities import CapabilityStore, capabilities_dir_for, content_hash, content_hasher, get_store
+from ujv_document import CAPABILITY_REF_RE, build_document, find_journeys, read_lines, tokenize
+from ujv_assets import ASSET_MODES, CLASS_ATTR_RE, VENDOR_DIR, head_tags, page_assets, publish_shared_assets, vendored_path
+from ujv_svg import build_svg, iter_svg, layout
+from ujv_validator import validate_document
 
 TEMPLATE_HTML = """
 <!DOCTYPE html>
@@ -12,10 +30,7 @@ TEMPLATE_HTML = """
     <meta charset=\"UTF-8\">
     <meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">
     <title>User Journey</title>
-    <script src=\"https://cdn.jsdelivr.net/npm/mermaid@10.9.0/dist/mermaid.min.js\"></script>
-    <link href=\"https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700&display=swap\" rel=\"stylesheet\">
-    <link rel=\"stylesheet\" href=\"https://unpkg.com/material-components-web@latest/dist/material-components-web.min.css\">
-    <script src=\"https://unpkg.com/material-components-web@latest/dist/material-components-web.min.js\"></script>
+{head_assets}
     <style>
         body {{ font-family: 'Roboto', sans-serif; margin: 0; padding: 0; background-color: #121212; color: #ffffff; }}
         .container {{ max-width: 1100px; margin: 2rem auto; background: #1e1e1e; border-radius: 8px; padding: 2rem; box-shadow: 0 8px 16px rgba(0,0,0,0.3); }}
@@ -33,34 +48,47 @@ TEMPLATE_HTML = """
             margin-top: 5px;
             white-space: nowrap;
         }}
-    </style>
+{page_style}    </style>
 </head>
 <body>
     <div class=\"container\">
         <h1>User Journey</h1>
         <div class=\"persona\">Persona: {persona}</div>
-        <div class=\"mermaid\" id=\"ujv-diagram\">
-{mermaid_code}
-        </div>
+{diagram}
         <div id=\"download-container\">
-            <button class=\"mdc-button mdc-button--raised\" id=\"download-btn\">
-                <span class=\"mdc-button__label\">Download as SVG</span>
-            </button>
+{download_button}
         </div>
     </div>
     <script>
-                mermaid.initialize({{ startOnLoad: true, theme: 'dark' }});
-        mdc.autoInit();
-        document.addEventListener('DOMContentLoaded', function() {{
+{page_script}
+    </script>
+</body>
+</html>
+"""
+
+# Page fragments for the in-browser Mermaid renderer
+MERMAID_DIAGRAM = """        <div class=\"mermaid\" id=\"ujv-diagram\">
+{mermaid_code}
+        </div>"""
+
+MERMAID_DOWNLOAD_BUTTON = """            <button class=\"mdc-button mdc-button--raised\" id=\"download-btn\">
+                <span class=\"mdc-button__label\">Download as SVG</span>
+            </button>"""
+
+MERMAID_INIT_SCRIPT = """                mermaid.initialize({ startOnLoad: true, theme: 'dark' });
+"""
+
+DOWNLOAD_SCRIPT = """        if (window.mdc) mdc.autoInit();
+        document.addEventListener('DOMContentLoaded', function() {
             const downloadBtn = document.getElementById('download-btn');
-            if(downloadBtn) {{
-                mdc.ripple.MDCRipple.attachTo(downloadBtn);
-                downloadBtn.addEventListener('click', function() {{
+            if(downloadBtn) {
+                if (window.mdc) mdc.ripple.MDCRipple.attachTo(downloadBtn);
+                downloadBtn.addEventListener('click', function() {
                     const svg = document.querySelector('#ujv-diagram svg');
-                    if (svg) {{
+                    if (svg) {
                         const serializer = new XMLSerializer();
                         const source = serializer.serializeToString(svg);
-                        const blob = new Blob([source], {{type: 'image/svg+xml;charset=utf-8'}});
+                        const blob = new Blob([source], {type: 'image/svg+xml;charset=utf-8'});
                         const url = URL.createObjectURL(blob);
                         const a = document.createElement('a');
                         a.href = url;
@@ -69,15 +97,110 @@ TEMPLATE_HTML = """
                         a.click();
                         document.body.removeChild(a);
                         URL.revokeObjectURL(url);
-                    }}
-                }});
-            }}
-        }});
-    </script>
-</body>
-</html>
+                    }
+                });
+            }
+        });"""
+
+MERMAID_PAGE_SCRIPT = MERMAID_INIT_SCRIPT + DOWNLOAD_SCRIPT
+
+# Page fragments for the static SVG renderer: the diagram is laid out at build time
+# and the download button links to the SVG file written next to the page
+SVG_DIAGRAM = """        <div id=\"ujv-diagram\" style=\"overflow-x: auto;\">
+{svg}
+        </div>"""
+
+SVG_DOWNLOAD_BUTTON = """            <a class=\"mdc-button mdc-button--raised\" id=\"download-btn\" href=\"{svg_filename}\" download=\"user_journey.svg\">
+                <span class=\"mdc-button__label\">Download as SVG</span>
+            </a>"""
+
+SVG_PAGE_SCRIPT = """        if (window.mdc) {
+            mdc.autoInit();
+            mdc.ripple.MDCRipple.attachTo(document.getElementById('download-btn'));
+        }"""
+
+# Paginated journeys: an overview page links to parts of a bounded number of events.
+# Part pages lay out their events in the browser with every capability collapsed, and
+# clicking an event lays the part out again with that event's capabilities added.
+DEFAULT_PAGE_EVENTS = 50
+PARTS_DIR_SUFFIX = "_parts"
+
+PART_DIAGRAM = """        <div id=\"ujv-diagram\"></div>
+        <script type=\"application/json\" id=\"ujv-part\">{graph}</script>"""
+
+PART_TOGGLE_BUTTONS = """<button class=\"mdc-button\" id=\"ujv-expand-all\"><span class=\"mdc-button__label\">Expand all</span></button>
+            <button class=\"mdc-button\" id=\"ujv-collapse-all\"><span class=\"mdc-button__label\">Collapse all</span></button>"""
+
+# Mermaid calls window.ujvToggle for clicked event nodes, which needs securityLevel 'loose'
+PART_MERMAID_SCRIPT = """        mermaid.initialize({ startOnLoad: false, theme: 'dark', securityLevel: 'loose', maxTextSize: 1000000 });
+        (function() {
+            const part = JSON.parse(document.getElementById('ujv-part').textContent);
+            const expanded = new Set();
+            let renders = 0;
+            async function draw() {
+                const lines = part.graph.slice();
+                for (const id of expanded) lines.push(...part.capabilities[id]);
+                const { svg, bindFunctions } = await mermaid.render('ujv-graph-' + (++renders), lines.join('\\n'));
+                const diagram = document.getElementById('ujv-diagram');
+                diagram.innerHTML = svg;
+                if (bindFunctions) bindFunctions(diagram);
+            }
+            window.ujvToggle = function(id) {
+                if (expanded.has(id)) expanded.delete(id); else expanded.add(id);
+                draw();
+            };
+            document.getElementById('ujv-expand-all').addEventListener('click', function() {
+                Object.keys(part.capabilities).forEach(function(id) { expanded.add(id); });
+                draw();
+            });
+            document.getElementById('ujv-collapse-all').addEventListener('click', function() {
+                expanded.clear();
+                draw();
+            });
+            draw();
+        })();
 """
 
+PART_PAGE_SCRIPT = PART_MERMAID_SCRIPT + DOWNLOAD_SCRIPT
+
+# Page CSS only some pages need, added to TEMPLATE_HTML's style: event titles in
+# compact Mermaid labels, and the navigation of paginated pages
+COMPACT_STYLE = """\
+        .ujv-t { font-size: 20px; }
+"""
+PAGINATED_STYLE = """\
+        .ujv-nav { display: flex; flex-wrap: wrap; gap: 0.5rem 1rem; align-items: center; justify-content: center; margin-bottom: 1.5rem; }
+        .ujv-nav a, .ujv-parts a { color: #bb86fc; }
+        .ujv-parts { line-height: 2; }
+        .ujv-count { display: inline-block; min-width: 1.5em; padding: 0 6px; border-radius: 8px; color: #000000; font-size: 0.8em; text-align: center; }
+"""
+
+# Pages are streamed: the templates are split around the diagram they wrap
+TEMPLATE_HTML_HEAD, TEMPLATE_HTML_TAIL = TEMPLATE_HTML.split('{diagram}')
+MERMAID_DIAGRAM_HEAD, MERMAID_DIAGRAM_TAIL = MERMAID_DIAGRAM.split('{mermaid_code}')
+SVG_DIAGRAM_HEAD, SVG_DIAGRAM_TAIL = SVG_DIAGRAM.split('{svg}')
+
+# Characters of output encoded and written at a time
+STREAM_CHUNK_CHARS = 64 * 1024
+
+RENDERERS = ('mermaid', 'svg')
+
+# Output formats and the suffix of the file written for each
+EMIT_SUFFIXES = {'html': '.html', 'mermaid': '.mmd', 'json': '.json'}
+
+# Render options threaded from the command line to every page
+RENDER_DEFAULTS = {
+    'validate': False,
+    'renderer': 'mermaid',
+    'assets': {'mode': 'cdn'},
+    'compact': False,
+    'emit': 'html',
+    'compiled_cache': False,
+    'paginate': None,
+}
+
+HEAD_ASSETS_MARKER = "<!-- ujv:head-assets -->"
+
 # Color mapping for capability states
 STATE_COLORS = {
     'Not started':                  {'fill': '#CF6679', 'color': '#000000'},
@@ -106,6 +229,9 @@ def parse_markdown(md_text):
             mode = 'events'
             continue
         if line.startswith('### '):
+            if current_cap and current_event:
+                current_event['capabilities'].append(current_cap)
+            current_cap = None
             if current_event:
                 events.append(current_event)
             current_event = {
@@ -157,111 +283,789 @@ def parse_markdown(md_text):
         'events': events
     }
 
-CAPABILITIES_DIR = Path("capabilities")
+# Build manifest recording the dependency hashes of every rendered journey
+MANIFEST_FILENAME = ".ujv-manifest.json"
+MANIFEST_VERSION = 1
+
+def file_hash(filepath: Path) -> str | None:
+    try:
+        return content_hash(Path(filepath).read_bytes())
+    except FileNotFoundError:
+        return None
+
+def renderer_fingerprint() -> str:
+    """
+    Hash of the renderer itself, so changes to the template or the Mermaid
+    generation invalidate every cached output.
+    """
+    modules = (sys.modules[__name__], ujv_assets, ujv_capabilities, ujv_compiled, ujv_document, ujv_validator, ujv_svg)
+    return content_hash(b''.join(Path(module.__file__).read_bytes() for module in modules))
 
-def expand_capability_references(md_text: str) -> str:
+def expand_capability_references(md_text: str, path: Path, dependencies: dict | None = None,
+                                  store: CapabilityStore | None = None) -> str:
     """
-    Expands [capability:filename_stem] references in markdown text
-    by reading content from the capabilities directory.
+    Expands [capability:filename_stem] references in the markdown text of the journey
+    at `path` by reading content from the capabilities directory next to it.
+    Capability files are served from the shared capability store for that directory
+    (or `store`), so each file is read once however often it is referenced.
+    If a dependencies dict is given, it is filled with the content hash of every
+    capability file pulled in (None for missing files), keyed by file path.
     """
+    if store is None:
+        store = get_store(capabilities_dir_for(path))
     expanded_md = []
-    for line in md_text.splitlines():
-        match = re.search(r'\[capability:([a-zA-Z0-9_-]+)\]', line)
+    lines = md_text.splitlines()
+    ujv_profile.count('regex_evaluations', len(lines))
+    for line in lines:
+        match = CAPABILITY_REF_RE.search(line)
         if match:
             capability_stem = match.group(1)
-            capability_filepath = CAPABILITIES_DIR / f"{capability_stem}.md"
-            if capability_filepath.exists():
-                with open(capability_filepath, 'r', encoding='utf-8') as f:
-                    expanded_md.append(f.read())
+            record = store.get(capability_stem)
+            if record is not None:
+                if dependencies is not None:
+                    dependencies[str(record.path)] = record.hash
+                expanded_md.append(record.text)
             else:
+                if dependencies is not None:
+                    dependencies[str(store.path_for(capability_stem))] = None
                 expanded_md.append(f"[ERROR: Capability '{capability_stem}' not found]")
         else:
             expanded_md.append(line)
     return '\n'.join(expanded_md)
 
+# Only brackets need escaping in Mermaid labels
+MERMAID_ESCAPES = str.maketrans({'[': '\\[', ']': '\\]'})
+
 def escape_mermaid(text):
-    return text.replace('"', '\"').replace("'", "\'").replace("[", "\\[").replace("]", "\\]")
+    return text.translate(MERMAID_ESCAPES)
 
-def build_mermaid(parsed):
+def _joined(lines: Iterable[str], separator: str = '\n') -> Iterator[str]:
     """
-    Build a Mermaid flowchart from parsed data.
+    Yields the fragments of separator.join(lines) without building the joined string.
+    """
+    lines = iter(lines)
+    for line in lines:
+        yield line
+        break
+    for line in lines:
+        yield separator
+        yield line
+
+def _capability_label(cap: dict) -> str:
+    label = f"<b>Capability</b><br>{cap['title']}<br>{escape_mermaid(cap['description'])}"
+    if cap.get('link'):
+        label += f"<br><div class='mermaid-chip'>{cap['link']}</div>"
+    return label
+
+def _compact_event_label(event: dict) -> str:
+    label = f"<b class='ujv-t'>{event['title']}</b><br>{escape_mermaid(event['description'])}"
+    return f"{event['icon']} {label}" if event['icon'] else label
+
+def iter_mermaid_compact(parsed) -> Iterator[str]:
+    """
+    Yields the lines of a compact Mermaid flowchart: one classDef per capability
+    state attached with ':::', label styling moved to page CSS (.ujv-t), short node
+    IDs (e<n> and c<n>, decimal so they never spell keywords such as 'end') and the
+    whole event chain on a single line.
     """
+    state_classes = {state: f"s{idx}" for idx, state in enumerate(STATE_COLORS)}
     events = parsed['events']
-    nodes = []
-    edges = []
-    cap_nodes = []
-    cap_edges = []
-    mermaid_styles = []
-    mermaid_links = []
 
+    yield "flowchart TD"
+    for idx, event in enumerate(events):
+        yield f'e{idx}(["{_compact_event_label(event)}"]):::ev'
+    if len(events) > 1:
+        yield '-->'.join(f"e{idx}" for idx in range(len(events)))
+
+    cap_count = 0
+    for event in events:
+        for cap in event['capabilities']:
+            cid = f"c{cap_count}"
+            cap_count += 1
+            state_class = state_classes.get(cap.get('state', ''))
+            yield f'{cid}(["{_capability_label(cap)}"])' + (f':::{state_class}' if state_class else '')
+    cap_count = 0
+    for idx, event in enumerate(events):
+        eid = f"e{idx}"
+        for cap in event['capabilities']:
+            cid = f"c{cap_count}"
+            cap_count += 1
+            edge_text = cap.get('edge_text', '').strip()
+            yield f'{eid} -- "{edge_text}" --- {cid}' if edge_text else f'{eid}---{cid}'
+    cap_count = 0
+    for event in events:
+        for cap in event['capabilities']:
+            if cap.get('link'):
+                yield f'click c{cap_count} "{cap["link"]}"'
+            cap_count += 1
+
+    for state, state_class in state_classes.items():
+        colors = STATE_COLORS[state]
+        yield f"classDef {state_class} fill:{colors['fill']},stroke:#333,color:{colors['color']},stroke-width:2px,rx:8px,ry:8px,font-size:18px"
+    yield "classDef ev fill:#2D2D2D,stroke:#444,stroke-width:2px,rx:8px,ry:8px,font-size:18px"
+
+def build_mermaid_compact(parsed):
+    """
+    Build a compact Mermaid flowchart from parsed data (see iter_mermaid_compact).
+    """
+    return '\n'.join(iter_mermaid_compact(parsed))
+
+def iter_mermaid(parsed, compact=False) -> Iterator[str]:
+    """
+    Yields the lines of a Mermaid flowchart built from parsed data. Each group of
+    statements (event nodes, event edges, capability nodes, capability edges, styles,
+    click links) is produced by its own pass over the events, so no group is held in memory.
+    """
+    if compact:
+        yield from iter_mermaid_compact(parsed)
+        return
+    events = parsed['events']
+
+    yield "flowchart TD"
     for idx, event in enumerate(events):
-        eid = f"E{idx}"
         desc = escape_mermaid(event['description'])
         label = f"<b><span style='font-size: 20px;'>{event['title']}</span></b><br>{desc}"
         if event['icon']:
             label = f"{event['icon']} {label}"
-        nodes.append(f'{eid}(["{label}"]):::event_card')
-        if idx > 0:
-            edges.append(f"E{idx-1} --> {eid}")
+        yield f'E{idx}(["{label}"]):::event_card'
+    for idx in range(1, len(events)):
+        yield f"E{idx-1} --> E{idx}"
+    for idx, event in enumerate(events):
+        for cidx, cap in enumerate(event['capabilities']):
+            yield f'E{idx}_C{cidx}(["{_capability_label(cap)}"])'
+    for idx, event in enumerate(events):
         for cidx, cap in enumerate(event['capabilities']):
-            cid = f"{eid}_C{cidx}"
-            state = cap.get('state', '')
-            cap_label = f"<b>Capability</b><br>{cap['title']}<br>{escape_mermaid(cap['description'])}"
-            if cap.get('link'):
-                cap_label += f"<br><div class='mermaid-chip'>{cap['link']}</div>"
-            
-            cap_nodes.append(f'{cid}(["{cap_label}"])')
             edge_text = cap.get('edge_text', '').strip()
             if edge_text:
-                cap_edges.append(f'{eid} -- "{edge_text}" --- {cid}')
+                yield f'E{idx} -- "{edge_text}" --- E{idx}_C{cidx}'
             else:
-                cap_edges.append(f'{eid} --- {cid}')
+                yield f'E{idx} --- E{idx}_C{cidx}'
+    for idx, event in enumerate(events):
+        for cidx, cap in enumerate(event['capabilities']):
+            colors = STATE_COLORS.get(cap.get('state', ''))
+            if colors is not None:
+                yield f"style E{idx}_C{cidx} fill:{colors['fill']},stroke:#333,color:{colors['color']},stroke-width:2px,rx:8px,ry:8px,font-size:18px"
+    for idx, event in enumerate(events):
+        for cidx, cap in enumerate(event['capabilities']):
+            if cap.get('link'):
+                yield f'click E{idx}_C{cidx} "{cap["link"]}"'
+    yield "classDef event_card fill:#2D2D2D,stroke:#444,stroke-width:2px,rx:8px,ry:8px,font-size:18px;"
 
+def build_mermaid(parsed, compact=False):
+    """
+    Build a Mermaid flowchart from parsed data.
+    """
+    return '\n'.join(iter_mermaid(parsed, compact))
+
+def _count_label(count: int, singular: str, plural: str) -> str:
+    return f"{count} {singular if count == 1 else plural}"
+
+def part_ranges(event_count: int, page_events: int) -> list[tuple[int, int]]:
+    """
+    Splits a journey into parts of at most page_events events, as (start, end) event indices.
+    """
+    return [(start, min(start + page_events, event_count)) for start in range(0, event_count, page_events)]
+
+def part_filename(part: int, suffix: str = '.html') -> str:
+    return f"part-{part}{suffix}"
+
+def parts_dir(output_path: Path) -> Path:
+    """
+    The directory holding the part pages of a paginated journey, next to its overview page.
+    """
+    return output_path.with_name(output_path.stem + PARTS_DIR_SUFFIX)
+
+def remove_parts(output_path: Path, keep: set = frozenset()):
+    """
+    Removes the part pages (and part SVGs) next to output_path other than those named
+    in `keep`, and the parts directory once it is empty: what is left from a build with
+    more parts or from a paginated build.
+    """
+    directory = parts_dir(output_path)
+    if not directory.is_dir():
+        return
+    for stale in directory.glob('part-*'):
+        if stale.name not in keep:
+            stale.unlink()
+    if not keep:
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+
+def part_graph(events: list, start: int, end: int, part: int, parts: int) -> dict:
+    """
+    The Mermaid statements of one part of a paginated journey. 'graph' lays out the
+    events from start to end with their capabilities collapsed, plus nodes linking to
+    the neighbouring parts. 'capabilities' holds, by event node ID, the statements that
+    add an event's capabilities when it is expanded. Nodes are styled and numbered as
+    in compact Mermaid, with event IDs numbered across the whole journey.
+    """
+    state_classes = {state: f"s{idx}" for idx, state in enumerate(STATE_COLORS)}
+    nodes = ["flowchart TD"]
+    tail = []
+    capabilities = {}
+    for idx in range(start, end):
+        event = events[idx]
+        eid = f"e{idx}"
+        label = _compact_event_label(event)
+        if event['capabilities']:
+            label += f"<br><div class='mermaid-chip'>{_count_label(len(event['capabilities']), 'capability', 'capabilities')}</div>"
+            tail.append(f'click {eid} ujvToggle "Show or hide capabilities"')
+        nodes.append(f'{eid}(["{label}"]):::ev')
+        statements = []
+        for cidx, cap in enumerate(event['capabilities']):
+            cid = f"{eid}_{cidx}"
+            state_class = state_classes.get(cap.get('state', ''))
+            statements.append(f'{cid}(["{_capability_label(cap)}"])' + (f':::{state_class}' if state_class else ''))
+            edge_text = cap.get('edge_text', '').strip()
+            statements.append(f'{eid} -- "{edge_text}" --- {cid}' if edge_text else f'{eid}---{cid}')
             if cap.get('link'):
-                link_url = cap['link']
-                mermaid_links.append(f'click {cid} "{link_url}"')
-
-
-            if state in STATE_COLORS:
-                colors = STATE_COLORS[state]
-                fill_color = colors['fill']
-                text_color = colors['color']
-                mermaid_styles.append(f"style {cid} fill:{fill_color},stroke:#333,color:{text_color},stroke-width:2px,rx:8px,ry:8px,font-size:18px")
-
-    # Mermaid code
-    mermaid = ["flowchart TD"]
-    mermaid.extend(nodes)
-    mermaid.extend(edges)
-    mermaid.extend(cap_nodes)
-    mermaid.extend(cap_edges)
-    mermaid.extend(mermaid_styles)
-    mermaid.extend(mermaid_links)
-    mermaid.append("classDef event_card fill:#2D2D2D,stroke:#444,stroke-width:2px,rx:8px,ry:8px,font-size:18px;")
-    return '\n'.join(mermaid)
+                statements.append(f'click {cid} "{cap["link"]}"')
+        if statements:
+            capabilities[eid] = statements
+    if end - start > 1:
+        nodes.append('-->'.join(f"e{idx}" for idx in range(start, end)))
+    if part > 1:
+        nodes.append(f'prev(["‹ Part {part - 1}"]):::nav')
+        nodes.append(f"prev-->e{start}")
+        tail.append(f'click prev "{part_filename(part - 1)}"')
+    if part < parts:
+        nodes.append(f'next(["Part {part + 1} ›"]):::nav')
+        nodes.append(f"e{end - 1}-->next")
+        tail.append(f'click next "{part_filename(part + 1)}"')
+    for state, state_class in state_classes.items():
+        colors = STATE_COLORS[state]
+        tail.append(f"classDef {state_class} fill:{colors['fill']},stroke:#333,color:{colors['color']},stroke-width:2px,rx:8px,ry:8px,font-size:18px")
+    tail.append("classDef ev fill:#2D2D2D,stroke:#444,stroke-width:2px,rx:8px,ry:8px,font-size:18px")
+    tail.append("classDef nav fill:#1e1e1e,stroke:#bb86fc,color:#bb86fc,stroke-width:2px,rx:8px,ry:8px,font-size:18px")
+    return {'graph': nodes + tail, 'capabilities': capabilities}
+
+def _page_body(parsed: dict, renderer: str, svg: str | tuple | None, svg_filename: str, compact: bool) -> Iterator[str]:
+    """
+    Yields the page from the diagram to the end of the document.
+    """
+    if renderer == 'svg':
+        yield SVG_DIAGRAM_HEAD
+        if isinstance(svg, str):
+            yield svg
+        else:
+            yield from _joined(iter_svg(svg))
+        yield SVG_DIAGRAM_TAIL
+        download_button = SVG_DOWNLOAD_BUTTON.format(svg_filename=escape(svg_filename))
+        page_script = SVG_PAGE_SCRIPT
+    else:
+        yield MERMAID_DIAGRAM_HEAD
+        yield from _joined(iter_mermaid(parsed, compact))
+        yield MERMAID_DIAGRAM_TAIL
+        download_button = MERMAID_DOWNLOAD_BUTTON
+        page_script = MERMAID_PAGE_SCRIPT
+    yield TEMPLATE_HTML_TAIL.format(download_button=download_button, page_script=page_script)
+
+def iter_html(parsed: dict, renderer: str = 'mermaid', svg: str | tuple | None = None, svg_filename: str = '',
+              assets: dict | None = None, page_dir: Path | None = None, compact: bool = False) -> Iterator[str]:
+    """
+    Yields the HTML page for a parsed journey in fragments, for writing straight to a
+    file. With the 'mermaid' renderer the page lays out the diagram in the browser;
+    with 'svg' the page embeds `svg`, the static diagram from build_svg, or streams
+    it from a ujv_svg.layout() result. `assets`
+    selects how third-party assets are loaded ({'mode': 'cdn' | 'shared' | 'inline',
+    'vendor_dir': ..., 'shared': ...}, see ujv_assets); shared asset links are made
+    relative to page_dir.
+    """
+    assets = assets or {'mode': 'cdn'}
+    style = COMPACT_STYLE if compact and renderer != 'svg' else ''
+    return _iter_page(parsed['persona'] or '', page_assets(renderer, assets['mode']),
+                      lambda: _page_body(parsed, renderer, svg, svg_filename, compact), assets, page_dir, style)
+
+def _iter_page(persona: str, names: list[str], body: Callable[[], Iterator[str]], assets: dict,
+               page_dir: Path | None, style: str = '') -> Iterator[str]:
+    """
+    Yields a page loading the assets `names`: the template head with the extra CSS
+    rules `style`, then body(), which yields the page from the diagram to the end of
+    the document.
+    """
+    vendor_dir = Path(assets.get('vendor_dir') or VENDOR_DIR)
+    if assets['mode'] == 'inline':
+        # Inline CSS is pruned to the classes the finished page uses, so the body is
+        # generated twice: once to collect its classes, then to be written
+        page_classes = set()
+        for fragment in (TEMPLATE_HTML_HEAD.format(persona=persona, head_assets=HEAD_ASSETS_MARKER, page_style=style), *body()):
+            for attr in CLASS_ATTR_RE.findall(fragment):
+                page_classes.update(attr.split())
+        head_assets = head_tags(names, 'inline', vendor_dir=vendor_dir, used_classes=page_classes)
+    else:
+        head_assets = head_tags(names, assets['mode'], page_dir, assets.get('shared'), vendor_dir)
+    yield TEMPLATE_HTML_HEAD.format(persona=persona, head_assets=head_assets, page_style=style)
+    yield from body()
+
+def _overview_body(events: list, ranges: list[tuple[int, int]], parts_href: str) -> Iterator[str]:
+    """
+    Yields the overview of a paginated journey: one link per part, with its first and
+    last event and the number of capabilities in each state.
+    """
+    yield f'        <nav class="ujv-nav"><span>{_count_label(len(events), "event", "events")} in {_count_label(len(ranges), "part", "parts")}</span></nav>\n'
+    yield '        <ol class="ujv-parts">\n'
+    for part, (start, end) in enumerate(ranges, 1):
+        states = Counter(cap.get('state', '') for event in events[start:end] for cap in event['capabilities'])
+        if end - start == 1:
+            link, titles = f"Event {start + 1}", escape(events[start]['title'])
+        else:
+            link, titles = f"Events {start + 1}–{end}", f"{escape(events[start]['title'])} → {escape(events[end - 1]['title'])}"
+        counts = ''.join(
+            f' <span class="ujv-count" style="background-color: {colors["fill"]};" title="{escape(state)}">{states[state]}</span>'
+            for state, colors in STATE_COLORS.items() if states[state]
+        )
+        yield (f'            <li><a href="{escape(parts_href)}/{part_filename(part)}">{link}</a>: {titles} · '
+               f'{_count_label(states.total(), "capability", "capabilities")}{counts}</li>\n')
+    yield '        </ol>'
+    yield TEMPLATE_HTML_TAIL.format(download_button='', page_script='')
+
+def _part_body(parsed: dict, start: int, end: int, part: int, parts: int, renderer: str,
+               svg: tuple | None, overview_href: str) -> Iterator[str]:
+    """
+    Yields one part page of a paginated journey from the navigation to the end of the document.
+    """
+    links = [f'<a href="{escape(overview_href)}">Overview</a>']
+    if part > 1:
+        links.append(f'<a href="{part_filename(part - 1)}">‹ Part {part - 1}</a>')
+    events = f"event {start + 1}" if end - start == 1 else f"events {start + 1}–{end}"
+    links.append(f'<span>Part {part} of {parts}: {events}</span>')
+    if part < parts:
+        links.append(f'<a href="{part_filename(part + 1)}">Part {part + 1} ›</a>')
+    if renderer != 'svg':
+        links.append(PART_TOGGLE_BUTTONS)
+    yield '        <nav class="ujv-nav">\n' + ''.join(f'            {link}\n' for link in links) + '        </nav>\n'
+    if renderer == 'svg':
+        yield from _page_body(parsed, 'svg', svg, part_filename(part, '.svg'), False)
+        return
+    # Closing tags in labels must not end the JSON script element
+    graph = json.dumps(part_graph(parsed['events'], start, end, part, parts), ensure_ascii=False).replace('</', '<\\/')
+    yield PART_DIAGRAM.format(graph=graph)
+    yield TEMPLATE_HTML_TAIL.format(download_button=MERMAID_DOWNLOAD_BUTTON, page_script=PART_PAGE_SCRIPT)
+
+def write_parts(parsed: dict, output_path: Path, options: dict) -> list[str]:
+    """
+    Writes a journey paginated into parts of at most options['paginate'] events: an
+    overview page at output_path and one page per part in parts_dir(output_path). Only
+    one part is generated, and with the 'svg' renderer laid out, at a time. Part pages
+    left over from a longer version of the journey are removed. Returns the part pages
+    written, relative to the overview's directory.
+    """
+    events = parsed['events']
+    persona = parsed['persona'] or ''
+    ranges = part_ranges(len(events), options['paginate'])
+    renderer = options['renderer']
+    assets = options['assets']
+    directory = parts_dir(output_path)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    def write(path: Path, fragments: Iterable[str]):
+        with open(path, 'wb') as f:
+            ujv_profile.count('bytes_written', write_fragments(f, fragments))
+        ujv_profile.count('files_written')
+
+    # The overview lays out no diagram, so it does not load Mermaid
+    overview_assets = [name for name in page_assets(renderer, assets['mode']) if name != 'mermaid']
+    write(output_path, _iter_page(persona, overview_assets, lambda: _overview_body(events, ranges, directory.name),
+                                  assets, output_path.parent, PAGINATED_STYLE))
+    # Mermaid part pages label their events as compact Mermaid does
+    part_style = PAGINATED_STYLE + (COMPACT_STYLE if renderer != 'svg' else '')
+    written = set()
+    for part, (start, end) in enumerate(ranges, 1):
+        part_path = directory / part_filename(part)
+        svg = None
+        if renderer == 'svg':
+            with ujv_profile.stage('build_svg'):
+                svg = layout({'persona': parsed['persona'], 'events': events[start:end]}, STATE_COLORS)
+        body = partial(_part_body, parsed, start, end, part, len(ranges), renderer, svg, f"../{output_path.name}")
+        write(part_path, _iter_page(persona, page_assets(renderer, assets['mode']), body, assets, directory, part_style))
+        written.add(part_path.name)
+        if svg is not None:
+            write(part_path.with_suffix('.svg'), _joined(iter_svg(svg)))
+            written.add(part_path.with_suffix('.svg').name)
+    remove_parts(output_path, written)
+    return [f"{directory.name}/{part_filename(part)}" for part in range(1, len(ranges) + 1)]
+
+def render_html(parsed: dict, renderer: str = 'mermaid', svg_filename: str = '',
+                assets: dict | None = None, page_dir: Path | None = None, compact: bool = False) -> tuple[str, str | None]:
+    """
+    Renders the HTML page for a parsed journey as a string (see iter_html).
+    Returns the HTML and, for 'svg', the SVG document.
+    """
+    svg = None
+    if renderer == 'svg':
+        with ujv_profile.stage('build_svg'):
+            svg = build_svg(parsed, STATE_COLORS)
+    with ujv_profile.stage('html_template'):
+        html = ''.join(iter_html(parsed, renderer, svg, svg_filename, assets, page_dir, compact))
+    return html, svg
+
+def iter_json(parsed: dict) -> Iterator[str]:
+    """
+    Yields the serialised journey model ({'persona', 'events': [...]}) in fragments.
+    """
+    return json.JSONEncoder(ensure_ascii=False, indent=1).iterencode(parsed)
+
+def render_json(parsed: dict) -> str:
+    """
+    Serialises the parsed journey model ({'persona', 'events': [...]}) for downstream tools.
+    """
+    return ''.join(iter_json(parsed))
+
+def write_fragments(f, fragments: Iterable[str]) -> int:
+    """
+    Encodes text fragments into a binary file in chunks of about STREAM_CHUNK_CHARS
+    characters, so memory use does not grow with the output. Returns the bytes written.
+    """
+    written = 0
+    chunk = []
+    size = 0
+    for fragment in fragments:
+        chunk.append(fragment)
+        size += len(fragment)
+        if size >= STREAM_CHUNK_CHARS:
+            written += f.write(''.join(chunk).encode('utf-8'))
+            chunk.clear()
+            size = 0
+    if chunk:
+        written += f.write(''.join(chunk).encode('utf-8'))
+    return written
+
+class JourneyValidationError(Exception):
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__('\n'.join([f"{len(errors)} validation error(s):"] + [f"  - {error}" for error in errors]))
+
+def render_options(options: dict | None = None) -> dict:
+    """
+    Fills in the defaults for the render options (see RENDER_DEFAULTS).
+    """
+    return {**RENDER_DEFAULTS, **(options or {})}
+
+def render_journey(input_path: Path, output_path: Path, options: dict | None = None) -> dict:
+    """
+    Renders a single journey markdown file to an HTML page, or with the 'emit' option
+    to Mermaid or to the JSON journey model. With the 'paginate' option, HTML is written
+    as an overview page and part pages (see write_parts).
+    The journey is parsed once into its document model; with the 'validate' option the
+    same model is validated first and JourneyValidationError is raised instead of rendering.
+    With 'compiled_cache', a fresh compiled model next to the source (see ujv_compiled)
+    is loaded instead of parsing, and a new one is written after parsing.
+    Returns the dependency record (journey and capability file hashes, and the part
+    pages of a paginated journey or the SVG of the svg renderer) for the build manifest.
+    Part pages and SVG files left from a build with other options are removed.
+    """
+    options = render_options(options)
+    file = str(input_path)
+    compiled = None
+    if options['compiled_cache']:
+        with ujv_profile.stage('load_compiled', file=file):
+            compiled = ujv_compiled.load_compiled(input_path)
+        if compiled is not None and options['validate'] and compiled['errors'] is None:
+            # Compiled by a build that did not validate
+            compiled = None
+
+    if compiled is not None:
+        if options['validate'] and compiled['errors']:
+            raise JourneyValidationError(compiled['errors'])
+        parsed = ujv_compiled.to_parsed(compiled)
+        source_hash = compiled['source'][2]
+        dependencies = ujv_compiled.dependencies(compiled, input_path)
+    else:
+        # The source is streamed line by line into the tokenizer and hashed on the way
+        hasher = content_hasher()
+        with ujv_profile.stage('parse_document', file=file):
+            document = build_document(tokenize(read_lines(input_path, hasher)), input_path)
+        source_hash = hasher.hexdigest()
+        errors = None
+        if options['validate']:
+            with ujv_profile.stage('validate', file=file):
+                errors = validate_document(document)
+        if options['compiled_cache']:
+            with ujv_profile.stage('write_compiled', file=file):
+                ujv_compiled.write_compiled(input_path, ujv_compiled.compile_document(document, source_hash, errors))
+        if errors:
+            raise JourneyValidationError(errors)
+        parsed = document.to_parsed()
+        dependencies = document.dependencies()
+    record = {
+        'source': str(input_path),
+        'source_hash': source_hash,
+        'capabilities': dependencies,
+        'options': options,
+    }
+
+    if options['emit'] == 'html' and options['paginate']:
+        with ujv_profile.stage('write', file=file):
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            record['parts'] = write_parts(parsed, output_path, options)
+        # Left from an earlier build with the svg renderer
+        output_path.with_suffix('.svg').unlink(missing_ok=True)
+        return record
+    remove_parts(output_path)
+
+    svg = None
+    svg_path = output_path.with_suffix('.svg')
+    if options['emit'] == 'json':
+        fragments = iter_json(parsed)
+    elif options['emit'] == 'mermaid':
+        fragments = _joined(iter_mermaid(parsed, options['compact']))
+    else:
+        if options['renderer'] == 'svg':
+            # Laid out once; the SVG document is streamed into both the page and the .svg file
+            with ujv_profile.stage('build_svg'):
+                svg = layout(parsed, STATE_COLORS)
+        fragments = iter_html(parsed, options['renderer'], svg, svg_path.name, options['assets'], output_path.parent, options['compact'])
+
+    # Mermaid, HTML and JSON are generated as they are written, so this stage includes generating them
+    with ujv_profile.stage('write', file=file):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, 'wb') as f:
+            ujv_profile.count('bytes_written', write_fragments(f, fragments))
+        ujv_profile.count('files_written')
+        if svg is not None:
+            with open(svg_path, 'wb') as f:
+                ujv_profile.count('bytes_written', write_fragments(f, _joined(iter_svg(svg))))
+            ujv_profile.count('files_written')
+            record['svg'] = svg_path.name
+        else:
+            # Left from an earlier build with the svg renderer
+            svg_path.unlink(missing_ok=True)
+    return record
+
+def load_manifest(output_dir: Path, renderer: str) -> dict:
+    """
+    Loads the build manifest of an output directory. A manifest written by a
+    different renderer version is discarded.
+    """
+    try:
+        with open(output_dir / MANIFEST_FILENAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('renderer') != renderer:
+        return {}
+    return manifest.get('entries', {})
+
+def save_manifest(output_dir: Path, renderer: str, entries: dict):
+    manifest = {'version': MANIFEST_VERSION, 'renderer': renderer, 'entries': entries}
+    tmp_path = output_dir / (MANIFEST_FILENAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, output_dir / MANIFEST_FILENAME)
+
+def manifest_key(output_path: Path, output_dir: Path) -> str:
+    return output_path.relative_to(output_dir).as_posix() if output_path.is_relative_to(output_dir) else str(output_path)
+
+def is_up_to_date(input_path: Path, output_path: Path, entry: dict | None, hashes: dict, options: dict) -> bool:
+    """
+    Checks a journey against its manifest entry. `hashes` memoizes file hashes
+    for the run so capability files shared by many journeys are hashed once.
+    Outputs built with different options (validation, renderer) are considered stale,
+    as are outputs with a recorded part page or SVG file missing.
+    """
+    if not entry or entry.get('source') != str(input_path) or not output_path.exists():
+        return False
+    if entry.get('options') != options:
+        return False
+    written = [*entry.get('parts', ()), *([entry['svg']] if 'svg' in entry else [])]
+    if not all((output_path.parent / relative).exists() for relative in written):
+        return False
+
+    def cached_hash(filepath):
+        if filepath not in hashes:
+            hashes[filepath] = file_hash(filepath)
+        return hashes[filepath]
+
+    if cached_hash(str(input_path)) != entry.get('source_hash'):
+        return False
+    return all(cached_hash(filepath) == digest for filepath, digest in entry.get('capabilities', {}).items())
+
+def discover_journeys(inputs: list[str], output_dir: Path, suffix: str = '.html') -> list[tuple[Path, Path]]:
+    """
+    Resolves files, directories and glob patterns into (input, output) path pairs.
+    Journeys found under a directory or glob are written to a mirrored tree below
+    output_dir; explicitly named files are written to output_dir/<stem><suffix>.
+    """
+    jobs = []
+    for filepath, root in find_journeys(inputs, {output_dir.resolve()}):
+        relative = filepath.relative_to(root) if filepath.is_relative_to(root) else Path(filepath.name)
+        jobs.append((filepath, output_dir / relative.with_suffix(suffix)))
+    return jobs
+
+def output_collisions(jobs: list[tuple[Path, Path]]) -> dict[Path, list[Path]]:
+    """
+    Returns the output paths that more than one journey would be written to, with those
+    journeys. Such journeys would overwrite each other and fight over one manifest entry.
+    """
+    inputs_by_output = defaultdict(list)
+    for input_path, output_path in jobs:
+        inputs_by_output[Path(os.path.abspath(output_path))].append(input_path)
+    return {output_path: inputs for output_path, inputs in inputs_by_output.items() if len(inputs) > 1}
+
+def print_output_collisions(collisions: dict[Path, list[Path]]):
+    print("Error: several journeys would be written to the same output file:")
+    for output_path, inputs in collisions.items():
+        print(f"- {output_path}: {', '.join(str(input_path) for input_path in inputs)}")
+    print("Pass a directory or glob containing them all, so the output mirrors their relative paths, or render them separately.")
+
+def _render_job(job: tuple[Path, Path], options: dict | None = None,
+                profile: bool = False) -> tuple[Path, Path, str | None, dict | None, dict | None]:
+    """
+    Process pool entry point. Failures are returned rather than raised so a single
+    broken journey does not abort the batch. With `profile`, the stages and counters
+    recorded for this journey are returned so the parent process can merge them.
+    """
+    input_path, output_path = job
+    profiler = ujv_profile.enable() if profile else None
+    error = dependencies = None
+    try:
+        with ujv_profile.stage('render_journey', file=str(input_path)):
+            dependencies = render_journey(input_path, output_path, options)
+    except JourneyValidationError as e:
+        error = str(e)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return input_path, output_path, error, dependencies, profiler.drain() if profiler else None
+
+def render_batch(jobs: list[tuple[Path, Path]], workers: int | None = None, options: dict | None = None,
+                 profile: bool = False) -> list[tuple[Path, Path, str | None, dict | None, dict | None]]:
+    """
+    Renders many journeys across a process pool sized to the machine's cores.
+    """
+    if not jobs:
+        return []
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        # Stages are recorded straight into this process's profiler
+        return [_render_job(job, options) for job in jobs]
+    render_job = partial(_render_job, options=options, profile=profile)
+    chunksize = max(1, len(jobs) // (workers * 4))
+    # Forked workers must not inherit (and send back) the parent's recorded events
+    with ProcessPoolExecutor(max_workers=workers, initializer=ujv_profile.disable) as executor:
+        return list(executor.map(render_job, jobs, chunksize=chunksize))
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {value}")
+    return number
+
+def add_render_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the options that control how pages are rendered, shared by every command that renders journeys.
+    """
+    parser.add_argument('--validate', action='store_true', help='Validate each journey from the same parse and only render valid ones')
+    parser.add_argument('--assets', choices=ASSET_MODES, default='cdn',
+                        help="How pages load mermaid, Material components and fonts: 'cdn' links pinned CDN URLs, "
+                             "'shared' links one content-hashed copy in <output-dir>/assets, 'inline' embeds what each page uses (default: cdn)")
+    parser.add_argument('--inline', dest='assets', action='store_const', const='inline', help="Shortcut for --assets inline: self-contained single-file pages")
+    parser.add_argument('--vendor-dir', default=str(VENDOR_DIR), help="Directory holding the assets vendored by 'ujv_assets.py fetch' (default: vendor/)")
+    parser.add_argument('--renderer', choices=RENDERERS, default='mermaid', help="'mermaid' lays out the diagram in the browser, 'svg' embeds a static SVG laid out at build time (default: mermaid)")
+    parser.add_argument('--compact', action='store_true', help='Emit compact Mermaid: classDef-based state styling, short node IDs and label styling in the page CSS')
+    parser.add_argument('--emit', choices=EMIT_SUFFIXES, default='html',
+                        help="Write HTML pages, Mermaid source (.mmd) or the parsed journey model as JSON (default: html)")
+    parser.add_argument('--paginate', nargs='?', type=positive_int, const=DEFAULT_PAGE_EVENTS, default=None, metavar='EVENTS',
+                        help=f"Split each HTML journey into linked pages of at most EVENTS events (default: {DEFAULT_PAGE_EVENTS}) "
+                             f"behind an overview page, with capabilities collapsed until their event is clicked")
+    parser.add_argument('--compiled-cache', action='store_true',
+                        help=f"Load and write compiled journeys in {ujv_compiled.CACHE_DIRNAME}/ next to the sources, "
+                             f"so unchanged journeys are not parsed again")
+
+def render_options_from_args(args: argparse.Namespace, output_dir: Path) -> dict:
+    """
+    Builds the render options from the parsed render arguments. Shared assets are
+    published to output_dir; FileNotFoundError is raised when vendored assets are missing.
+    """
+    assets = {'mode': args.assets}
+    if args.assets != 'cdn' and args.emit == 'html':
+        assets['vendor_dir'] = args.vendor_dir
+        if args.assets == 'shared':
+            assets['shared'] = publish_shared_assets(output_dir, Path(args.vendor_dir))
+        else:
+            for name in page_assets(args.renderer, 'inline'):
+                vendored_path(Path(args.vendor_dir), name)
+    return render_options({
+        'validate': args.validate, 'renderer': args.renderer, 'assets': assets, 'compact': args.compact,
+        'emit': args.emit, 'compiled_cache': args.compiled_cache, 'paginate': args.paginate,
+    })
 
 def main():
     parser = argparse.ArgumentParser(description='User Journey Visualiser: Markdown to Flowchart HTML')
-    parser.add_argument('input_md', help='Input markdown file describing user journey')
+    parser.add_argument('input_md', nargs='+', help='Input markdown file(s), directories or glob patterns describing user journeys')
+    parser.add_argument('-o', '--output-dir', default='output', help='Directory to write the HTML files to (default: output)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--force', action='store_true', help='Re-render every journey, ignoring the build cache')
+    add_render_arguments(parser)
+    parser.add_argument('--profile', nargs='?', const='ujv_profile.json', metavar='TRACE_FILE',
+                        help='Record per-stage timings and I/O counters across all workers and write a Chrome trace (default: ujv_profile.json)')
     args = parser.parse_args()
 
-    OUTPUT_DIR = Path("output")
+    OUTPUT_DIR = Path(args.output_dir)
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    profiler = ujv_profile.enable() if args.profile else None
 
-    input_path = Path(args.input_md)
-    output_filename = input_path.stem + ".html"
-    output_filepath = OUTPUT_DIR / output_filename
+    with ujv_profile.stage('discover_journeys'):
+        jobs = discover_journeys(args.input_md, OUTPUT_DIR, EMIT_SUFFIXES[args.emit])
+    if not jobs:
+        print("No user journey files found.")
+        sys.exit(1)
+    collisions = output_collisions(jobs)
+    if collisions:
+        print_output_collisions(collisions)
+        sys.exit(1)
 
-    with open(args.input_md, 'r', encoding='utf-8') as f:
-        md = f.read()
+    start = time.perf_counter()
+    renderer = renderer_fingerprint()
+    manifest = {} if args.force else load_manifest(OUTPUT_DIR, renderer)
+    hashes = {}
+    try:
+        options = render_options_from_args(args, OUTPUT_DIR)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    with ujv_profile.stage('check_build_cache'):
+        stale_jobs = [
+            (input_path, output_path) for input_path, output_path in jobs
+            if not is_up_to_date(input_path, output_path, manifest.get(manifest_key(output_path, OUTPUT_DIR)), hashes, options)
+        ]
+    hits = len(jobs) - len(stale_jobs)
 
-    expanded_md = expand_capability_references(md)
-    parsed = parse_markdown(expanded_md)
-    mermaid_code = build_mermaid(parsed)
-    html = TEMPLATE_HTML.format(persona=parsed['persona'] or '', mermaid_code=mermaid_code)
+    with ujv_profile.stage('render_batch', journeys=len(stale_jobs)):
+        results = render_batch(stale_jobs, args.jobs, options, profile=profiler is not None)
+    for _, output_path, error, dependencies, profile in results:
+        key = manifest_key(output_path, OUTPUT_DIR)
+        if error:
+            manifest.pop(key, None)
+        else:
+            manifest[key] = dependencies
+        if profile:
+            profiler.merge(profile)
+    with ujv_profile.stage('save_manifest'):
+        save_manifest(OUTPUT_DIR, renderer, manifest)
+    elapsed = time.perf_counter() - start
 
-    with open(output_filepath, 'w', encoding='utf-8') as f:
-        f.write(html)
-    print(f"User journey visualisation written to {output_filepath}")
+    failures = [(input_path, error) for input_path, _, error, _, _ in results if error]
+    if len(jobs) == 1 and not failures:
+        if results:
+            print(f"User journey visualisation written to {jobs[0][1]}")
+        else:
+            print(f"User journey visualisation up to date: {jobs[0][1]}")
+    else:
+        print(f"Rendered {len(results) - len(failures)} of {len(jobs)} user journeys to {OUTPUT_DIR} in {elapsed:.2f}s")
+        print(f"Build cache: {hits} hit(s), {len(results)} miss(es)")
+    if profiler:
+        profiler.count('build_cache_hits', hits)
+        profiler.count('build_cache_misses', len(results))
+        profiler.write_trace(args.profile)
+        profiler.print_summary()
+        print(f"Profile trace written to {args.profile}")
+    if failures:
+        print(f"\n{len(failures)} journey(s) FAILED:")
+        for input_path, error in failures:
+            print(f"- {input_path}: {error}")
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,520 @@
+import argparse
+import base64
+import json
+import os
+import sys
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+from pathlib import Path
+
+from ujv_capabilities import CapabilityStore, capabilities_dir_for, get_store
+from ujv_document import find_journeys, parse_document
+from ujv_parser import STATE_COLORS
+
+INDEX_FORMAT = "ujv-portfolio"
+INDEX_VERSION = 1
+
+# State reported for references to capability files that do not exist
+MISSING_STATE = "Missing"
+
+# Capabilities listed in the report table
+DEFAULT_REPORT_ROWS = 200
+
+# How the rows of the report heatmap are grouped
+GROUP_BY = ('directory', 'persona')
+
+
+class _UnresolvedStore(CapabilityStore):
+    """
+    A capability store that resolves nothing: scanning a journey only needs the
+    stems it references, and the index loads each capability once itself.
+    """
+
+    def get(self, stem: str) -> None:
+        return None
+
+
+def scan_journey(path: Path) -> tuple[str | None, list[tuple[str, list[str]]]]:
+    """
+    Parses a journey with the shared document front end and keeps only what the index
+    needs: the persona and, for each event, its title and the stems of the capabilities
+    it references.
+    """
+    document = parse_document(path, _UnresolvedStore(capabilities_dir_for(path)))
+    return document.persona, [(event.title, [ref.stem for ref in event.references]) for event in document.events]
+
+
+def _csr(rows: int, pairs_row: array, pairs_value: array) -> tuple[array, array]:
+    """
+    Builds a compressed sparse row index (offsets, values) from parallel arrays of
+    (row, value) pairs with a counting sort: the values of row r are
+    values[offsets[r]:offsets[r + 1]], in the order the pairs were given.
+    """
+    offsets = array('I', bytes(4 * (rows + 1)))
+    for row in pairs_row:
+        offsets[row + 1] += 1
+    for row in range(rows):
+        offsets[row + 1] += offsets[row]
+    cursor = array('I', offsets[:-1])
+    values = array('I', bytes(4 * len(pairs_value)))
+    for row, value in zip(pairs_row, pairs_value):
+        values[cursor[row]] = value
+        cursor[row] += 1
+    return offsets, values
+
+
+class Interner:
+    """
+    Maps strings to dense integer ids.
+    """
+
+    def __init__(self, values: list[str] | None = None):
+        self.values = list(values or [])
+        self.ids = {value: idx for idx, value in enumerate(self.values)}
+
+    def __call__(self, value: str) -> int:
+        idx = self.ids.get(value)
+        if idx is None:
+            idx = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def __len__(self):
+        return len(self.values)
+
+
+class PortfolioIndex:
+    """
+    The many-to-many view of journeys, events and capabilities, held in flat arrays
+    rather than a dict per node: strings are interned once and every relation is a
+    compressed sparse row index (offsets + values) of integer ids.
+
+    Forward relations (stored): journey -> events, event -> capabilities, and
+    capability -> state / link / title.
+    Inverted relations (built on load): capability -> events, capability -> journeys,
+    state -> capabilities and link -> capabilities.
+    """
+
+    def __init__(self):
+        self.journeys = Interner()
+        self.personas = Interner()
+        self.capabilities = Interner()   # capability file paths
+        self.states = Interner()
+        self.links = Interner()
+        self.journey_persona = array('I')
+        self.event_titles = []
+        self.event_journey = array('I')
+        self.capability_titles = []
+        self.capability_state = array('I')
+        self.capability_link = array('I')
+        # (event, capability) reference pairs, in source order
+        self._ref_event = array('I')
+        self._ref_capability = array('I')
+
+    # Building
+
+    def _capability(self, store, stem: str) -> int:
+        path = str(store.path_for(stem))
+        idx = self.capabilities.ids.get(path)
+        if idx is not None:
+            return idx
+        idx = self.capabilities(path)
+        record = store.get(stem)
+        fields = record.fields if record is not None else {'title': stem, 'state': MISSING_STATE, 'link': ''}
+        self.capability_titles.append(fields['title'] or stem)
+        self.capability_state.append(self.states(fields['state'] or MISSING_STATE))
+        self.capability_link.append(self.links(fields['link']))
+        return idx
+
+    def add_journey(self, path: Path, persona: str | None, events: list[tuple[str, list[str]]]):
+        """
+        Appends a scanned journey (see scan_journey): its events and capability references.
+        """
+        store = get_store(capabilities_dir_for(path))
+        journey = self.journeys(str(path))
+        self.journey_persona.append(self.personas(persona or ''))
+        for title, stems in events:
+            event_id = len(self.event_titles)
+            self.event_titles.append(title)
+            self.event_journey.append(journey)
+            for stem in stems:
+                self._ref_event.append(event_id)
+                self._ref_capability.append(self._capability(store, stem))
+
+    def finish(self):
+        """
+        Builds the forward and inverted indexes once all journeys are added.
+        """
+        events = len(self.event_titles)
+        capabilities = len(self.capabilities)
+        self.journey_events = _csr(len(self.journeys), self.event_journey, array('I', range(events)))
+        self.event_capabilities = _csr(events, self._ref_event, self._ref_capability)
+        self.capability_events = _csr(capabilities, self._ref_capability, self._ref_event)
+        # Distinct journeys per capability, deduplicated one row at a time
+        offsets, values = self.capability_events
+        event_journey = self.event_journey
+        journey_offsets = array('I', [0])
+        journey_values = array('I')
+        for capability in range(capabilities):
+            journey_values.extend(sorted({event_journey[event] for event in values[offsets[capability]:offsets[capability + 1]]}))
+            journey_offsets.append(len(journey_values))
+        self.capability_journeys = (journey_offsets, journey_values)
+        self.state_capabilities = _csr(len(self.states), self.capability_state, array('I', range(capabilities)))
+        self.link_capabilities = _csr(len(self.links), self.capability_link, array('I', range(capabilities)))
+        return self
+
+    @classmethod
+    def build(cls, journeys: list[Path], workers: int | None = None) -> 'PortfolioIndex':
+        """
+        Parses every journey once, across a process pool, and builds the index.
+        Journeys are added in the given order whatever the order they are parsed in.
+        """
+        index = cls()
+        workers = min(workers or os.cpu_count() or 1, len(journeys) or 1)
+        if workers <= 1:
+            scanned = map(scan_journey, journeys)
+            for path, (persona, events) in zip(journeys, scanned):
+                index.add_journey(path, persona, events)
+            return index.finish()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            scanned = executor.map(scan_journey, journeys, chunksize=max(1, len(journeys) // (workers * 4)))
+            for path, (persona, events) in zip(journeys, scanned):
+                index.add_journey(path, persona, events)
+        return index.finish()
+
+    # Queries
+
+    @staticmethod
+    def _row(csr: tuple[array, array], row: int) -> array:
+        offsets, values = csr
+        return values[offsets[row]:offsets[row + 1]]
+
+    def capability_ids(self, stem_or_path: str) -> list[int]:
+        """
+        Capabilities matching a stem (in any capabilities directory) or a file path.
+        """
+        if stem_or_path in self.capabilities.ids:
+            return [self.capabilities.ids[stem_or_path]]
+        return [idx for idx, path in enumerate(self.capabilities.values) if Path(path).stem == stem_or_path]
+
+    def journeys_using(self, capabilities) -> list[str]:
+        found = set()
+        for capability in capabilities:
+            found.update(self._row(self.capability_journeys, capability))
+        return [self.journeys.values[journey] for journey in sorted(found)]
+
+    def events_using(self, capability: int) -> list[tuple[str, str]]:
+        return [(self.journeys.values[self.event_journey[event]], self.event_titles[event])
+                for event in self._row(self.capability_events, capability)]
+
+    def capabilities_in_state(self, state: str) -> list[int]:
+        idx = self.states.ids.get(state)
+        return list(self._row(self.state_capabilities, idx)) if idx is not None else []
+
+    def capabilities_with_link(self, link: str) -> list[int]:
+        idx = self.links.ids.get(link)
+        return list(self._row(self.link_capabilities, idx)) if idx is not None else []
+
+    def journey_capabilities(self, journey: int) -> list[int]:
+        """
+        Distinct capabilities referenced by a journey, in order of first reference.
+        """
+        found = {}
+        for event in self._row(self.journey_events, journey):
+            found.update(dict.fromkeys(self._row(self.event_capabilities, event)))
+        return list(found)
+
+    def capabilities_of(self, journey: str) -> list[int]:
+        idx = self.journeys.ids.get(journey)
+        return self.journey_capabilities(idx) if idx is not None else []
+
+    def describe(self, capability: int) -> dict:
+        return {
+            'capability': self.capabilities.values[capability],
+            'title': self.capability_titles[capability],
+            'state': self.states.values[self.capability_state[capability]],
+            'link': self.links.values[self.capability_link[capability]],
+            'journeys': len(self._row(self.capability_journeys, capability)),
+            'events': len(self._row(self.capability_events, capability)),
+        }
+
+    # Persistence
+
+    def to_json(self) -> dict:
+        """
+        Serialises the forward relations; id arrays are stored as base64 of their
+        little-endian bytes.
+        """
+        def pack(values: array) -> str:
+            values = array('I', values)
+            if sys.byteorder != 'little':
+                values.byteswap()
+            return base64.b64encode(values.tobytes()).decode('ascii')
+
+        return {
+            'format': INDEX_FORMAT,
+            'version': INDEX_VERSION,
+            'journeys': self.journeys.values,
+            'personas': self.personas.values,
+            'journey_persona': pack(self.journey_persona),
+            'event_titles': self.event_titles,
+            'event_journey': pack(self.event_journey),
+            'capabilities': self.capabilities.values,
+            'capability_titles': self.capability_titles,
+            'states': self.states.values,
+            'capability_state': pack(self.capability_state),
+            'links': self.links.values,
+            'capability_link': pack(self.capability_link),
+            'ref_event': pack(self._ref_event),
+            'ref_capability': pack(self._ref_capability),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'PortfolioIndex':
+        if data.get('format') != INDEX_FORMAT or data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Not a version {INDEX_VERSION} portfolio index")
+
+        def unpack(text: str) -> array:
+            values = array('I')
+            values.frombytes(base64.b64decode(text))
+            if sys.byteorder != 'little':
+                values.byteswap()
+            return values
+
+        index = cls()
+        index.journeys = Interner(data['journeys'])
+        index.personas = Interner(data['personas'])
+        index.capabilities = Interner(data['capabilities'])
+        index.states = Interner(data['states'])
+        index.links = Interner(data['links'])
+        index.journey_persona = unpack(data['journey_persona'])
+        index.event_titles = data['event_titles']
+        index.event_journey = unpack(data['event_journey'])
+        index.capability_titles = data['capability_titles']
+        index.capability_state = unpack(data['capability_state'])
+        index.capability_link = unpack(data['capability_link'])
+        index._ref_event = unpack(data['ref_event'])
+        index._ref_capability = unpack(data['ref_capability'])
+        return index.finish()
+
+    def save(self, path: Path):
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'PortfolioIndex':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_json(json.load(f))
+
+
+REPORT_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Capability Portfolio</title>
+    <style>
+        body {{ font-family: 'Roboto', sans-serif; margin: 0; padding: 0; background-color: #121212; color: #ffffff; }}
+        .container {{ max-width: 1400px; margin: 2rem auto; background: #1e1e1e; border-radius: 8px; padding: 2rem; box-shadow: 0 8px 16px rgba(0,0,0,0.3); }}
+        h1, h2 {{ font-weight: 500; }}
+        h1 {{ text-align: center; }}
+        .summary {{ text-align: center; color: #bb86fc; margin-bottom: 2rem; }}
+        table {{ border-collapse: collapse; width: 100%; margin-bottom: 2rem; font-size: 0.9rem; }}
+        th, td {{ padding: 6px 10px; border-bottom: 1px solid #333; text-align: left; }}
+        th {{ color: #bbbbbb; font-weight: 500; }}
+        td.n {{ text-align: right; font-variant-numeric: tabular-nums; }}
+        .chip {{ display: inline-block; padding: 2px 8px; border-radius: 12px; color: #000000; font-size: 0.8em; white-space: nowrap; }}
+        a {{ color: #bb86fc; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Capability Portfolio</h1>
+        <div class="summary">{summary}</div>
+        <h2>Capabilities by state and {group_by}</h2>
+        <p>Each cell counts the distinct capabilities in a state that the journeys of a {group_by} depend on; darker is more.</p>
+        <table>
+            <tr><th>{group_heading}</th><th class="n">Journeys</th>{state_headers}</tr>
+{heatmap_rows}
+        </table>
+        <h2>Most depended-on capabilities</h2>
+        <table>
+            <tr><th>Capability</th><th>State</th><th class="n">Journeys</th><th class="n">Events</th><th>Link</th></tr>
+{capability_rows}
+        </table>
+    </div>
+</body>
+</html>
+"""
+
+MISSING_COLOR = {'fill': '#9E9E9E', 'color': '#000000'}
+
+
+def _state_color(state: str) -> dict:
+    return STATE_COLORS.get(state, MISSING_COLOR)
+
+
+def render_report(index: PortfolioIndex, root: Path | None = None, rows: int = DEFAULT_REPORT_ROWS,
+                  group_by: str = 'directory') -> str:
+    """
+    Renders the heatmap of journey groups (by the journey's directory, or its persona)
+    against capability states, and the table of the capabilities most journeys depend on.
+    """
+    states = sorted(range(len(index.states)), key=lambda state: (index.states.values[state] not in STATE_COLORS, index.states.values[state]))
+
+    def group_of(journey_id: int, journey: str) -> str:
+        if group_by == 'persona':
+            return index.personas.values[index.journey_persona[journey_id]] or '(no persona)'
+        parent = Path(journey).parent
+        if root is not None and parent.is_relative_to(root):
+            parent = parent.relative_to(root)
+        return parent.as_posix()
+
+    groups = {}
+    for journey_id, journey in enumerate(index.journeys.values):
+        groups.setdefault(group_of(journey_id, journey), []).append(journey_id)
+    cells = {}
+    for group, journey_ids in groups.items():
+        capabilities = set()
+        for journey_id in journey_ids:
+            capabilities.update(index.journey_capabilities(journey_id))
+        cells[group] = Counter(index.capability_state[capability] for capability in capabilities)
+    peak = max((count for counts in cells.values() for count in counts.values()), default=1)
+
+    state_headers = ''.join(f'<th class="n">{escape(index.states.values[state])}</th>' for state in states)
+    heatmap_rows = []
+    for group in sorted(groups):
+        tds = []
+        for state in states:
+            count = cells[group].get(state, 0)
+            fill = _state_color(index.states.values[state])['fill']
+            alpha = int(40 + 215 * count / peak) if count else 0
+            style = f' style="background-color: {fill}{alpha:02x}; color: #000000;"' if count else ''
+            tds.append(f'<td class="n"{style}>{count or ""}</td>')
+        heatmap_rows.append(f'            <tr><td>{escape(group)}</td><td class="n">{len(groups[group])}</td>{"".join(tds)}</tr>')
+
+    offsets = index.capability_journeys[0]
+    ranked = sorted(range(len(index.capabilities)), key=lambda c: offsets[c] - offsets[c + 1])
+    capability_rows = []
+    for capability in ranked[:rows]:
+        info = index.describe(capability)
+        color = _state_color(info['state'])
+        link = f'<a href="{escape(info["link"])}">{escape(info["link"])}</a>' if info['link'] else ''
+        capability_rows.append(
+            f'            <tr><td title="{escape(info["capability"])}">{escape(info["title"])}</td>'
+            f'<td><span class="chip" style="background-color: {color["fill"]};">{escape(info["state"])}</span></td>'
+            f'<td class="n">{info["journeys"]}</td><td class="n">{info["events"]}</td><td>{link}</td></tr>'
+        )
+
+    summary = (f"{len(index.journeys)} journeys, {len(index.event_titles)} events, "
+               f"{len(index.capabilities)} capabilities, {len(index._ref_event)} references")
+    return REPORT_HTML.format(
+        summary=summary,
+        group_by=group_by,
+        group_heading=group_by.capitalize(),
+        state_headers=state_headers,
+        heatmap_rows='\n'.join(heatmap_rows),
+        capability_rows='\n'.join(capability_rows),
+    )
+
+
+def print_capabilities(index: PortfolioIndex, capabilities: list[int], with_journeys: bool):
+    for capability in capabilities:
+        info = index.describe(capability)
+        print(f"{info['title']} [{info['state']}] {info['capability']} ({info['journeys']} journeys, {info['events']} events)")
+        if with_journeys:
+            for journey in index.journeys_using([capability]):
+                print(f"    {journey}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index capabilities across all journeys, query the index and report on the portfolio.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="Parse every journey once and write the portfolio index")
+    index_parser.add_argument("input_md", nargs="+", help="Journey markdown file(s), directories or glob patterns")
+    index_parser.add_argument("-o", "--output", default="portfolio-index.json", help="Index file to write (default: portfolio-index.json)")
+    index_parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes parsing journeys (default: number of CPU cores)")
+
+    query_parser = commands.add_parser("query", help="Answer questions from a portfolio index")
+    query_parser.add_argument("index", help="Index file written by the 'index' command")
+    query = query_parser.add_mutually_exclusive_group(required=True)
+    query.add_argument("--state", help="Capabilities in this state, e.g. 'Not started', and the journeys depending on them")
+    query.add_argument("--capability", help="Journeys and events referencing a capability (stem or file path)")
+    query.add_argument("--link", help="Capabilities with this link")
+    query.add_argument("--journey", help="Capabilities a journey depends on (path as indexed)")
+    query.add_argument("--states", action="store_true", help="Number of capabilities per state")
+    query_parser.add_argument("--json", action="store_true", help="Print the answer as JSON")
+
+    report_parser = commands.add_parser("report", help="Write the portfolio heatmap page")
+    report_parser.add_argument("index", help="Index file written by the 'index' command")
+    report_parser.add_argument("-o", "--output", default="portfolio.html", help="HTML file to write (default: portfolio.html)")
+    report_parser.add_argument("--root", help="Directory the journey groups are shown relative to")
+    report_parser.add_argument("--group-by", choices=GROUP_BY, default="directory", help="Group the heatmap rows by journey directory or persona (default: directory)")
+    report_parser.add_argument("--rows", type=int, default=DEFAULT_REPORT_ROWS, help=f"Capabilities listed in the table (default: {DEFAULT_REPORT_ROWS})")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        # Nothing is written, so no output directory needs to be skipped
+        journeys = [input_path for input_path, _ in find_journeys(args.input_md)]
+        if not journeys:
+            print("No user journey files found.")
+            sys.exit(1)
+        index = PortfolioIndex.build(journeys, args.jobs)
+        index.save(Path(args.output))
+        print(f"Indexed {len(index.journeys)} journeys, {len(index.event_titles)} events and "
+              f"{len(index.capabilities)} capabilities into {args.output}")
+        return
+
+    try:
+        index = PortfolioIndex.load(Path(args.index))
+    except (OSError, ValueError) as e:
+        print(f"Error: could not load {args.index}: {e}")
+        sys.exit(1)
+
+    if args.command == "report":
+        html = render_report(index, Path(args.root) if args.root else None, args.rows, args.group_by)
+        Path(args.output).write_text(html, encoding='utf-8')
+        print(f"Portfolio report written to {args.output}")
+        return
+
+    if args.states:
+        answer = {state: len(index.capabilities_in_state(state)) for state in index.states.values}
+        if args.json:
+            print(json.dumps(answer, ensure_ascii=False, indent=1))
+        else:
+            for state, count in answer.items():
+                print(f"{state:32}{count:>8}")
+        return
+    if args.capability:
+        capabilities = index.capability_ids(args.capability)
+        if args.json:
+            print(json.dumps([{**index.describe(c), 'used_by': [{'journey': j, 'event': e} for j, e in index.events_using(c)]}
+                              for c in capabilities], ensure_ascii=False, indent=1))
+            return
+        for capability in capabilities:
+            print_capabilities(index, [capability], False)
+            for journey, event in index.events_using(capability):
+                print(f"    {journey}: {event}")
+        return
+    if args.journey:
+        capabilities = index.capabilities_of(args.journey)
+    elif args.link:
+        capabilities = index.capabilities_with_link(args.link)
+    else:
+        capabilities = index.capabilities_in_state(args.state)
+    if args.json:
+        answer = [index.describe(c) for c in capabilities]
+        if args.state:
+            answer = {'capabilities': answer, 'journeys': index.journeys_using(capabilities)}
+        print(json.dumps(answer, ensure_ascii=False, indent=1))
+    else:
+        print_capabilities(index, capabilities, with_journeys=bool(args.state))
+
+
+if __name__ == "__main__":
+    main()
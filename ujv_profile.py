@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Shared no-op context returned by stage() while profiling is off
+_NULL_STAGE = nullcontext()
+
+_PROFILER = None
+
+
+class Profiler:
+    """
+    Records the wall time of pipeline stages (as Chrome trace 'complete' events) and
+    counters such as files opened, bytes read/written and regex evaluations.
+    Hooks registered with add_hook are called with (stage, seconds, args) as each stage ends.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.counters = Counter()
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, **args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                'name': name,
+                'ph': 'X',
+                'ts': start / 1000,
+                'dur': (end - start) / 1000,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': args,
+            }
+            with self._lock:
+                self.events.append(event)
+            for hook in self.hooks:
+                hook(name, (end - start) / 1e9, args)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def drain(self) -> dict:
+        """
+        Returns and clears the recorded events and counters, e.g. to send them from a worker process.
+        """
+        with self._lock:
+            data = {'events': self.events, 'counters': dict(self.counters)}
+            self.events = []
+            self.counters = Counter()
+        return data
+
+    def merge(self, data: dict):
+        with self._lock:
+            self.events.extend(data['events'])
+            self.counters.update(data['counters'])
+
+    def stage_totals(self) -> dict:
+        """
+        Total seconds and number of calls per stage name.
+        """
+        totals = {}
+        for event in self.events:
+            seconds, calls = totals.get(event['name'], (0.0, 0))
+            totals[event['name']] = (seconds + event['dur'] / 1e6, calls + 1)
+        return totals
+
+    def write_trace(self, path):
+        """
+        Writes the events and the final counter values as Chrome trace-event JSON
+        (loadable in chrome://tracing or Perfetto).
+        """
+        events = list(self.events)
+        end = max((event['ts'] + event['dur'] for event in events), default=0)
+        events.append({'name': 'counters', 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'tid': 0, 'args': dict(self.counters)})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def print_summary(self):
+        print(f"\n{'stage':32}{'calls':>8}{'total':>12}")
+        for name, (seconds, calls) in sorted(self.stage_totals().items(), key=lambda item: -item[1][0]):
+            print(f"{name:32}{calls:>8}{seconds * 1000:>9.1f} ms")
+        for name, value in sorted(self.counters.items()):
+            print(f"{name:32}{value:>8}")
+
+
+def enable() -> Profiler:
+    """
+    Turns profiling on for this process and returns the active profiler.
+    """
+    global _PROFILER
+    if _PROFILER is None:
+        _PROFILER = Profiler()
+    return _PROFILER
+
+
+def disable():
+    global _PROFILER
+    _PROFILER = None
+
+
+def get_profiler() -> Profiler | None:
+    return _PROFILER
+
+
+def add_hook(hook):
+    """
+    Registers a callback invoked with (stage, seconds, args) at the end of every stage.
+    Enables profiling if it is off.
+    """
+    enable().hooks.append(hook)
+
+
+def stage(name: str, **args):
+    """
+    Context manager timing a stage. While profiling is off this returns a shared
+    no-op context, so instrumented code pays only for the call.
+    """
+    if _PROFILER is None:
+        return _NULL_STAGE
+    return _PROFILER.stage(name, **args)
+
+
+def count(name: str, n: int = 1):
+    if _PROFILER is not None:
+        _PROFILER.count(name, n)
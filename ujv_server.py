@@ -0,0 +1,355 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from ujv_assets import VENDOR_DIR, page_assets, vendored_path
+from ujv_capabilities import capabilities_dir_for, content_hash, get_store
+from ujv_document import build_document, is_journey_file, tokenize, walk_journeys
+from ujv_parser import (
+    RENDERERS, STATE_COLORS, build_mermaid, render_html, render_json, render_options, renderer_fingerprint,
+)
+from ujv_svg import build_svg
+from ujv_validator import validate_document
+
+# Response formats, by the extension requested in the URL
+FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'mmd': 'text/vnd.mermaid; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+    'svg': 'image/svg+xml; charset=utf-8',
+}
+
+DEFAULT_MAX_DOCUMENTS = 1024
+DEFAULT_MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+JOURNEYS_PATH = '/journeys'
+
+
+class LRUCache:
+    """
+    Thread-safe LRU mapping bounded by the number of entries and, optionally, by the
+    total size of the values as given by `sizeof`.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int | None = None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= self.sizeof(previous)
+            self._entries[key] = value
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self.sizeof(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class JourneyRecord:
+    """
+    A journey kept in memory: its tokens, content hash and the stat used to notice edits.
+    The document model is rebuilt from the tokens when a referenced capability changes.
+    `document` is (capability hashes, document model), replaced as one value because
+    requests for different formats of the journey render concurrently.
+    """
+
+    __slots__ = ('path', 'mtime_ns', 'size', 'hash', 'tokens', 'stems', 'document')
+
+    def __init__(self, path: Path, data: bytes, mtime_ns: int, size: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.hash = content_hash(data)
+        self.tokens = list(tokenize(data.decode('utf-8').splitlines()))
+        self.stems = list(dict.fromkeys(token.stem for token in self.tokens if token.stem is not None))
+        self.document = None
+
+
+class Rendered:
+    __slots__ = ('etag', 'body', 'content_type')
+
+    def __init__(self, etag: str, body: bytes, content_type: str):
+        self.etag = etag
+        self.body = body
+        self.content_type = content_type
+
+
+class RenderError(Exception):
+    def __init__(self, status: int, message: str, errors: list[str] | None = None):
+        self.status = status
+        self.errors = errors
+        super().__init__(message)
+
+
+class JourneyService:
+    """
+    Renders the journeys below a root directory on demand. Parsed journeys and
+    rendered responses are cached in bounded LRUs. Responses carry an ETag derived
+    from the content hashes of the journey and every capability it references, so a
+    client revalidating an unchanged page costs a few stat calls and no rendering.
+    Concurrent requests for the same uncached response render it once.
+    """
+
+    def __init__(self, root: Path, options: dict | None = None, max_documents: int = DEFAULT_MAX_DOCUMENTS,
+                 max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES, max_renders: int | None = None):
+        self.root = Path(root).resolve()
+        self.options = render_options(options)
+        self.renderer = renderer_fingerprint()
+        self.documents = LRUCache(max_documents, sizeof=lambda record: 1)
+        self.responses = LRUCache(max_documents * len(FORMATS), max_cache_bytes, sizeof=lambda rendered: len(rendered.body))
+        self._renders = threading.BoundedSemaphore(max_renders or os.cpu_count() or 1)
+        self._key_locks = weakref.WeakValueDictionary()
+        self._key_locks_lock = threading.Lock()
+
+    def _key_lock(self, key) -> threading.Lock:
+        with self._key_locks_lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def resolve(self, relative: str) -> Path:
+        """
+        Maps a journey path relative to the root (without the .md suffix) to the file,
+        refusing anything outside the root.
+        """
+        path = (self.root / f"{relative}.md").resolve()
+        if not path.is_relative_to(self.root) or not path.is_file() or not is_journey_file(path):
+            raise RenderError(404, f"No user journey at {relative}")
+        return path
+
+    def journeys(self) -> list[str]:
+        return [journey.relative_to(self.root).with_suffix('').as_posix() for journey in walk_journeys(self.root, set())]
+
+    def _journey(self, path: Path) -> JourneyRecord:
+        stat = os.stat(path)
+        record = self.documents.get(path)
+        if record is not None and record.mtime_ns == stat.st_mtime_ns and record.size == stat.st_size:
+            return record
+        data = path.read_bytes()
+        fresh = JourneyRecord(path, data, stat.st_mtime_ns, stat.st_size)
+        if record is not None and record.hash == fresh.hash:
+            # Touched but unchanged: keep the parsed document
+            record.mtime_ns, record.size = fresh.mtime_ns, fresh.size
+            return record
+        self.documents.put(path, fresh)
+        return fresh
+
+    def _etag(self, record: JourneyRecord, fmt: str, options: dict) -> tuple[str, tuple]:
+        """
+        Returns the ETag of a response and the capability hashes it was derived from.
+        The capability store only re-reads files whose mtime or size changed.
+        """
+        store = get_store(capabilities_dir_for(record.path))
+        capability_hashes = tuple(getattr(store.get(stem), 'hash', None) for stem in record.stems)
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (self.renderer, fmt, json.dumps(options, sort_keys=True), record.hash, *map(str, capability_hashes)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return f'"{digest.hexdigest()}"', capability_hashes
+
+    def _render(self, record: JourneyRecord, capability_hashes: tuple, fmt: str, options: dict) -> bytes:
+        cached = record.document
+        if cached is not None and cached[0] == capability_hashes:
+            document = cached[1]
+        else:
+            document = build_document(record.tokens, record.path)
+            record.document = (capability_hashes, document)
+        if options['validate']:
+            errors = validate_document(document)
+            if errors:
+                raise RenderError(422, f"{len(errors)} validation error(s)", errors)
+        parsed = document.to_parsed()
+        if fmt == 'json':
+            text = render_json(parsed)
+        elif fmt == 'mmd':
+            text = build_mermaid(parsed, options['compact'])
+        elif fmt == 'svg':
+            text = build_svg(parsed, STATE_COLORS)
+        else:
+            text, _ = render_html(parsed, options['renderer'], f"{record.path.stem}.svg", options['assets'], None, options['compact'])
+        return text.encode('utf-8')
+
+    def render(self, relative: str, fmt: str, overrides: dict | None = None, if_none_match: tuple = ()) -> Rendered:
+        """
+        Returns a journey rendered as `fmt` with the server's options plus `overrides`.
+        When the current ETag is one of `if_none_match`, nothing is rendered and the
+        returned response has no body.
+        """
+        if fmt not in FORMATS:
+            raise RenderError(404, f"Unknown format '{fmt}', expected one of {', '.join(FORMATS)}")
+        options = {**self.options, **(overrides or {})}
+        record = self._journey(self.resolve(relative))
+        etag, capability_hashes = self._etag(record, fmt, options)
+        if etag in if_none_match:
+            return Rendered(etag, None, FORMATS[fmt])
+
+        key = (record.path, fmt, json.dumps(options, sort_keys=True))
+        rendered = self.responses.get(key)
+        if rendered is not None and rendered.etag == etag:
+            return rendered
+        with self._key_lock(key):
+            # Another request may have rendered it while this one waited
+            rendered = self.responses.get(key)
+            if rendered is not None and rendered.etag == etag:
+                return rendered
+            with self._renders:
+                rendered = Rendered(etag, self._render(record, capability_hashes, fmt, options), FORMATS[fmt])
+            self.responses.put(key, rendered)
+            return rendered
+
+
+def _query_options(query: str) -> dict:
+    """
+    Render option overrides from the query string: renderer, compact and validate.
+    """
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    overrides = {}
+    if 'renderer' in params:
+        if params['renderer'] not in RENDERERS:
+            raise RenderError(400, f"Unknown renderer '{params['renderer']}'")
+        overrides['renderer'] = params['renderer']
+    for flag in ('compact', 'validate'):
+        if flag in params:
+            overrides[flag] = params[flag].lower() in ('1', 'true', 'yes', 'on')
+    return overrides
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /journeys                       list of journeys below the root
+    GET /journeys/<path>.<html|mmd|json|svg>  rendered journey; ?renderer=, ?compact=, ?validate=
+    """
+
+    protocol_version = 'HTTP/1.1'
+    service: JourneyService = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        try:
+            if path in (JOURNEYS_PATH, JOURNEYS_PATH + '/'):
+                return self._send_json(200, {'journeys': self.service.journeys()})
+            if not path.startswith(JOURNEYS_PATH + '/') or '.' not in path.rsplit('/', 1)[-1]:
+                raise RenderError(404, f"Not found: {path}")
+            relative, fmt = path[len(JOURNEYS_PATH) + 1:].rsplit('.', 1)
+            if_none_match = tuple(tag.strip() for tag in self.headers.get('If-None-Match', '').split(','))
+            rendered = self.service.render(relative, fmt, _query_options(url.query), if_none_match)
+            if rendered.body is None:
+                self.send_response(304)
+                self.send_header('ETag', rendered.etag)
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', rendered.content_type)
+            self.send_header('Content-Length', str(len(rendered.body)))
+            self.send_header('ETag', rendered.etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(rendered.body)
+        except RenderError as e:
+            self._send_json(e.status, {'error': str(e), **({'errors': e.errors} if e.errors else {})})
+        except Exception as e:
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', FORMATS['json'])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class RenderServer(ThreadingHTTPServer):
+    """
+    One thread per connection. Cache hits and revalidations are served concurrently;
+    renders are bounded by the service's semaphore.
+    """
+
+    daemon_threads = True
+    # The socketserver default backlog of 5 drops bursts of simultaneous connections
+    request_queue_size = 1024
+
+
+def make_server(service: JourneyService, host: str = '127.0.0.1', port: int = 8080, quiet: bool = False) -> RenderServer:
+    handler = type('Handler', (RenderRequestHandler,), {'service': service})
+    server = RenderServer((host, port), handler)
+    server.quiet = quiet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve rendered user journeys over HTTP from a long-running process.')
+    parser.add_argument('root', nargs='?', default='.', help='Directory holding the journeys and their capabilities/ directories (default: .)')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--validate', action='store_true', help='Validate journeys by default and answer 422 with the errors instead of rendering')
+    parser.add_argument('--renderer', choices=RENDERERS, default='mermaid', help="Default renderer for HTML pages (default: mermaid)")
+    parser.add_argument('--compact', action='store_true', help='Emit compact Mermaid by default')
+    parser.add_argument('--assets', choices=('cdn', 'inline'), default='cdn', help="Link pinned CDN assets or inline the vendored ones (default: cdn)")
+    parser.add_argument('--vendor-dir', default=str(VENDOR_DIR), help="Directory holding the assets vendored by 'ujv_assets.py fetch' (default: vendor/)")
+    parser.add_argument('--max-documents', type=int, default=DEFAULT_MAX_DOCUMENTS, help=f'Parsed journeys kept in memory (default: {DEFAULT_MAX_DOCUMENTS})')
+    parser.add_argument('--max-cache-mb', type=int, default=DEFAULT_MAX_CACHE_BYTES // (1024 * 1024), help='Memory for cached responses in MiB (default: 64)')
+    parser.add_argument('--max-renders', type=int, default=None, help='Renders running at the same time (default: number of CPU cores)')
+    parser.add_argument('--quiet', action='store_true', help='Do not log requests')
+    args = parser.parse_args()
+
+    assets = {'mode': args.assets}
+    if args.assets == 'inline':
+        assets['vendor_dir'] = args.vendor_dir
+        try:
+            for renderer in RENDERERS:
+                for name in page_assets(renderer, 'inline'):
+                    vendored_path(Path(args.vendor_dir), name)
+        except FileNotFoundError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    service = JourneyService(
+        Path(args.root), {'validate': args.validate, 'renderer': args.renderer, 'assets': assets, 'compact': args.compact},
+        args.max_documents, args.max_cache_mb * 1024 * 1024, args.max_renders,
+    )
+    server = make_server(service, args.host, args.port, args.quiet)
+    print(f"Serving user journeys from {service.root} at http://{args.host}:{server.server_address[1]}{JOURNEYS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import textwrap
+from html import escape
+from typing import Iterator
+
+# Node and spacing geometry, in pixels
+NODE_PADDING = 16
+NODE_MIN_WIDTH = 180
+NODE_MAX_TEXT_WIDTH = 260
+NODE_GAP = 40       # horizontal gap between nodes in the same layer
+LAYER_GAP = 80      # vertical gap between layers, leaves room for edge labels
+MARGIN = 24
+LINE_SPACING = 1.3
+CHAR_WIDTH = 0.56   # average glyph width relative to the font size (Roboto)
+
+EVENT_STYLE = {'fill': '#2D2D2D', 'stroke': '#444', 'color': '#ffffff'}
+DEFAULT_CAPABILITY_STYLE = {'fill': '#1f2020', 'stroke': '#333', 'color': '#ccc'}
+EDGE_COLOR = '#cccccc'
+CHIP_FILL = '#424242'
+
+
+def text_width(text: str, font_size: float) -> float:
+    return len(text) * font_size * CHAR_WIDTH
+
+
+def wrap(text: str, font_size: float) -> list[str]:
+    width = max(8, int(NODE_MAX_TEXT_WIDTH / (font_size * CHAR_WIDTH)))
+    return textwrap.wrap(text, width) or ['']
+
+
+class Node:
+    """
+    A diagram node: lines of (text, font size, bold) plus an optional link chip.
+    """
+
+    def __init__(self, node_id: str, lines: list[tuple[str, float, bool]], style: dict, link: str = ''):
+        self.id = node_id
+        self.lines = lines
+        self.style = style
+        self.link = link
+        self.chip_height = 28 if link else 0
+        content_width = max([text_width(text, size) for text, size, _ in lines] + [text_width(link, 14) + 16 if link else 0])
+        self.width = max(NODE_MIN_WIDTH, content_width + 2 * NODE_PADDING)
+        self.height = sum(size * LINE_SPACING for _, size, _ in lines) + self.chip_height + 2 * NODE_PADDING
+        self.x = 0.0
+        self.y = 0.0
+
+
+def _event_node(idx: int, event: dict) -> Node:
+    title = f"{event['icon']} {event['title']}" if event.get('icon') else event['title']
+    lines = [(line, 20, True) for line in wrap(title, 20)]
+    if event.get('description'):
+        lines += [(line, 18, False) for line in wrap(event['description'], 18)]
+    return Node(f"E{idx}", lines, EVENT_STYLE)
+
+
+def _capability_node(node_id: str, cap: dict, state_colors: dict) -> Node:
+    lines = [('Capability', 18, True)]
+    lines += [(line, 18, False) for line in wrap(cap['title'], 18)]
+    if cap.get('description'):
+        lines += [(line, 16, False) for line in wrap(cap['description'], 16)]
+    colors = state_colors.get(cap.get('state', ''))
+    style = {'fill': colors['fill'], 'stroke': '#333', 'color': colors['color']} if colors else DEFAULT_CAPABILITY_STYLE
+    return Node(node_id, lines, style, cap.get('link', ''))
+
+
+def layout(parsed: dict, state_colors: dict) -> tuple[list[Node], list[tuple[Node, Node, str, bool]], float, float]:
+    """
+    Layered layout of the journey graph, mirroring Mermaid's top-down ranking:
+    event i sits on layer i and the capabilities of event i fan out on layer i + 1,
+    to the right of the event spine. Returns nodes, edges (source, target, label,
+    directed) and the diagram size.
+    """
+    events = parsed['events']
+    layers = [[] for _ in range(len(events) + 1)]
+    nodes = []
+    event_nodes = []
+    edges = []
+    previous = None
+    for idx, event in enumerate(events):
+        event_node = _event_node(idx, event)
+        # Capabilities of the previous event are already on this layer; the event goes first
+        layers[idx].insert(0, event_node)
+        nodes.append(event_node)
+        event_nodes.append(event_node)
+        if previous is not None:
+            edges.append((previous, event_node, '', True))
+        for cidx, cap in enumerate(event['capabilities']):
+            cap_node = _capability_node(f"E{idx}_C{cidx}", cap, state_colors)
+            layers[idx + 1].append(cap_node)
+            nodes.append(cap_node)
+            edges.append((event_node, cap_node, cap.get('edge_text', '').strip(), False))
+        previous = event_node
+
+    spine_width = max([node.width for node in event_nodes] + [NODE_MIN_WIDTH])
+    spine_center = MARGIN + spine_width / 2
+    width = MARGIN + spine_width
+    y = MARGIN
+    for idx, layer in enumerate(layers):
+        if not layer:
+            continue
+        x = MARGIN + spine_width + NODE_GAP
+        for node in layer:
+            if idx < len(events) and node is layer[0]:
+                node.x = spine_center - node.width / 2
+            else:
+                node.x = x
+                x += node.width + NODE_GAP
+            node.y = y
+            width = max(width, node.x + node.width)
+        y += max(node.height for node in layer) + LAYER_GAP
+    height = y - LAYER_GAP + MARGIN
+    return nodes, edges, width + MARGIN, height
+
+
+def _node_svg(node: Node) -> list[str]:
+    style = node.style
+    out = []
+    if node.link:
+        out.append(f'<a href="{escape(node.link)}">')
+    out.append(f'<g class="node" id="{node.id}">')
+    out.append(
+        f'<rect x="{node.x:.1f}" y="{node.y:.1f}" width="{node.width:.1f}" height="{node.height:.1f}" rx="8" ry="8" '
+        f'fill="{style["fill"]}" stroke="{style["stroke"]}" stroke-width="2"/>'
+    )
+    center = node.x + node.width / 2
+    y = node.y + NODE_PADDING
+    for text, size, bold in node.lines:
+        baseline = y + size * (LINE_SPACING - 1) / 2 + size * 0.85
+        y += size * LINE_SPACING
+        weight = ' font-weight="bold"' if bold else ''
+        out.append(
+            f'<text x="{center:.1f}" y="{baseline:.1f}" font-size="{size}"{weight} '
+            f'fill="{style["color"]}" text-anchor="middle">{escape(text)}</text>'
+        )
+    if node.link:
+        chip_width = text_width(node.link, 14) + 16
+        chip_y = y + 4
+        out.append(
+            f'<rect x="{center - chip_width / 2:.1f}" y="{chip_y:.1f}" width="{chip_width:.1f}" height="22" rx="11" ry="11" fill="{CHIP_FILL}"/>'
+        )
+        out.append(
+            f'<text x="{center:.1f}" y="{chip_y + 16:.1f}" font-size="14" fill="#ffffff" text-anchor="middle">{escape(node.link)}</text>'
+        )
+    out.append('</g>')
+    if node.link:
+        out.append('</a>')
+    return out
+
+
+def _edge_svg(source: Node, target: Node, label: str, directed: bool) -> list[str]:
+    # Event chain edges leave from the bottom centre, capability edges from the bottom right
+    x1 = source.x + source.width / 2 if directed else source.x + source.width - 2 * NODE_PADDING
+    y1 = source.y + source.height
+    x2 = target.x + target.width / 2
+    y2 = target.y
+    out = []
+    if directed:
+        out.append(f'<path d="M{x1:.1f},{y1:.1f} L{x2:.1f},{y2 - 2:.1f}" stroke="{EDGE_COLOR}" stroke-width="2" fill="none" marker-end="url(#arrow)"/>')
+    else:
+        mid_y = (y1 + y2) / 2
+        out.append(
+            f'<path d="M{x1:.1f},{y1:.1f} C{x1:.1f},{mid_y:.1f} {x2:.1f},{mid_y:.1f} {x2:.1f},{y2:.1f}" '
+            f'stroke="{EDGE_COLOR}" stroke-width="2" fill="none"/>'
+        )
+    if label:
+        # The curve's control points are symmetric, so its midpoint is the average of the end points
+        mx = (x1 + x2) / 2
+        my = (y1 + y2) / 2
+        label_width = text_width(label, 14) + 12
+        out.append(f'<rect x="{mx - label_width / 2:.1f}" y="{my - 11:.1f}" width="{label_width:.1f}" height="22" fill="#1e1e1e" opacity="0.9"/>')
+        out.append(f'<text x="{mx:.1f}" y="{my + 5:.1f}" font-size="14" fill="{EDGE_COLOR}" text-anchor="middle">{escape(label)}</text>')
+    return out
+
+
+def iter_svg(laid_out: tuple) -> Iterator[str]:
+    """
+    Yields the lines of the static SVG document for a layout() result.
+    """
+    nodes, edges, width, height = laid_out
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+           f'viewBox="0 0 {width:.0f} {height:.0f}" font-family="Roboto, sans-serif" role="img">')
+    yield ('<defs><marker id="arrow" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="8" markerHeight="8" orient="auto-start-reverse">'
+           f'<path d="M0,0 L10,5 L0,10 z" fill="{EDGE_COLOR}"/></marker></defs>')
+    for edge in edges:
+        yield from _edge_svg(*edge)
+    for node in nodes:
+        yield from _node_svg(node)
+    yield '</svg>'
+
+
+def build_svg(parsed: dict, state_colors: dict) -> str:
+    """
+    Lays out the journey graph (event chain plus capability fan-out) and returns it as a static SVG document.
+    """
+    return '\n'.join(iter_svg(layout(parsed, state_colors)))
@@ -1,10 +1,25 @@
 import argparse
+import json
 import re
 import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+from xml.etree import ElementTree
 
-# Define the directory where capability markdown files are expected
-CAPABILITIES_DIR = Path("capabilities")
+import ujv_links
+import ujv_profile
+from ujv_capabilities import (
+    DEFAULT_MAX_ENTRIES, CapabilityRecord, CapabilityStore, capabilities_dir_for, get_store,
+)
+from ujv_document import (
+    CAPABILITY_HEADING, CAPABILITY_REF_RE, EVENT_HEADING, EVENTS_HEADING, PERSONA_HEADING, REFERENCE, TEXT, TITLE,
+    Document, Token, find_journeys, tokenize,
+)
 
 # Define allowed states for capabilities
 ALLOWED_CAPABILITY_STATES = {
@@ -14,7 +29,20 @@ ALLOWED_CAPABILITY_STATES = {
     "In production"
 }
 
-def validate_capability_file(filepath: Path) -> list[str]:
+# Single emoji icon line
+ICON_RE = re.compile(r'^[\U0001F000-\U0001F9FF\U00002600-\U000026FF\U00002700-\U000027BF]\U0000FE0F?$')
+
+# Exit codes of main(): all valid, validation errors found, inputs missing or unreadable
+EXIT_OK = 0
+EXIT_INVALID = 1
+EXIT_ERROR = 2
+
+# Validation errors of capability files keyed by path and content hash, shared by every
+# store in the process, so an unchanged file is validated once even when it is re-read
+_CAPABILITY_ERRORS = OrderedDict()
+_CAPABILITY_ERRORS_LOCK = threading.Lock()
+
+def validate_capability_file(filepath: Path, text: str | None = None) -> list[str]:
     """
     Validates the structure and content of a single capability markdown file.
     Checks for:
@@ -22,11 +50,14 @@ def validate_capability_file(filepath: Path) -> list[str]:
     - Presence of description, state, and optional link/edge text
     - Valid capability state
     - No unexpected lines
+    If the file content is already in memory it can be passed as `text`.
     """
-    print('Validating capability file: ' + str(filepath))
-
     errors = []
-    content = filepath.read_text(encoding='utf-8').splitlines()
+    if text is None:
+        text = filepath.read_text(encoding='utf-8')
+        ujv_profile.count('files_opened')
+        ujv_profile.count('bytes_read', len(text.encode('utf-8')))
+    content = text.splitlines()
 
     if not content:
         errors.append(f"Error in {filepath}: File is empty.")
@@ -84,150 +115,485 @@ def validate_capability_file(filepath: Path) -> list[str]:
     
     return errors
 
-def validate_main_markdown(filepath: Path) -> list[str]:
+def validate_capability(record: CapabilityRecord) -> list[str]:
     """
-    Validates the structure and content of the main user journey markdown file.
-    Checks for:
-    - Overall section order (Persona, Events)
-    - Event structure (### heading, description, icon)
-    - Capability references ([capability:filename_stem])
-    - Existence of referenced capability files
+    Validates a capability from the capability store. The result is memoized by the
+    file's path and content hash, so a capability referenced many times is validated
+    once until its content changes.
+    """
+    if record.errors is None:
+        key = (str(record.path), record.hash)
+        with _CAPABILITY_ERRORS_LOCK:
+            errors = _CAPABILITY_ERRORS.get(key)
+            if errors is not None:
+                _CAPABILITY_ERRORS.move_to_end(key)
+        if errors is None:
+            with ujv_profile.stage('validate_capability_file', file=str(record.path)):
+                errors = validate_capability_file(record.path, record.text)
+            ujv_profile.count('capabilities_validated')
+            with _CAPABILITY_ERRORS_LOCK:
+                _CAPABILITY_ERRORS[key] = errors
+                while len(_CAPABILITY_ERRORS) > DEFAULT_MAX_ENTRIES:
+                    _CAPABILITY_ERRORS.popitem(last=False)
+        record.errors = errors
+    return record.errors
+
+def _validate_event(filepath, line_no: int, title: str, event_lines: list[str], event_line_count: int) -> list[str]:
+    """
+    Checks the non-empty lines collected after an event heading.
+    Expected sequence: Description, optional Icon, optional [capability:reference].
     """
     errors = []
-    md_text = filepath.read_text(encoding='utf-8')
-    lines = md_text.splitlines()
+    if not event_line_count:
+        errors.append(f"Error in {filepath} (line {line_no}): Event '{title}' is missing a description.")
+    elif event_line_count == 1:
+        # Valid: only description is present (icon and capability reference are optional)
+        pass
+    elif event_line_count == 2:
+        # Could be (description, icon) OR (description, capability_ref)
+        second_line = event_lines[1]
+        is_icon = ICON_RE.match(second_line)
+        is_capability_ref = CAPABILITY_REF_RE.search(second_line)
+
+        if is_icon and is_capability_ref:
+            errors.append(f"Error in {filepath} (line {line_no}): Event '{title}' has a line that appears to be both an icon and a capability reference. This is unexpected.")
+        elif not is_icon and not is_capability_ref:
+            errors.append(f"Error in {filepath} (line {line_no}): Event '{title}' has unexpected content after description. Expected an optional icon or capability reference.")
+    elif event_line_count == 3:
+        # Must be (description, icon, capability_ref)
+        if not ICON_RE.match(event_lines[1]):
+            errors.append(f"Error in {filepath} (line {line_no}): Event '{title}' has content where an icon was expected, but it's not a valid icon.")
+        if not CAPABILITY_REF_RE.search(event_lines[2]):
+            errors.append(f"Error in {filepath} (line {line_no}): Event '{title}' has content where a capability reference was expected, but it's not a valid reference.")
+    else:
+        # More than 3 non-empty lines
+        errors.append(f"Error in {filepath} (line {line_no}): Event '{title}' has too many non-empty lines. Expected at most 3 (description, optional icon, optional capability reference).")
+    return errors
+
+class CapabilityCheck(NamedTuple):
+    """
+    A capability reference found by check_tokens, standing in for the referenced
+    file's validation errors until resolve_capability_checks looks the file up.
+    """
+    stem: str
+    line: int
+
+def check_block(tokens: Iterable[Token], filepath: Path,
+                current_section: str | None = None) -> tuple[list[str | CapabilityCheck], str | None, int]:
+    """
+    Checks the structure of a run of journey tokens, entered in `current_section`.
+    An event's block (the lines following its ### heading up to the next heading or
+    capability reference) is checked as soon as the block ends, so errors are reported
+    in line order; an event still open at the end of the run is checked then.
+    Capability references are returned as CapabilityCheck entries in their place;
+    this pass reads no capability files.
 
-    current_section = None
+    Nothing but the section carries over an event heading, so a journey split before
+    each ### line can be checked one part at a time, chaining the sections.
+    Returns the errors, the section at the end of the run and the number of events.
+    """
+    errors = []
     event_count = 0
-    
-    # State machine for parsing sections
-    for i, line in enumerate(lines):
-        stripped_line = line.strip()
 
-        if stripped_line.startswith("# User Journey"):
+    # Open event block: heading line number and title, its first non-empty lines and their count
+    event_line_no = 0
+    event_title = None
+    event_lines = []
+    event_line_count = 0
+    # Title of the event whose capability references are being read, if any
+    referencing_event = None
+
+    regex_evaluations = 0
+    # CapabilityCheck(...) without the generated __new__ wrapper; there is one per reference
+    new_check = tuple.__new__
+
+    for kind, stripped_line, line_no, capability_stem in tokens:
+        if kind == TEXT:
+            if event_title is not None:
+                event_line_count += 1
+                if event_line_count <= 3:
+                    event_lines.append(stripped_line)
+            elif referencing_event is not None:
+                # The renderer ignores text after an event's capability references
+                errors.append(f"Error in {filepath} (line {line_no}): Event '{referencing_event}' has unexpected content after its capability references.")
+            continue
+
+        if event_title is not None:
+            errors.extend(_validate_event(filepath, event_line_no, event_title, event_lines, event_line_count))
+            regex_evaluations += 2 if event_line_count in (2, 3) else 0
+            referencing_event = event_title if kind == REFERENCE else None
+            event_title = None
+        elif kind != REFERENCE:
+            referencing_event = None
+
+        if kind == REFERENCE:
+            errors.append(new_check(CapabilityCheck, (capability_stem, line_no)))
+            continue
+        elif kind == EVENT_HEADING:
+            if current_section != "events_section":
+                errors.append(f"Error in {filepath} (line {line_no}): Event heading (###) found outside 'Events' section.")
+            event_count += 1
+            event_line_no = line_no
+            event_title = stripped_line[4:]
+            event_lines = []
+            event_line_count = 0
+            continue
+        elif kind == TITLE:
             if current_section is not None:
-                errors.append(f"Error in {filepath} (line {i+1}): '# User Journey' heading found out of place.")
+                errors.append(f"Error in {filepath} (line {line_no}): '# User Journey' heading found out of place.")
             current_section = "journey_title"
             continue
-        elif stripped_line.startswith("## Persona"):
-            if current_section not in [None, "journey_title"]:
-                errors.append(f"Error in {filepath} (line {i+1}): '## Persona' heading found out of order.")
+        elif kind == PERSONA_HEADING:
+            if current_section not in (None, "journey_title"):
+                errors.append(f"Error in {filepath} (line {line_no}): '## Persona' heading found out of order.")
             current_section = "persona"
             continue
-        elif stripped_line.startswith("## Events"):
-            if current_section not in ["persona"]:
-                errors.append(f"Error in {filepath} (line {i+1}): '## Events' heading found out of order (expected after Persona).")
+        elif kind == EVENTS_HEADING:
+            if current_section != "persona":
+                errors.append(f"Error in {filepath} (line {line_no}): '## Events' heading found out of order (expected after Persona).")
             current_section = "events_section"
             continue
-        elif stripped_line.startswith("### "): # Event title
-            if current_section != "events_section":
-                errors.append(f"Error in {filepath} (line {i+1}): Event heading (###) found outside 'Events' section.")
-            event_count += 1
-            
-            # Validate the content immediately following the event title
-            # Expected sequence of non-empty lines: Description, Icon, [capability:reference]
-            
-            current_line_idx = i + 1
-            non_empty_lines_after_event_title = []
-
-            # Collect all non-empty lines until next heading or capability reference
-            while current_line_idx < len(lines):
-                stripped_line_after_event = lines[current_line_idx].strip()
-                if stripped_line_after_event.startswith(tuple(["#"])) or re.search(r'\[capability:([a-zA-Z0-9_-]+)\]', stripped_line_after_event):
-                    break
-                if stripped_line_after_event:
-                    non_empty_lines_after_event_title.append(stripped_line_after_event)
-                current_line_idx += 1
-            
-            # Check for Description
-            if not non_empty_lines_after_event_title:
-                errors.append(f"Error in {filepath} (line {i+1}): Event '{stripped_line[4:]}' is missing a description.")
-            else:
-                # Description is the first non-empty line
-                description = non_empty_lines_after_event_title[0]
-                
-                # Description is always the first non-empty line
-                description = non_empty_lines_after_event_title[0]
-
-                # Check for Icon and Capability Reference based on the number of non-empty lines
-                if len(non_empty_lines_after_event_title) == 1:
-                    # Valid: only description is present (icon and capability reference are optional)
-                    pass
-                elif len(non_empty_lines_after_event_title) == 2:
-                    # Could be (description, icon) OR (description, capability_ref)
-                    second_line = non_empty_lines_after_event_title[1]
-                    is_icon = re.match(r'^[\U0001F000-\U0001F9FF\U00002600-\U000026FF\U00002700-\U000027BF]\U0000FE0F?$', second_line)
-                    is_capability_ref = re.search(r'\[capability:([a-zA-Z0-9_-]+)\]', second_line)
-
-                    if is_icon and is_capability_ref:
-                        errors.append(f"Error in {filepath} (line {i+1}): Event '{stripped_line[4:]}' has a line that appears to be both an icon and a capability reference. This is unexpected.")
-                    elif is_icon:
-                        # Valid: description, icon
-                        pass
-                    elif is_capability_ref:
-                        # Valid: description, capability_ref (icon was optional and skipped)
-                        pass
-                    else:
-                        errors.append(f"Error in {filepath} (line {i+1}): Event '{stripped_line[4:]}' has unexpected content after description. Expected an optional icon or capability reference.")
-                elif len(non_empty_lines_after_event_title) == 3:
-                    # Must be (description, icon, capability_ref)
-                    second_line = non_empty_lines_after_event_title[1]
-                    third_line = non_empty_lines_after_event_title[2]
-
-                    is_icon = re.match(r'^[\U0001F000-\U0001F9FF\U00002600-\U000026FF\U00002700-\U000027BF]\U0000FE0F?$', second_line)
-                    is_capability_ref = re.search(r'\[capability:([a-zA-Z0-9_-]+)\]', third_line)
-
-                    if not is_icon:
-                        errors.append(f"Error in {filepath} (line {i+1}): Event '{stripped_line[4:]}' has content where an icon was expected, but it's not a valid icon.")
-                    if not is_capability_ref:
-                        errors.append(f"Error in {filepath} (line {i+1}): Event '{stripped_line[4:]}' has content where a capability reference was expected, but it's not a valid reference.")
-                else:
-                    # More than 3 non-empty lines
-                    errors.append(f"Error in {filepath} (line {i+1}): Event '{stripped_line[4:]}' has too many non-empty lines. Expected at most 3 (description, optional icon, optional capability reference).")
-
-            continue
-        elif stripped_line.startswith("#### "): # This should not appear in main markdown anymore
-            errors.append(f"Error in {filepath} (line {i+1}): Direct capability definition (####) found in main markdown. Use [capability:filename_stem] instead.")
+        elif kind == CAPABILITY_HEADING: # This should not appear in main markdown anymore
+            errors.append(f"Error in {filepath} (line {line_no}): Direct capability definition (####) found in main markdown. Use [capability:filename_stem] instead.")
             continue
-        
-        # Check for capability references
-        match = re.search(r'\[capability:([a-zA-Z0-9_-]+)\]', stripped_line)
-        if match:
-            capability_stem = match.group(1)
-            capability_filepath = filepath.parent / CAPABILITIES_DIR / f"{capability_stem}.md"
-            if not capability_filepath.exists():
-                errors.append(f"Error in {filepath} (line {i+1}): Referenced capability file '{capability_filepath}' not found.")
-            else:
-                # Recursively validate the referenced capability file
-                errors.extend(validate_capability_file(capability_filepath))
 
+        # Check for capability references on other heading lines
+        if capability_stem is not None:
+            errors.append(new_check(CapabilityCheck, (capability_stem, line_no)))
+
+    if event_title is not None:
+        errors.extend(_validate_event(filepath, event_line_no, event_title, event_lines, event_line_count))
+        regex_evaluations += 2 if event_line_count in (2, 3) else 0
+    ujv_profile.count('regex_evaluations', regex_evaluations)
+    return errors, current_section, event_count
+
+def check_document_end(filepath: Path, current_section: str | None, event_count: int) -> list[str]:
+    """
+    Checks made once the whole journey has been read.
+    """
     if current_section is None:
-        errors.append(f"Error in {filepath}: No main sections (Persona, Events) found.")
+        return [f"Error in {filepath}: No main sections (Persona, Events) found."]
     elif current_section == "persona" and event_count == 0:
-        errors.append(f"Error in {filepath}: 'Events' section is missing or empty after 'Persona'.")
+        return [f"Error in {filepath}: 'Events' section is missing or empty after 'Persona'."]
+    return []
+
+def check_tokens(tokens: Iterable[Token], filepath: Path) -> list[str | CapabilityCheck]:
+    """
+    Checks the structure of a whole user journey from its token stream, looking at each line once.
+    """
+    errors, current_section, event_count = check_block(tokens, filepath)
+    return errors + check_document_end(filepath, current_section, event_count)
 
+def resolve_capability_checks(entries: Iterable[str | CapabilityCheck], filepath: Path,
+                              store: CapabilityStore, records: dict | None = None) -> list[str]:
+    """
+    Replaces the CapabilityCheck entries of check_tokens with the errors of the
+    referenced capability files, or an error if a file does not exist.
+    The referenced records (None for missing files) are collected in `records`, keyed by stem.
+    """
+    errors = []
+    # Capability errors resolved for this journey, keyed by stem (None for missing files)
+    capability_errors = {}
+    for entry in entries:
+        if entry.__class__ is str:
+            errors.append(entry)
+            continue
+        stem, line = entry
+        try:
+            stem_errors = capability_errors[stem]
+        except KeyError:
+            record = store.get(stem)
+            if records is not None:
+                records[stem] = record
+            # Validate the referenced capability file (memoized by content hash)
+            stem_errors = capability_errors[stem] = None if record is None else validate_capability(record)
+        if stem_errors is None:
+            errors.append(f"Error in {filepath} (line {line}): Referenced capability file '{store.path_for(stem)}' not found.")
+        elif stem_errors:
+            errors.extend(stem_errors)
     return errors
 
+def validate_tokens(tokens: Iterable[Token], filepath: Path, store: CapabilityStore | None = None) -> list[str]:
+    """
+    Validates a user journey from its token stream, including the capability files it references.
+    """
+    if store is None:
+        store = get_store(capabilities_dir_for(filepath))
+    return resolve_capability_checks(check_tokens(tokens, filepath), filepath, store)
+
+def validate_main_markdown(filepath: Path) -> list[str]:
+    """
+    Validates the structure and content of the main user journey markdown file.
+    Checks for:
+    - Overall section order (Persona, Events)
+    - Event structure (### heading, description, icon)
+    - Capability references ([capability:filename_stem])
+    - Existence of referenced capability files
+    """
+    data = filepath.read_bytes()
+    ujv_profile.count('files_opened')
+    ujv_profile.count('bytes_read', len(data))
+    return validate_lines(data.decode('utf-8').splitlines(), filepath)
+
+def validate_lines(lines: Iterable[str], filepath: Path, store: CapabilityStore | None = None) -> list[str]:
+    """
+    Validates a user journey given as any iterable of lines.
+    """
+    return validate_tokens(tokenize(lines), filepath, store)
+
+def validate_document(document: Document) -> list[str]:
+    """
+    Validates an already parsed journey, sharing its tokens with the renderer.
+    """
+    return validate_tokens(document.tokens, document.path, document.store)
+
+def check_capability_links(records: Iterable[CapabilityRecord], cache: ujv_links.LinkCache | None = None,
+                           **checker_options) -> tuple[dict, int, int]:
+    """
+    Checks the http(s) links of the given capabilities. Each distinct URL is requested
+    once, however many capabilities share it; a broken link is reported for each
+    capability file containing it.
+    Returns the errors keyed by capability path, the number of distinct links and the
+    number checked over the network.
+    """
+    paths_by_link = {}
+    for record in records:
+        link = record.fields['link']
+        if ujv_links.is_checkable(link):
+            paths = paths_by_link.setdefault(link, [])
+            if record.path not in paths:
+                paths.append(record.path)
+
+    with ujv_profile.stage('check_links', links=len(paths_by_link)):
+        results, checked = ujv_links.check_links(paths_by_link, cache, **checker_options)
+    ujv_profile.count('links_checked', checked)
+    errors = {}
+    for link, paths in paths_by_link.items():
+        result = results[link]
+        if not result.ok:
+            for path in paths:
+                errors.setdefault(path, []).append(
+                    f"Error in {path}: Link '{link}' is broken ({ujv_links.describe_failure(result)}).")
+    return errors, len(paths_by_link), checked
+
+def add_link_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--check-links", action="store_true",
+                        help="Also check that the links of the referenced capabilities resolve (HTTP status below 400)")
+    parser.add_argument("--link-cache", default=str(ujv_links.DEFAULT_CACHE_FILE), metavar="FILE",
+                        help=f"File caching link check results between runs (default: {ujv_links.DEFAULT_CACHE_FILE}); 'none' disables it")
+    parser.add_argument("--link-cache-ttl", type=float, default=ujv_links.DEFAULT_TTL / 3600, metavar="HOURS",
+                        help=f"Hours a cached link result stays valid (default: {ujv_links.DEFAULT_TTL // 3600})")
+    parser.add_argument("--link-timeout", type=float, default=ujv_links.DEFAULT_TIMEOUT, metavar="SECONDS",
+                        help=f"Timeout per request (default: {ujv_links.DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--link-concurrency", type=int, default=ujv_links.DEFAULT_CONCURRENCY, metavar="N",
+                        help=f"Links checked at the same time (default: {ujv_links.DEFAULT_CONCURRENCY})")
+    parser.add_argument("--link-per-host", type=int, default=ujv_links.DEFAULT_PER_HOST, metavar="N",
+                        help=f"Connections per host (default: {ujv_links.DEFAULT_PER_HOST})")
+    parser.add_argument("--link-rate", type=float, default=ujv_links.DEFAULT_RATE, metavar="PER_SECOND",
+                        help=f"Requests started per second per host, 0 for no limit (default: {ujv_links.DEFAULT_RATE:g})")
+
+def link_options_from_args(args) -> dict:
+    cache = None if args.link_cache == 'none' else ujv_links.LinkCache(Path(args.link_cache), args.link_cache_ttl * 3600)
+    return {
+        'cache': cache,
+        'concurrency': args.link_concurrency,
+        'per_host': args.link_per_host,
+        'rate': args.link_rate,
+        'timeout': args.link_timeout,
+    }
+
+class ValidationResult(NamedTuple):
+    path: Path
+    errors: list[str]
+    error: str | None   # set if the file could not be read
+    seconds: float
+    # Distinct capability files the journey references
+    capabilities: list[CapabilityRecord] = []
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors and self.error is None
+
+def _check_job(paths: list[Path], profile: bool = False) -> tuple[list[tuple], dict | None]:
+    """
+    Process pool entry point: runs the structural pass over a chunk of journeys.
+    Capability references come back unresolved, so that the parent validates each
+    capability file once for the whole run rather than once per worker.
+    """
+    profiler = ujv_profile.enable() if profile else None
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        entries = error = None
+        try:
+            with ujv_profile.stage('check_tokens', file=str(path)):
+                data = path.read_bytes()
+                ujv_profile.count('files_opened')
+                ujv_profile.count('bytes_read', len(data))
+                entries = check_tokens(tokenize(data.decode('utf-8').splitlines()), path)
+        except (OSError, UnicodeDecodeError) as e:
+            error = f"{type(e).__name__}: {e}"
+        results.append((path, entries, error, time.perf_counter() - start))
+    return results, profiler.drain() if profiler else None
+
+def validate_batch(paths: list[Path], workers: int | None = None, profile: bool = False) -> Iterator[ValidationResult]:
+    """
+    Validates many journeys across a process pool sized to the machine's cores,
+    yielding each result as soon as its chunk completes, in completion order.
+    Referenced capability files are read and validated in this process, once per run.
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    profiler = ujv_profile.get_profiler()
+    executor = None
+    if workers <= 1:
+        # Stages are recorded straight into this process's profiler
+        chunks = (_check_job([path]) for path in paths)
+    else:
+        # Small chunks keep results streaming; enough of them keep every worker busy
+        size = max(1, min(64, len(paths) // (workers * 4)))
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=ujv_profile.disable)
+        futures = [executor.submit(_check_job, paths[i:i + size], profile) for i in range(0, len(paths), size)]
+        chunks = (future.result() for future in as_completed(futures))
+    try:
+        for results, profile_data in chunks:
+            if profile_data and profiler:
+                profiler.merge(profile_data)
+            for path, entries, error, seconds in results:
+                if entries is None:
+                    yield ValidationResult(path, [], error, seconds)
+                    continue
+                start = time.perf_counter()
+                store = get_store(capabilities_dir_for(path))
+                records = {}
+                with ujv_profile.stage('resolve_capability_checks', file=str(path)):
+                    errors = resolve_capability_checks(entries, path, store, records)
+                yield ValidationResult(path, errors, None, seconds + time.perf_counter() - start,
+                                       [record for record in records.values() if record is not None])
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def result_json(result: ValidationResult, kind: str) -> dict:
+    return {
+        'type': kind,
+        'file': str(result.path),
+        'valid': result.ok,
+        'errors': result.errors,
+        'error': result.error,
+        'time': round(result.seconds, 6),
+    }
+
+def print_result(result: ValidationResult):
+    if result.ok:
+        print(f"PASS {result.path}", flush=True)
+        return
+    print(f"FAIL {result.path}")
+    if result.error:
+        print(f"  - Error: {result.error}")
+    for error in result.errors:
+        print(f"  - {error}")
+    sys.stdout.flush()
+
+def write_junit(path: Path, suites: dict, elapsed: float):
+    """
+    Writes a JUnit XML report with one test suite per kind of result and one test
+    case per file. Validation errors are failures; unreadable files are errors.
+    """
+    root = ElementTree.Element('testsuites', name='ujv_validator', time=f"{elapsed:.3f}")
+    totals = {'tests': 0, 'failures': 0, 'errors': 0}
+    for name, results in suites.items():
+        counts = {
+            'tests': len(results),
+            'failures': sum(1 for result in results if result.errors),
+            'errors': sum(1 for result in results if result.error),
+        }
+        suite = ElementTree.SubElement(root, 'testsuite', name=name, time=f"{sum(result.seconds for result in results):.3f}",
+                                       **{key: str(value) for key, value in counts.items()})
+        for result in results:
+            case = ElementTree.SubElement(suite, 'testcase', classname=name, name=str(result.path), time=f"{result.seconds:.3f}")
+            if result.error:
+                ElementTree.SubElement(case, 'error', message=result.error).text = result.error
+            if result.errors:
+                failure = ElementTree.SubElement(case, 'failure', message=f"{len(result.errors)} validation error(s)")
+                failure.text = "\n".join(result.errors)
+        for key, value in counts.items():
+            totals[key] += value
+    for key, value in totals.items():
+        root.set(key, str(value))
+    ElementTree.indent(root)
+    ElementTree.ElementTree(root).write(path, encoding='utf-8', xml_declaration=True)
+
 def main():
     parser = argparse.ArgumentParser(description="Validate user journey markdown files.")
-    parser.add_argument("markdown_file", type=str, help="Path to the main user journey markdown file.")
+    parser.add_argument("markdown_files", nargs="+",
+                        help="User journey markdown file(s), directories or glob patterns to validate.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: number of CPU cores)")
+    parser.add_argument("--format", choices=("text", "json"), default="text",
+                        help="Output format: 'text', or 'json' for one JSON object per line as results complete (default: text)")
+    parser.add_argument("--junit", metavar="FILE", help="Also write a JUnit XML report to FILE")
+    add_link_arguments(parser)
+    parser.add_argument("--profile", nargs="?", const="ujv_validator_profile.json", metavar="TRACE_FILE",
+                        help="Record per-stage timings and I/O counters and write a Chrome trace (default: ujv_validator_profile.json)")
     args = parser.parse_args()
+    profiler = ujv_profile.enable() if args.profile else None
 
-    markdown_path = Path(args.markdown_file)
+    def report(result: ValidationResult, kind: str):
+        # Results are streamed as they complete
+        if args.format == "text":
+            print_result(result)
+        else:
+            print(json.dumps(result_json(result, kind)), flush=True)
 
-    if not markdown_path.exists():
-        print(f"Error: File not found at {markdown_path}")
-        return
+    with ujv_profile.stage('discover_journeys'):
+        paths = [input_path for input_path, _ in find_journeys(args.markdown_files)]
+    if not paths:
+        print("No user journey files found.", file=sys.stderr)
+        sys.exit(EXIT_ERROR)
+
+    start = time.perf_counter()
+    journeys = []
+    capabilities = {}
+    with ujv_profile.stage('validate_batch', journeys=len(paths)):
+        for result in validate_batch(paths, args.jobs, profile=profiler is not None):
+            journeys.append(result)
+            for record in result.capabilities:
+                capabilities[record.path] = record
+            report(result, 'journey')
 
-    print(f"Validating {markdown_path}...")
-    errors = validate_main_markdown(markdown_path)
+    suites = {'journeys': journeys}
+    summary = {'journeys': len(journeys), 'capability_files': len(capabilities)}
+    if args.check_links:
+        link_errors, links, checked = check_capability_links(capabilities.values(), **link_options_from_args(args))
+        suites['capability_links'] = [ValidationResult(path, errors, None, 0.0) for path, errors in link_errors.items()]
+        summary.update(links=links, links_requested=checked)
+        for result in suites['capability_links']:
+            report(result, 'capability_links')
+        if args.format == "text":
+            print(f"Checked {links} capability link(s): {checked} requested, {links - checked} from cache.")
+    elapsed = time.perf_counter() - start
 
-    if errors:
-        print("\nValidation FAILED with the following issues:")
-        for error in errors:
-            print(f"- {error}")
+    failed = sum(1 for results in suites.values() for result in results if result.errors)
+    unreadable = sum(1 for result in journeys if result.error)
+    summary.update(failed=failed, unreadable=unreadable, time=round(elapsed, 6))
+    if args.format == "text":
+        print(f"\nValidated {len(journeys)} journey(s) and {len(capabilities)} capability file(s) in {elapsed:.2f}s.")
+        if failed or unreadable:
+            print(f"Validation FAILED: {failed} file(s) with errors, {unreadable} unreadable.")
+        else:
+            print("Validation SUCCESS: Markdown file structure and referenced capabilities are valid.")
     else:
-        print("\nValidation SUCCESS: Markdown file structure and referenced capabilities are valid.")
+        print(json.dumps({'type': 'summary', **summary}))
+    if args.junit:
+        write_junit(Path(args.junit), suites, elapsed)
+
+    if profiler:
+        profiler.write_trace(args.profile)
+        profiler.print_summary()
+        print(f"Profile trace written to {args.profile}")
+    sys.exit(EXIT_ERROR if unreadable else EXIT_INVALID if failed else EXIT_OK)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
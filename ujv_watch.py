@@ -0,0 +1,493 @@
+import argparse
+import ctypes
+import ctypes.util
+import glob
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ujv_capabilities import CAPABILITIES_DIR
+from ujv_document import glob_root, is_journey_file
+from ujv_parser import (
+    EMIT_SUFFIXES, add_render_arguments, discover_journeys, is_up_to_date, load_manifest, manifest_key, output_collisions,
+    print_output_collisions, render_batch, render_options_from_args, renderer_fingerprint, save_manifest,
+)
+
+# Wait this long for an editor to finish a burst of writes before rebuilding
+DEBOUNCE_SECONDS = 0.02
+
+# Interval of the polling watcher used where inotify is unavailable
+DEFAULT_POLL_INTERVAL = 0.25
+
+EVENTS_PATH = '/__ujv/events'
+
+# Injected into every page served by the dev server
+LIVE_RELOAD_SCRIPT = """<script>
+(function () {
+    var source = new EventSource('%s');
+    source.onmessage = function (event) {
+        if (JSON.parse(event.data).indexOf(decodeURIComponent(location.pathname)) !== -1) location.reload();
+    };
+})();
+</script>
+""" % EVENTS_PATH
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    Watches directories with Linux inotify. wait() returns the paths of the files
+    created, written, moved or deleted in any watched directory.
+    """
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._directories = {}
+
+    def add(self, directory: Path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), INOTIFY_MASK)
+        if wd >= 0:
+            self._directories[wd] = Path(directory)
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        changed = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed
+        data = os.read(self._fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                # New directories may hold journeys or capability files of their own
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    self.add(path)
+            elif not mask & IN_CREATE:
+                # A created file is reported again by IN_CLOSE_WRITE once written
+                changed.add(str(path))
+        return changed
+
+
+class PollingWatcher:
+    """
+    Fallback watcher: rescans the watched directories every `interval` seconds and
+    reports the markdown files whose mtime or size changed, and those added or removed.
+    Like InotifyWatcher, it starts watching directories created in a watched directory.
+    """
+
+    def __init__(self, interval: float = DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+        self._directories = set()
+        self._subdirectories = {}
+        self._snapshot = {}
+
+    def add(self, directory: Path):
+        directory = Path(directory)
+        self._directories.add(directory)
+        files, self._subdirectories[directory] = self._scan(directory)
+        self._snapshot.update(files)
+
+    def _scan(self, directory: Path) -> tuple[dict, set[str]]:
+        files = {}
+        subdirectories = set()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.add(entry.name)
+                    elif entry.name.endswith('.md') and entry.is_file():
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return files, subdirectories
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        snapshot = {}
+        pending = list(self._directories)
+        while pending:
+            directory = pending.pop()
+            files, subdirectories = self._scan(directory)
+            snapshot.update(files)
+            # New directories may hold journeys or capability files of their own; those
+            # present when the directory was added were left out on purpose
+            for name in subdirectories - self._subdirectories.get(directory, set()):
+                if not name.startswith('.') and directory / name not in self._directories:
+                    self._directories.add(directory / name)
+                    pending.append(directory / name)
+            self._subdirectories[directory] = subdirectories
+        changed = {path for path in snapshot.keys() | self._snapshot.keys() if snapshot.get(path) != self._snapshot.get(path)}
+        self._snapshot = snapshot
+        return changed
+
+
+def make_watcher(poll: bool = False, interval: float = DEFAULT_POLL_INTERVAL):
+    """
+    Returns an inotify watcher where the platform supports it, otherwise a polling one.
+    """
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(interval)
+
+
+class DependencyIndex:
+    """
+    Reverse index from capability file to the journeys referencing it, filled from
+    build manifest entries so that starting a watch does not parse any journey.
+    Journeys that failed to render have no recorded dependencies; they are
+    re-rendered when any file in their capabilities directory changes.
+    """
+
+    def __init__(self):
+        self.outputs = {}
+        self._capabilities = {}
+        self._dependents = defaultdict(set)
+        self._failed = defaultdict(set)
+
+    def update(self, journey: str, output_path: Path, entry: dict | None):
+        self.remove(journey)
+        self.outputs[journey] = output_path
+        if entry is None:
+            self._failed[os.path.abspath(Path(journey).parent / CAPABILITIES_DIR)].add(journey)
+            return
+        capabilities = {os.path.abspath(path) for path in entry.get('capabilities', {})}
+        self._capabilities[journey] = capabilities
+        for capability in capabilities:
+            self._dependents[capability].add(journey)
+
+    def remove(self, journey: str):
+        self.outputs.pop(journey, None)
+        for capability in self._capabilities.pop(journey, ()):
+            self._dependents[capability].discard(journey)
+        self._failed[os.path.abspath(Path(journey).parent / CAPABILITIES_DIR)].discard(journey)
+
+    def dependents(self, capability: str) -> set[str]:
+        return self._dependents.get(capability, set()) | self._failed.get(os.path.dirname(capability), set())
+
+
+class LiveReload:
+    """
+    Hands the URLs of rebuilt pages to every connected browser.
+    """
+
+    def __init__(self, history: int = 64):
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._history = deque(maxlen=history)
+
+    def publish(self, urls: list[str]):
+        with self._condition:
+            self._generation += 1
+            self._history.append((self._generation, urls))
+            self._condition.notify_all()
+
+    def current(self) -> int:
+        with self._condition:
+            return self._generation
+
+    def wait(self, generation: int, timeout: float) -> tuple[int, list[str]]:
+        """
+        Blocks until a build newer than `generation` is published and returns the
+        latest generation with every URL rebuilt since `generation`.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation > generation, timeout)
+            urls = [url for built, batch in self._history if built > generation for url in batch]
+            return self._generation, urls
+
+
+class DevServerHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the output directory, adding the live reload script to HTML pages and
+    streaming rebuilt page URLs to them as server-sent events.
+    """
+
+    def __init__(self, *args, live_reload: LiveReload, **kwargs):
+        self.live_reload = live_reload
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == EVENTS_PATH:
+            return self._stream_events()
+        filepath = Path(self.translate_path(path))
+        if filepath.is_dir():
+            filepath = filepath / 'index.html'
+        if filepath.suffix != '.html' or not filepath.is_file():
+            return super().do_GET()
+        html = filepath.read_text(encoding='utf-8')
+        index = html.rfind('</body>')
+        html = html[:index] + LIVE_RELOAD_SCRIPT + html[index:] if index != -1 else html + LIVE_RELOAD_SCRIPT
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        generation = self.live_reload.current()
+        try:
+            while True:
+                generation, urls = self.live_reload.wait(generation, timeout=15)
+                # A comment line keeps idle connections open
+                self.wfile.write(f"data: {json.dumps(urls)}\n\n".encode('utf-8') if urls else b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(output_dir: Path, live_reload: LiveReload, host: str, port: int) -> ThreadingHTTPServer:
+    """
+    Starts the dev server on a daemon thread and returns it.
+    """
+    handler = partial(DevServerHandler, directory=str(output_dir), live_reload=live_reload)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class WatchBuild:
+    """
+    Keeps an output directory in sync with its journeys. The build manifest is shared
+    with ujv_parser.py, so a watch started after a build only renders what changed.
+    """
+
+    def __init__(self, inputs: list[str], output_dir: Path, options: dict, workers: int | None = None):
+        self.inputs = inputs
+        self.output_dir = output_dir
+        self.options = options
+        self.suffix = EMIT_SUFFIXES[options['emit']]
+        self.workers = workers
+        self.renderer = renderer_fingerprint()
+        self.manifest = load_manifest(output_dir, self.renderer)
+        self.index = DependencyIndex()
+        self.dirty = False
+
+    def watched_directories(self) -> list[Path]:
+        """
+        Every directory that may hold a journey or a capability file of a watched journey.
+        """
+        skip = self.output_dir.resolve()
+        directories = set()
+        for journey in self.index.outputs:
+            directories.add(Path(journey).parent)
+            directories.add(Path(journey).parent / CAPABILITIES_DIR)
+        for item in self.inputs:
+            root = glob_root(item) if glob.has_magic(item) else Path(item)
+            if not root.is_dir():
+                continue
+            for dirpath, dirnames, _ in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.') and (Path(dirpath) / d).resolve() != skip]
+                directories.add(Path(dirpath))
+        return sorted(directory for directory in directories if directory.is_dir())
+
+    def build(self, jobs: list[tuple[Path, Path]]) -> list[str]:
+        """
+        Renders the jobs that are out of date, updates the manifest and the dependency
+        index, and returns the URLs of the pages written.
+        """
+        hashes = {}
+        stale = []
+        for input_path, output_path in jobs:
+            entry = self.manifest.get(manifest_key(output_path, self.output_dir))
+            if is_up_to_date(input_path, output_path, entry, hashes, self.options):
+                self.index.update(os.path.abspath(input_path), output_path, entry)
+            else:
+                stale.append((input_path, output_path))
+
+        urls = []
+        for input_path, output_path, error, dependencies, _ in render_batch(stale, self.workers, self.options):
+            key = manifest_key(output_path, self.output_dir)
+            if error:
+                self.manifest.pop(key, None)
+                print(f"FAILED {input_path}: {error}")
+            else:
+                self.manifest[key] = dependencies
+                urls.append('/' + key)
+                # Part pages of a paginated journey, relative to its overview page
+                urls.extend('/' + manifest_key(output_path.parent / part, self.output_dir) for part in dependencies.get('parts', ()))
+            self.index.update(os.path.abspath(input_path), output_path, dependencies)
+        self.dirty |= bool(stale)
+        return urls
+
+    def save(self):
+        if self.dirty:
+            save_manifest(self.output_dir, self.renderer, self.manifest)
+            self.dirty = False
+
+    def _new_journeys(self, paths: list[str]) -> list[tuple[Path, Path]]:
+        """
+        Maps markdown files not yet known to the index to their output paths, if they
+        are journeys selected by the watched inputs.
+        """
+        candidates = {path for path in paths if os.path.exists(path) and is_journey_file(Path(path))}
+        jobs = []
+        output_root = os.path.abspath(self.output_dir) + os.sep
+        for item in self.inputs:
+            if not candidates:
+                break
+            if glob.has_magic(item):
+                # Only glob inputs need a rescan to tell whether they select the new file
+                matched = [job for job in discover_journeys([item], self.output_dir, self.suffix) if os.path.abspath(job[0]) in candidates]
+            elif os.path.isdir(item):
+                root = os.path.abspath(item)
+                matched = [
+                    (Path(path), self.output_dir / Path(os.path.relpath(path, root)).with_suffix(self.suffix))
+                    for path in candidates
+                    if path.startswith(root + os.sep) and not path.startswith(output_root)
+                    and not any(part.startswith('.') or part == CAPABILITIES_DIR.name for part in Path(os.path.relpath(path, root)).parts[:-1])
+                ]
+            else:
+                continue
+            jobs += matched
+            candidates -= {os.path.abspath(job[0]) for job in matched}
+        # A new journey may map onto the output of one already watched (or of another new one)
+        claimed = {os.path.abspath(output_path): journey for journey, output_path in self.index.outputs.items()}
+        accepted = []
+        for input_path, output_path in jobs:
+            owner = claimed.setdefault(os.path.abspath(output_path), os.path.abspath(input_path))
+            if owner != os.path.abspath(input_path):
+                print(f"SKIPPED {input_path}: {output_path} is already written from {owner}")
+            else:
+                accepted.append((input_path, output_path))
+        return accepted
+
+    def handle(self, changed: set[str]) -> list[str]:
+        """
+        Re-renders the journeys affected by a set of changed files and returns the
+        URLs of the pages written. Unrelated journeys are not read or parsed.
+        """
+        affected = {}
+        unknown = []
+        for path in changed:
+            if not path.endswith('.md'):
+                continue
+            path = os.path.abspath(path)
+            if Path(path).parent.name == CAPABILITIES_DIR.name:
+                for journey in self.index.dependents(path):
+                    affected[journey] = self.index.outputs[journey]
+            elif path in self.index.outputs:
+                if os.path.exists(path):
+                    affected[path] = self.index.outputs[path]
+                else:
+                    self.manifest.pop(manifest_key(self.index.outputs[path], self.output_dir), None)
+                    self.dirty = True
+                    self.index.remove(path)
+            else:
+                unknown.append(path)
+        jobs = [(Path(journey), output_path) for journey, output_path in affected.items()]
+        return self.build(jobs + self._new_journeys(unknown))
+
+
+def watch(build: WatchBuild, watcher, live_reload: LiveReload | None = None):
+    """
+    Runs until interrupted: waits for changes, collects the burst of events an editor
+    produces on save, and rebuilds the affected pages.
+    """
+    for directory in build.watched_directories():
+        watcher.add(directory)
+    while True:
+        changed = watcher.wait()
+        if not changed:
+            continue
+        start = time.perf_counter()
+        while more := watcher.wait(DEBOUNCE_SECONDS):
+            changed |= more
+        urls = build.handle(changed)
+        if urls:
+            print(f"Rebuilt {len(urls)} page(s) in {(time.perf_counter() - start) * 1000:.0f} ms: {', '.join(urls[:5])}"
+                  + (' ...' if len(urls) > 5 else ''))
+            if live_reload:
+                live_reload.publish(urls)
+        # Written after the pages are announced, so a large manifest does not delay the reload
+        build.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-render user journeys as they and their capability files change, and serve them with live reload.')
+    parser.add_argument('input_md', nargs='+', help='Journey markdown file(s), directories or glob patterns to watch')
+    parser.add_argument('-o', '--output-dir', default='output', help='Directory to write the HTML files to (default: output)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of worker processes for large rebuilds (default: number of CPU cores)')
+    add_render_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1', help='Address the dev server listens on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port of the dev server (default: 8000)')
+    parser.add_argument('--no-serve', action='store_true', help='Only re-render; do not start the dev server')
+    parser.add_argument('--poll', action='store_true', help='Poll for changes instead of using inotify')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help='Polling interval in seconds (default: 0.25)')
+    args = parser.parse_args()
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        options = render_options_from_args(args, output_dir)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    build = WatchBuild(args.input_md, output_dir, options, args.jobs)
+    jobs = discover_journeys(args.input_md, output_dir, build.suffix)
+    collisions = output_collisions(jobs)
+    if collisions:
+        print_output_collisions(collisions)
+        sys.exit(1)
+    start = time.perf_counter()
+    urls = build.build(jobs)
+    build.save()
+    print(f"Watching {len(jobs)} user journeys; rendered {len(urls)} in {time.perf_counter() - start:.2f}s")
+
+    live_reload = None
+    if not args.no_serve:
+        live_reload = LiveReload()
+        server = serve(output_dir, live_reload, args.host, args.port)
+        print(f"Serving {output_dir} at http://{args.host}:{server.server_address[1]}/")
+
+    watcher = make_watcher(args.poll, args.interval)
+    print(f"Using {'inotify' if isinstance(watcher, InotifyWatcher) else 'polling'} to detect changes. Press Ctrl+C to stop.")
+    try:
+        watch(build, watcher, live_reload)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()